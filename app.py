@@ -0,0 +1,149 @@
+# app.py
+# Фабрика приложения: Bot, Dispatcher, хранилище и клиент GPT создаются при первом обращении
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
+from aiogram.enums import ParseMode
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import health
+import photos
+import services
+import voice
+from broadcast import Broadcaster
+from middlewares import OutboundRequestMiddleware, TracingMiddleware, TracingRequestMiddleware, UpdateContextMiddleware
+from scheduler import ReminderScheduler
+from sender import outbound
+from storage import Storage, create_storage
+from usage import UsageLedger
+
+logger = logging.getLogger(__name__)
+
+class ConfigError(Exception):
+    """Не заданы обязательные переменные окружения"""
+
+class App:
+    """Собранное приложение бота
+
+    Ничего не создаётся в конструкторе: бот, диспетчер, хранилище и клиент
+    GPT появляются при первом обращении к свойству. Схема базы проверяется
+    один раз, в startup(). Воркеры и бенчмарки могут подменить хранилище
+    и сессию Bot API, передав их в create_app.
+    """
+
+    def __init__(self, token: str, storage: Optional[Storage] = None, session: Optional[BaseSession] = None):
+        self.token = token
+        self._db = storage
+        self._session = session
+        self._bot: Optional[Bot] = None
+        self._dispatcher: Optional[Dispatcher] = None
+        self._scheduler: Optional[ReminderScheduler] = None
+        self._broadcaster: Optional[Broadcaster] = None
+        self._ledger: Optional[UsageLedger] = None
+        self._started = False
+
+    @property
+    def db(self) -> Storage:
+        if self._db is None:
+            self._db = create_storage()
+        return self._db
+
+    @property
+    def scheduler(self) -> ReminderScheduler:
+        if self._scheduler is None:
+            self._scheduler = ReminderScheduler(self.db)
+        return self._scheduler
+
+    @property
+    def broadcaster(self) -> Broadcaster:
+        if self._broadcaster is None:
+            self._broadcaster = Broadcaster(self.db)
+        return self._broadcaster
+
+    @property
+    def ledger(self) -> UsageLedger:
+        if self._ledger is None:
+            self._ledger = UsageLedger(self.db)
+        return self._ledger
+
+    @property
+    def gpt(self):
+        return services.get_client()
+
+    @property
+    def bot(self) -> Bot:
+        if self._bot is None:
+            self._bot = Bot(
+                token=self.token,
+                session=self._session,
+                default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+            )
+            # Очередь исходящих снаружи, чтобы спан telegram.* мерил сам вызов, а не ожидание в очереди
+            self._bot.session.middleware(OutboundRequestMiddleware(outbound))
+            self._bot.session.middleware(TracingRequestMiddleware())
+        return self._bot
+
+    @property
+    def dispatcher(self) -> Dispatcher:
+        if self._dispatcher is None:
+            # Хендлеры подключаются здесь, чтобы импорт app не тянул их за собой
+            import handlers
+
+            # Зависимости хендлеров передаются в них аргументами по имени
+            dp = Dispatcher(
+                storage=MemoryStorage(),
+                db=self.db,
+                scheduler=self.scheduler,
+                broadcaster=self.broadcaster,
+                ledger=self.ledger
+            )
+            dp.update.outer_middleware(UpdateContextMiddleware())
+            dp.update.outer_middleware(TracingMiddleware())
+            dp.include_router(handlers.router)
+            self._dispatcher = dp
+        return self._dispatcher
+
+    async def startup(self):
+        """Подключение к хранилищу и проверка схемы; повторные вызовы ничего не делают"""
+        if not self._started:
+            await self.db.connect()
+            self._started = True
+
+    async def shutdown(self):
+        await outbound.close()
+        await voice.transcription_queue.close()
+        photos.shutdown()
+        health.shutdown()
+        if self._ledger is not None and self._started:
+            # Расход GPT, накопленный после последней записи
+            await self._ledger.flush()
+        if self._started:
+            await self.db.close()
+            self._started = False
+
+    async def run(self):
+        """Polling вместе с планировщиком, обслуживанием хранилища и незавершёнными рассылками"""
+        await self.startup()
+        scheduler_task = asyncio.create_task(self.scheduler.run(self.bot))
+        maintenance_task = asyncio.create_task(self.db.run_maintenance())
+        usage_task = asyncio.create_task(self.ledger.run())
+        await self.broadcaster.resume(self.bot)
+        try:
+            await self.dispatcher.start_polling(self.bot)
+        finally:
+            scheduler_task.cancel()
+            maintenance_task.cancel()
+            usage_task.cancel()
+            await self.shutdown()
+
+def create_app(storage: Optional[Storage] = None, session: Optional[BaseSession] = None) -> App:
+    """Приложение по переменным окружения; ConfigError, если не хватает токенов"""
+    missing = [name for name in ('TELEGRAM_BOT_TOKEN', 'OPENAI_API_KEY') if not os.getenv(name)]
+    if missing:
+        raise ConfigError(f"не найдены {', '.join(missing)} в переменных окружения")
+    return App(os.environ['TELEGRAM_BOT_TOKEN'], storage=storage, session=session)
@@ -0,0 +1,231 @@
+# archive.py
+# Архив старых приёмов пищи: помесячные таблицы в отдельном файле базы
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from database import MEAL_COLUMNS, Database
+from models import Meal
+from tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+# Приёмы пищи старше стольких дней уезжают в архив; daily_summaries остаются в основной базе навсегда
+MEALS_RETENTION_DAYS = int(os.getenv('MEALS_RETENTION_DAYS', '90'))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv('ARCHIVE_INTERVAL_HOURS', '24'))
+# Сколько страниц освобождать за один проход incremental_vacuum (страница — обычно 4 КБ)
+VACUUM_PAGES = int(os.getenv('VACUUM_PAGES', '2000'))
+
+_MONTH_RE = re.compile(r'^\d{4}-\d{2}$')
+
+def archive_table(month: str) -> str:
+    """Имя таблицы архива за месяц 'ГГГГ-ММ'"""
+    if not _MONTH_RE.match(month):
+        raise ValueError(f"Некорректный месяц архива: {month!r}")
+    return f"meals_{month.replace('-', '_')}"
+
+def _month_bounds(month: str):
+    year, number = map(int, month.split('-'))
+    start = date(year, number, 1)
+    end = date(year + number // 12, number % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+def _months_between(date_from: str, date_to: str) -> List[str]:
+    year, month = map(int, date_from[:7].split('-'))
+    last = date_to[:7]
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+class MealArchive:
+    """Перенос старых приёмов пищи в архив и чтение истории с архивом
+
+    Архив — отдельный файл SQLite (по умолчанию рядом с основной базой,
+    с суффиксом _archive), в нём таблица на каждый месяц. Рабочая таблица
+    meals хранит только последние retention_days дней, поэтому обычные
+    запросы бота архив не трогают. Архив подключается через ATTACH только
+    для явных исторических запросов (get_meals_between) и самого переноса.
+    """
+
+    def __init__(self, db: Database, archive_path: Optional[str] = None,
+                 retention_days: int = MEALS_RETENTION_DAYS):
+        self.db = db
+        self.archive_path = archive_path or os.path.splitext(db.db_path)[0] + '_archive.db'
+        self.retention_days = retention_days
+
+    def cutoff(self, today: Optional[date] = None) -> str:
+        """Первая дата, которая остаётся в рабочей таблице"""
+        return ((today or date.today()) - timedelta(days=self.retention_days)).isoformat()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = self.db._connect()
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        return conn
+
+    def _archived_months(self, conn: sqlite3.Connection) -> List[str]:
+        rows = conn.execute(
+            "SELECT name FROM archive.sqlite_master WHERE type = 'table' AND name LIKE 'meals\\_%' ESCAPE '\\'"
+        )
+        return sorted(name[6:].replace('_', '-') for name, in rows)
+
+    def archive(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Переносит приёмы пищи старше горизонта в помесячные таблицы архива
+
+        Каждый месяц переносится отдельной транзакцией: INSERT в архив и
+        DELETE из meals коммитятся вместе, так что строка не теряется и не
+        дублируется при сбое посередине. Возвращает {месяц: перенесено строк}.
+        """
+        cutoff = self.cutoff(today)
+        moved: Dict[str, int] = {}
+
+        with start_trace('archive.meals', cutoff=cutoff):
+            conn = self._connect()
+            try:
+                months = [row[0] for row in conn.execute(
+                    'SELECT DISTINCT substr(date, 1, 7) FROM meals WHERE date < ? ORDER BY 1', (cutoff,)
+                )]
+                for month in months:
+                    table = archive_table(month)
+                    start, end = _month_bounds(month)
+                    end = min(end, cutoff)
+                    with conn:
+                        conn.execute(f'''
+                            CREATE TABLE IF NOT EXISTS archive.{table} (
+                                id INTEGER PRIMARY KEY,
+                                user_id INTEGER,
+                                description TEXT,
+                                calories INTEGER,
+                                proteins INTEGER,
+                                fats INTEGER,
+                                carbs INTEGER,
+                                date TEXT,
+                                created_at TIMESTAMP
+                            )
+                        ''')
+                        conn.execute(f'CREATE INDEX IF NOT EXISTS archive.{table}_user_date ON {table} (user_id, date)')
+                        cursor = conn.execute(f'''
+                            INSERT OR IGNORE INTO archive.{table}
+                            (id, user_id, description, calories, proteins, fats, carbs, date, created_at)
+                            SELECT id, user_id, description, calories, proteins, fats, carbs, date, created_at
+                            FROM meals WHERE date >= ? AND date < ?
+                        ''', (start, end))
+                        conn.execute('DELETE FROM meals WHERE date >= ? AND date < ?', (start, end))
+                    moved[month] = cursor.rowcount
+            finally:
+                conn.close()
+
+        if moved:
+            logger.info("Приёмы пищи перенесены в архив", extra={'cutoff': cutoff, 'moved': moved})
+        return moved
+
+    def get_meals_between(self, user_id: int, date_from: str, date_to: str) -> List[Meal]:
+        """Приёмы пищи за период включительно; архивные месяцы объединяются с рабочей таблицей"""
+        # Период целиком в рабочей таблице — архив не подключаем
+        historical = date_from < self.cutoff() and os.path.exists(self.archive_path)
+        conn = self._connect() if historical else self.db._connect()
+        try:
+            tables = ['meals']
+            if historical:
+                archived = set(self._archived_months(conn))
+                tables += [
+                    f"archive.{archive_table(month)}"
+                    for month in _months_between(date_from, date_to) if month in archived
+                ]
+            return self._query(conn, tables, user_id, date_from, date_to)
+        finally:
+            conn.close()
+
+    def _query(self, conn: sqlite3.Connection, tables: List[str], user_id: int,
+               date_from: str, date_to: str) -> List[Meal]:
+        parts = [
+            f"SELECT {MEAL_COLUMNS}, date, created_at FROM {table} WHERE user_id = ? AND date BETWEEN ? AND ?"
+            for table in tables
+        ]
+        cursor = conn.execute(
+            ' UNION ALL '.join(parts) + ' ORDER BY 7, 8, 1',
+            (user_id, date_from, date_to) * len(tables)
+        )
+        return [Meal(*row[:6]) for row in cursor]
+
+    def incremental_vacuum(self, pages: int = VACUUM_PAGES) -> int:
+        """Возвращает в файловую систему до pages свободных страниц основной базы
+
+        Базы, созданные без auto_vacuum=INCREMENTAL, один раз переводятся в
+        этот режим полным VACUUM; дальше освобождение идёт маленькими порциями
+        и не блокирует базу надолго. Возвращает число освобождённых страниц.
+        """
+        conn = self.db._connect()
+        try:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logger.info("Переводим базу в режим auto_vacuum=INCREMENTAL (полный VACUUM)")
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            # PRAGMA освобождает по странице за шаг, а execute делает один шаг;
+            # executescript выполняет её до конца
+            conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+            freed = before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        finally:
+            conn.close()
+
+        logger.info("Освобождены страницы базы", extra={'freed_pages': freed})
+        return freed
+
+    def size_report(self) -> Dict:
+        """Размеры файлов, страницы и число строк по таблицам основной базы и архива"""
+        conn = self._connect()
+        try:
+            report = {}
+            for schema, path in (('main', self.db.db_path), ('archive', self.archive_path)):
+                page_size = conn.execute(f'PRAGMA {schema}.page_size').fetchone()[0]
+                page_count = conn.execute(f'PRAGMA {schema}.page_count').fetchone()[0]
+                freelist = conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+                report[schema] = {
+                    'path': path,
+                    'file_bytes': os.path.getsize(path) if os.path.exists(path) else 0,
+                    'page_size': page_size,
+                    'pages': page_count,
+                    'free_pages': freelist,
+                }
+
+            report['main']['rows'] = {
+                table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for table in ('meals', 'daily_summaries')
+            }
+            report['archive']['rows'] = {
+                month: conn.execute(f'SELECT COUNT(*) FROM archive.{archive_table(month)}').fetchone()[0]
+                for month in self._archived_months(conn)
+            }
+            return report
+        finally:
+            conn.close()
+
+    async def run(self):
+        """Периодический перенос и incremental_vacuum; запускается из App.run() через Storage.run_maintenance"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                moved = await loop.run_in_executor(None, self.archive)
+                if moved:
+                    await loop.run_in_executor(None, self.incremental_vacuum)
+            except Exception as e:
+                logger.exception("Ошибка архивации приёмов пищи: %s", e)
+            await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+def render_size_report(report: Dict) -> str:
+    """Текст для /storage"""
+    lines = []
+    for schema, title in (('main', '🗄 Основная база'), ('archive', '📦 Архив')):
+        part = report[schema]
+        lines.append(
+            f"{title}: {part['file_bytes'] / 1024 / 1024:.1f} МБ, "
+            f"страниц {part['pages']} (свободно {part['free_pages']})"
+        )
+        lines += [f"  {name}: {count} строк" for name, count in part['rows'].items()]
+    return '\n'.join(lines)
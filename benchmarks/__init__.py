@@ -0,0 +1 @@
+# Микробенчмарки и нагрузочные прогоны бота
@@ -0,0 +1,97 @@
+"""Холодный старт: от запуска процесса до первого обработанного апдейта
+
+Каждый прогон — новый процесс Python во временной папке: импорт хендлеров,
+create_app со временной SQLite, startup() (проверка схемы) и /start через
+Dispatcher.feed_update на фейковой сессии Bot API. Печатает медианы этапов
+и проверяет, что импорт хендлеров ничего не создаёт и не тянет openai.
+
+Запуск: python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child() -> dict:
+    started = time.perf_counter()
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:cold-start')
+    os.environ.setdefault('OPENAI_API_KEY', 'cold-start')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    import handlers  # noqa: F401
+    imported = time.perf_counter()
+    side_effects = {
+        'files_after_import': sorted(os.listdir('.')),
+        'openai_imported': 'openai' in sys.modules,
+    }
+
+    import asyncio
+    from datetime import datetime
+
+    from aiogram import Bot
+    from aiogram.types import Chat, Message, Update, User
+
+    from app import create_app
+    from benchmarks.fakes import FakeBotSession
+
+    async def first_update() -> float:
+        app = create_app()
+        await app.startup()
+        ready = time.perf_counter()
+        user = User(id=1, is_bot=False, first_name='cold')
+        update = Update(update_id=1, message=Message(
+            message_id=1, date=datetime.now(), chat=Chat(id=1, type='private'), from_user=user, text='/start'
+        ))
+        # Голый Bot без очереди исходящих: меряем старт, а не лимиты Telegram
+        await app.dispatcher.feed_update(Bot(token=app.token, session=FakeBotSession()), update)
+        await app.shutdown()
+        return ready
+
+    ready = asyncio.run(first_update())
+    handled = time.perf_counter()
+    return {
+        'import_ms': (imported - started) * 1000,
+        'startup_ms': (ready - imported) * 1000,
+        'first_update_ms': (handled - started) * 1000,
+        **side_effects,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(child()))
+        return 0
+
+    env = {**os.environ, 'PYTHONPATH': PACKAGE_DIR + os.pathsep + os.environ.get('PYTHONPATH', '')}
+    runs = []
+    for _ in range(args.runs):
+        workdir = tempfile.mkdtemp(prefix='cold_start_')
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.cold_start', '--child'],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result['process_ms'] = (time.perf_counter() - started) * 1000
+        runs.append(result)
+
+    for key, title in (('import_ms', 'импорт handlers'), ('startup_ms', 'create_app + startup'),
+                       ('first_update_ms', 'до первого апдейта'), ('process_ms', 'процесс целиком')):
+        print(f"{title:<22} {statistics.median(run[key] for run in runs):7.0f} мс (медиана из {len(runs)})")
+
+    files = runs[-1]['files_after_import']
+    print(f"Файлы после импорта handlers: {files or 'нет'}; openai импортирован: {runs[-1]['openai_imported']}")
+    return 1 if files or runs[-1]['openai_imported'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
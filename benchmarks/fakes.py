@@ -0,0 +1,165 @@
+"""Фейковые бэкенды для прогонов без сети: Telegram Bot API и OpenAI"""
+import asyncio
+import math
+import time
+import random
+from collections import Counter, deque
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Deque, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.types import Chat, Message, User
+
+from database import Database
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Распределение задержки в секундах из строки вида
+
+    const:MS | uniform:MIN_MS:MAX_MS | exp:MEAN_MS | lognormal:MEDIAN_MS:SIGMA
+    """
+    kind, *args = spec.split(':')
+    values = [float(arg) for arg in args]
+
+    if kind == 'const':
+        delay = values[0] / 1000
+        return lambda: delay
+    if kind == 'uniform':
+        low, high = values[0] / 1000, values[1] / 1000
+        return lambda: random.uniform(low, high)
+    if kind == 'exp':
+        mean = values[0] / 1000
+        return lambda: random.expovariate(1 / mean) if mean > 0 else 0.0
+    if kind == 'lognormal':
+        mu, sigma = math.log(values[0] / 1000), values[1]
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+class FakeBotSession(BaseSession):
+    """Сессия aiogram, которая отвечает на вызовы Bot API из памяти с заданной задержкой"""
+
+    def __init__(self, latency: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency or (lambda: 0.0)
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        self.calls[method.__api_method__] += 1
+        delay = self.latency()
+        if delay:
+            await asyncio.sleep(delay)
+        return self.respond(bot, method)
+
+    def respond(self, bot: Bot, method: TelegramMethod):
+        if isinstance(method, SendMessage):
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type='private'),
+                from_user=User(id=bot.id, is_bot=True, first_name='bot'),
+                text=method.text,
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+class RateLimitedBotSession(FakeBotSession):
+    """FakeBotSession, которая, как Telegram, отвечает RetryAfter при превышении лимитов
+
+    Лимиты — скользящие окна: не больше global_limit sendMessage в секунду на
+    бота и не больше chat_limit за chat_window секунд в один чат. Принятые
+    sendMessage копятся в sent в порядке прихода.
+    """
+
+    def __init__(self, latency: Optional[Callable[[], float]] = None, global_limit: int = 30,
+                 chat_limit: int = 5, chat_window: float = 3.0, **kwargs):
+        super().__init__(latency, **kwargs)
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.chat_window = chat_window
+        self.rejected: Counter = Counter()
+        self.sent: List[SendMessage] = []
+        self._global: Deque[float] = deque()
+        self._chats: Dict[int, Deque[float]] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        if isinstance(method, SendMessage):
+            self._check_limits(method)
+        return await super().make_request(bot, method, timeout)
+
+    def _check_limits(self, method: SendMessage):
+        now = time.monotonic()
+        chat = self._chats.setdefault(method.chat_id, deque())
+        for window, period, limit, kind in (
+            (self._global, 1.0, self.global_limit, 'global'),
+            (chat, self.chat_window, self.chat_limit, 'chat'),
+        ):
+            while window and now - window[0] >= period:
+                window.popleft()
+            if len(window) >= limit:
+                self.rejected[kind] += 1
+                retry_after = max(1, math.ceil(period - (now - window[0])))
+                raise TelegramRetryAfter(method, f"Too Many Requests: retry after {retry_after}", retry_after)
+        self._global.append(now)
+        chat.append(now)
+        self.sent.append(method)
+
+class FakeOpenAI:
+    """Подмена openai.AsyncOpenAI: chat.completions.create отвечает правдоподобной оценкой КБЖУ"""
+
+    RESPONSE = "Примерная оценка:\n🔥 Калории: {calories} ккал\n🥩 Белки: {proteins} г\n🥑 Жиры: {fats} г\n🍞 Углеводы: {carbs} г"
+
+    def __init__(self, latency: Optional[Callable[[], float]] = None):
+        self.latency = latency or (lambda: 0.0)
+        self.calls = 0
+        self.models: Counter = Counter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model: str, messages, max_tokens: int = 200, **kwargs):
+        self.calls += 1
+        self.models[model] += 1
+        delay = self.latency()
+        if delay:
+            await asyncio.sleep(delay)
+
+        content = self.RESPONSE.format(
+            calories=random.randint(150, 800),
+            proteins=random.randint(5, 50),
+            fats=random.randint(3, 40),
+            carbs=random.randint(10, 90),
+        )
+        prompt_tokens = sum(len(m['content']) for m in messages) // 4
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(content) // 4,
+                total_tokens=prompt_tokens + len(content) // 4,
+            ),
+        )
+
+class CountingDatabase(Database):
+    """Database, которая считает выполненные SQL-запросы"""
+
+    def __init__(self, *args, **kwargs):
+        self.queries: Counter = Counter()
+        super().__init__(*args, **kwargs)
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.set_trace_callback(self._count)
+        return conn
+
+    def _count(self, statement: str):
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else '?'
+        self.queries[verb] += 1
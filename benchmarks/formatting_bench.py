@@ -0,0 +1,61 @@
+"""Сравнение скомпилированных шаблонов с конкатенацией через += (с тем же экранированием)
+
+Запуск: python -m benchmarks.formatting_bench
+"""
+import timeit
+from html import escape
+
+import formatting
+from models import DailySummary, Kbju, Meal
+
+KBJU = {'calories': 450, 'proteins': 32, 'fats': 14, 'carbs': 48}
+SUMMARY = {'calories': 1320, 'proteins': 86, 'fats': 51, 'carbs': 140, 'meals': 3}
+TARGET = {'calories': 2100, 'proteins': 120, 'fats': 70, 'carbs': 230, 'bmr': 1650, 'tdee': 2550}
+FOOD = 'гречка с курицей & салат <огурцы, помидоры>'
+MEALS = [dict(KBJU, id=i, description=FOOD) for i in range(8)]
+# Те же данные в моделях, которые шаблонам передаёт бот
+KBJU_MODEL = Kbju(**KBJU)
+SUMMARY_MODEL = DailySummary(**SUMMARY)
+MEAL_MODELS = [Meal(**meal) for meal in MEALS]
+
+def legacy_meal_result():
+    response_text = f"🍽 Анализирую твою еду... ⏳\n\n"
+    response_text += f"Для {escape(FOOD, quote=False)}:\n"
+    response_text += f"🔥 Калории: {KBJU['calories']} ккал\n"
+    response_text += f"🥩 Белки: {KBJU['proteins']} г\n"
+    response_text += f"🥑 Жиры: {KBJU['fats']} г\n"
+    response_text += f"🍞 Углеводы: {KBJU['carbs']} г\n\n"
+    response_text += f"📊 Итого за день ({SUMMARY['meals']} приёмов пищи):\n"
+    response_text += f"🔥 Калории: {SUMMARY['calories']} ккал\n"
+    response_text += f"🥩 Белки: {SUMMARY['proteins']} г\n"
+    response_text += f"🥑 Жиры: {SUMMARY['fats']} г\n"
+    response_text += f"🍞 Углеводы: {SUMMARY['carbs']} г"
+    progress = (SUMMARY['calories'] / TARGET['calories']) * 100
+    response_text += f"\n\n🎯 Прогресс к цели: {progress:.1f}%"
+    return response_text
+
+def legacy_meals():
+    text = f"🍽 Приёмы пищи за сегодня ({len(MEALS)}):\n\n"
+    for i, meal in enumerate(MEALS, 1):
+        text += f"{i}. {escape(meal['description'], quote=False)}\n"
+        text += f"   🔥 {meal['calories']} ккал | 🥩 {meal['proteins']}г | 🥑 {meal['fats']}г | 🍞 {meal['carbs']}г\n\n"
+    return text
+
+CASES = [
+    ('результат приёма пищи', legacy_meal_result,
+     lambda: formatting.render_meal_result(formatting.ANALYZING, FOOD, KBJU_MODEL, SUMMARY_MODEL, TARGET['calories'])),
+    ('список /meals (8 строк)', legacy_meals, lambda: formatting.render_meals(MEAL_MODELS)),
+    ('сводка /day', None, lambda: formatting.render_day_summary(SUMMARY_MODEL, TARGET)),
+]
+
+def run(number: int = 20000):
+    print(f"{'сценарий':<28} {'+= (мкс)':>10} {'шаблон (мкс)':>14}")
+    for name, legacy, templated in CASES:
+        legacy_us = '—'
+        if legacy is not None:
+            legacy_us = f"{min(timeit.repeat(legacy, number=number, repeat=5)) / number * 1e6:.2f}"
+        templated_us = min(timeit.repeat(templated, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<28} {legacy_us:>10} {templated_us:>14.2f}")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,117 @@
+"""Разбор export.zip из Apple Health: скорость и пик памяти
+
+Генерирует синтетические выгрузки заданных размеров (записи активной и
+базальной энергии, шагов и веса от двух источников), разбирает каждую
+health.parse_export в отдельном процессе и печатает записи/с, МБ/с XML
+и пиковый RSS процесса. С --full для сравнения тот же XML читается
+целиком через ElementTree.parse.
+
+Запуск: python -m benchmarks.health_bench --records 100000,1000000 --full
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from xml.etree import ElementTree
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import health
+
+HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+]>
+<HealthData locale="ru_RU">
+ <ExportDate value="2024-06-01 10:00:00 +0300"/>
+ <Me HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexMale"/>
+'''
+RECORD = (
+    ' <Record type="{type}" sourceName="{source}" sourceVersion="17.5" unit="{unit}" '
+    'creationDate="{day} {time} +0300" startDate="{day} {time} +0300" endDate="{day} {time} +0300" value="{value}">\n'
+    '  <MetadataEntry key="HKMetadataKeySyncVersion" value="2"/>\n'
+    ' </Record>\n'
+)
+KINDS = [
+    (health.ACTIVE_ENERGY, 'kcal', lambda: round(random.uniform(0.5, 15), 3)),
+    (health.BASAL_ENERGY, 'kcal', lambda: round(random.uniform(0.8, 1.2), 3)),
+    (health.STEPS, 'count', lambda: random.randint(10, 400)),
+]
+SOURCES = ['iPhone', 'Apple Watch']
+
+def generate(path: str, records: int) -> int:
+    """Пишет export.zip потоком; возвращает размер XML в байтах"""
+    first_day = date(2024, 6, 1) - timedelta(days=max(records // 2000, 1))
+    written = 0
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('apple_health_export/export.xml', 'w') as f:
+            def write(text: str):
+                nonlocal written
+                data = text.encode()
+                written += len(data)
+                f.write(data)
+
+            write(HEADER)
+            for number in range(records):
+                day = (first_day + timedelta(days=number // 2000)).isoformat()
+                moment = f"{number % 24:02d}:{number % 60:02d}:00"
+                if number % 1000 == 0:
+                    kind, unit, value = health.BODY_MASS, 'kg', round(random.uniform(70, 90), 1)
+                else:
+                    kind, unit, make_value = random.choice(KINDS)
+                    value = make_value()
+                write(RECORD.format(type=kind, source=random.choice(SOURCES), unit=unit,
+                                    day=day, time=moment, value=value))
+            write('</HealthData>\n')
+    return written
+
+def run_streaming(path: str):
+    started = time.perf_counter()
+    days, records = health.parse_export(path)
+    return time.perf_counter() - started, records, len(days), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_full(path: str):
+    started = time.perf_counter()
+    with zipfile.ZipFile(path) as archive:
+        with archive.open('apple_health_export/export.xml') as f:
+            root = ElementTree.parse(f).getroot()
+    records = sum(1 for _ in root.iter('Record'))
+    return time.perf_counter() - started, records, 0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(func, path: str):
+    # Свежий процесс на каждый прогон, чтобы пик памяти был только его
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(func, path).result()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', default='100000,500000', help='размеры выгрузок через запятую')
+    parser.add_argument('--full', action='store_true', help='сравнить с ElementTree.parse всего файла')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='health_bench_')
+    for records in [int(value) for value in args.records.split(',')]:
+        path = os.path.join(workdir, f'export_{records}.zip')
+        xml_bytes = generate(path, records)
+        xml_mb = xml_bytes / 1024 / 1024
+        print(f"Записей: {records}, XML {xml_mb:.0f} МБ, zip {os.path.getsize(path) / 1024 / 1024:.0f} МБ")
+
+        modes = [('iterparse', run_streaming)] + ([('parse', run_full)] if args.full else [])
+        for name, func in modes:
+            elapsed, parsed, days, max_rss_kb = measure(func, path)
+            print(f"  {name:<9} {elapsed:6.1f} с  {parsed / elapsed:9.0f} записей/с  {xml_mb / elapsed:6.1f} МБ/с  "
+                  f"пик RSS {max_rss_kb / 1024:.0f} МБ" + (f"  дней: {days}" if days else ''))
+        os.remove(path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Нагрузочный прогон настоящих хендлеров на фейковых Telegram и OpenAI
+
+Каждый симулированный пользователь проходит /profile через ProfileStates,
+логирует несколько приёмов пищи и смотрит /day и /meals. Апдейты одного
+пользователя идут последовательно, пользователи — параллельно.
+
+Запуск:
+    python -m benchmarks.load_test --users 2000 --concurrency 200 \\
+        --gpt-latency lognormal:800:0.5 --bot-latency exp:40
+
+Те же сценарии на PostgreSQL (SQL-запросы тогда не считаются):
+    python -m benchmarks.load_test --database-url postgresql://localhost/nutrition_bot_test
+
+Как регрессионный бенчмарк:
+    python -m benchmarks.load_test --json bench.json             # сохранить базовую линию
+    python -m benchmarks.load_test --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:load-test')
+os.environ.setdefault('OPENAI_API_KEY', 'load-test')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.types import Chat, Message, Update, User
+
+from app import create_app
+import services
+from benchmarks.fakes import CountingDatabase, FakeBotSession, FakeOpenAI, parse_latency
+from benchmarks.stats import percentiles
+from storage import SQLiteStorage
+from usage import usage_report
+
+PROFILE_STEPS = ['/profile', 'Мужской', '30', '180', '80', 'Средний', 'похудеть', '✅ Принять таргет']
+FOODS = [
+    'овсянка на молоке 250 г с бананом',
+    'гречка с курицей',
+    'борщ и два куска хлеба',
+    'творог 5% 200 г',
+    'салат цезарь',
+    'яблоко',
+]
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.latencies: List[float] = []
+        self.latencies_by_kind: Dict[str, List[float]] = {}
+        self.update_id = 0
+        self.errors = 0
+        self.app = None
+
+    def make_update(self, user_id: int, text: str) -> Update:
+        self.update_id += 1
+        user = User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+        return Update(
+            update_id=self.update_id,
+            message=Message(
+                message_id=self.update_id,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type='private'),
+                from_user=user,
+                text=text,
+            ),
+        )
+
+    async def send(self, bot: Bot, user_id: int, text: str, kind: str):
+        update = self.make_update(user_id, text)
+        started = time.perf_counter()
+        try:
+            await self.app.dispatcher.feed_update(bot, update)
+        except Exception:
+            self.errors += 1
+        elapsed = time.perf_counter() - started
+        self.latencies.append(elapsed)
+        self.latencies_by_kind.setdefault(kind, []).append(elapsed)
+
+    async def simulate_user(self, bot: Bot, user_id: int, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            for text in PROFILE_STEPS:
+                await self.send(bot, user_id, text, 'profile')
+            for _ in range(self.args.meals):
+                await self.send(bot, user_id, random.choice(FOODS), 'food')
+            await self.send(bot, user_id, '/day', 'day')
+            await self.send(bot, user_id, '/meals', 'meals')
+
+    async def run(self) -> Dict:
+        args = self.args
+        if args.database_url:
+            from pg_storage import PostgresStorage
+            storage = PostgresStorage(args.database_url)
+            queries = Counter()
+        else:
+            counting = CountingDatabase(
+                os.path.join(tempfile.mkdtemp(prefix='load_test_'), 'load_test.db'),
+                write_behind_ms=args.write_behind_ms
+            )
+            storage = SQLiteStorage(counting)
+            queries = counting.queries
+        self.app = create_app(storage=storage)
+        await self.app.startup()
+        gpt = FakeOpenAI(parse_latency(args.gpt_latency))
+        services._client = gpt
+        session = FakeBotSession(parse_latency(args.bot_latency))
+        bot = Bot(
+            token=os.environ['TELEGRAM_BOT_TOKEN'],
+            session=session,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        queries.clear()
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.simulate_user(bot, 1_000_000 + i, semaphore) for i in range(args.users)
+        ))
+        wall = time.perf_counter() - started
+        await self.app.ledger.flush()
+        report = await usage_report(storage)
+        await self.app.shutdown()
+
+        return {
+            'users': args.users,
+            'concurrency': args.concurrency,
+            'updates': len(self.latencies),
+            'errors': self.errors,
+            'wall_s': round(wall, 3),
+            'updates_per_s': round(len(self.latencies) / wall, 1),
+            'latency_ms': percentiles(self.latencies),
+            'latency_ms_by_kind': {
+                kind: percentiles(values) for kind, values in sorted(self.latencies_by_kind.items())
+            },
+            'db_queries': sum(queries.values()),
+            'db_queries_per_update': round(sum(queries.values()) / max(len(self.latencies), 1), 2),
+            'db_queries_by_kind': dict(queries.most_common()),
+            'bot_api_calls': dict(session.calls.most_common()),
+            'gpt_calls': gpt.calls,
+            'gpt_calls_by_model': dict(gpt.models.most_common()),
+            'usage_report': report,
+        }
+
+def print_report(result: Dict):
+    print(f"Пользователи: {result['users']} (параллельно {result['concurrency']}), апдейтов: {result['updates']}, ошибок: {result['errors']}")
+    print(f"Пропускная способность: {result['updates_per_s']} апдейтов/с за {result['wall_s']} с")
+    latency = result['latency_ms']
+    print(f"Латентность, мс: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    for kind, values in result['latency_ms_by_kind'].items():
+        print(f"  {kind:<8} p50={values['p50']} p95={values['p95']} p99={values['p99']}")
+    print(f"SQL-запросов: {result['db_queries']} ({result['db_queries_per_update']} на апдейт) {result['db_queries_by_kind']}")
+    print(f"Вызовы Bot API: {result['bot_api_calls']}, вызовы GPT: {result['gpt_calls']} {result['gpt_calls_by_model']}")
+    print(result['usage_report'])
+
+def check_regression(result: Dict, baseline_path: str, max_regression: float) -> List[str]:
+    """Сравнивает с сохранённым прогоном; возвращает список деградаций"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    problems = []
+    if result['updates_per_s'] < baseline['updates_per_s'] * (1 - max_regression):
+        problems.append(f"updates/s: {result['updates_per_s']} < {baseline['updates_per_s']}")
+    for key in ('p50', 'p95', 'p99'):
+        if result['latency_ms'][key] > baseline['latency_ms'][key] * (1 + max_regression):
+            problems.append(f"{key}: {result['latency_ms'][key]} мс > {baseline['latency_ms'][key]} мс")
+    if result['db_queries_per_update'] > baseline['db_queries_per_update'] * (1 + max_regression):
+        problems.append(f"SQL на апдейт: {result['db_queries_per_update']} > {baseline['db_queries_per_update']}")
+    return problems
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--meals', type=int, default=3, help='приёмов пищи на пользователя')
+    parser.add_argument('--gpt-latency', default='lognormal:700:0.4')
+    parser.add_argument('--bot-latency', default='exp:30')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='прогон на PostgreSQL вместо временного SQLite')
+    parser.add_argument('--write-behind-ms', type=float, default=0, help='окно пакетной записи приёмов пищи в SQLite')
+    parser.add_argument('--json', help='сохранить результат в файл')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    result = asyncio.run(LoadTest(args).run())
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        problems = check_regression(result, args.baseline, args.max_regression)
+        for problem in problems:
+            print(f"РЕГРЕССИЯ: {problem}")
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Очередь исходящих против прямых send_message на фейковом Bot API с лимитами
+
+Одновременно идёт массовая рассылка по --bulk чатам и интерактивный трафик:
+--users пользователей получают по --replies ответа подряд, как от хендлера.
+Фейковый Bot API отвечает RetryAfter на превышение 30 сообщений/с и
+--chat-limit сообщений за 3 с в один чат.
+
+Запуск:
+    python -m benchmarks.send_queue --bulk 600 --users 50 --replies 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from aiogram import Bot
+
+from benchmarks.fakes import RateLimitedBotSession, parse_latency
+from benchmarks.stats import percentiles
+from middlewares import OutboundRequestMiddleware
+from sender import BULK, OutboundDispatcher, send_priority_var
+
+TOKEN = '123456:send-queue'
+
+async def run(args, use_queue: bool) -> Dict:
+    session = RateLimitedBotSession(parse_latency(args.bot_latency), chat_limit=args.chat_limit)
+    dispatcher = OutboundDispatcher()
+    if use_queue:
+        session.middleware(OutboundRequestMiddleware(dispatcher))
+    bot = Bot(token=TOKEN, session=session)
+
+    errors: List[Exception] = []
+    interactive: List[float] = []
+
+    async def send(chat_id: int, text: str) -> float:
+        started = time.perf_counter()
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception as e:
+            errors.append(e)
+        return time.perf_counter() - started
+
+    async def bulk():
+        send_priority_var.set(BULK)
+        await asyncio.gather(*(send(2_000_000 + i, 'Итоги дня') for i in range(args.bulk)))
+
+    async def user(chat_id: int):
+        await asyncio.sleep(chat_id % 100 / 100 * args.spread)
+        results = await asyncio.gather(*(send(chat_id, f"Ответ {n}") for n in range(args.replies)))
+        interactive.extend(results)
+
+    started = time.perf_counter()
+    await asyncio.gather(bulk(), *(user(1_000_000 + i) for i in range(args.users)))
+    wall = time.perf_counter() - started
+    await dispatcher.close()
+
+    return {
+        'mode': 'queue' if use_queue else 'direct',
+        'wall_s': round(wall, 2),
+        'messages': args.bulk + args.users * args.replies,
+        'bot_api_calls': session.calls['sendMessage'],
+        'rejected_by_api': dict(session.rejected),
+        'errors': len(errors),
+        'interactive_ms': percentiles(interactive),
+        'queue': dispatcher.stats() if use_queue else None,
+    }
+
+def print_report(result: Dict):
+    latency = result['interactive_ms']
+    print(f"[{result['mode']}] {result['messages']} сообщений за {result['wall_s']} с, "
+          f"вызовов API: {result['bot_api_calls']}, отказов API: {result['rejected_by_api']}, ошибок: {result['errors']}")
+    print(f"  интерактивные ответы, мс: p50={latency['p50']} p95={latency['p95']} p99={latency['p99']}")
+    if result['queue']:
+        print(f"  очередь: {result['queue']}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bulk', type=int, default=600)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--replies', type=int, default=4)
+    parser.add_argument('--spread', type=float, default=10.0, help='за сколько секунд приходят пользователи')
+    parser.add_argument('--chat-limit', type=int, default=5)
+    parser.add_argument('--bot-latency', default='exp:30')
+    parser.add_argument('--mode', choices=('both', 'direct', 'queue'), default='both')
+    args = parser.parse_args(argv)
+
+    modes = [False, True] if args.mode == 'both' else [args.mode == 'queue']
+    for use_queue in modes:
+        print_report(asyncio.run(run(args, use_queue)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
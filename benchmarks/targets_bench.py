@@ -0,0 +1,79 @@
+"""Таргеты по одному пользователю против пакетного расчёта на NumPy
+
+Заполняет временную базу случайными профилями, считает таргеты всех
+пользователей через Database.calculate_target_calories и через
+Database.calculate_targets_bulk, сверяет результаты и печатает время,
+число SQL-запросов и сводку по категориям целей.
+
+Запуск: python -m benchmarks.targets_bench --users 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from benchmarks.fakes import CountingDatabase
+
+GENDERS = ['Мужской', 'Женский']
+ACTIVITIES = ['Низкий', 'Средний', 'Высокий']
+GOALS = ['похудеть', 'набрать вес', 'больше протеина', 'снизить холестерин', 'поддерживать вес', 'быть бодрым']
+
+def fill(db: CountingDatabase, users: int):
+    with db._connect() as conn:
+        conn.executemany(
+            'INSERT INTO users (user_id, gender, age, height, weight, activity, goal, target_calories) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    user_id, random.choice(GENDERS), random.randint(16, 70), random.randint(150, 200),
+                    random.randint(45, 130), random.choice(ACTIVITIES), random.choice(GOALS),
+                    # Каждый десятый сам назвал калории
+                    random.randint(1200, 3500) if random.random() < 0.1 else None
+                )
+                for user_id in range(1, users + 1)
+            ]
+        )
+        conn.commit()
+    # Категории целей заполняет миграция при открытии базы
+    db.init_database()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    db = CountingDatabase(os.path.join(tempfile.mkdtemp(prefix='targets_bench_'), 'targets.db'))
+    fill(db, args.users)
+    user_ids = list(range(1, args.users + 1))
+
+    db.queries.clear()
+    started = time.perf_counter()
+    single = {user_id: db.calculate_target_calories(user_id) for user_id in user_ids}
+    single_s = time.perf_counter() - started
+    single_queries = sum(db.queries.values())
+
+    db.queries.clear()
+    started = time.perf_counter()
+    table = db.calculate_targets_bulk()
+    bulk_s = time.perf_counter() - started
+    bulk_queries = sum(db.queries.values())
+
+    mismatches = sum(1 for user_id in user_ids if table.target(user_id) != single[user_id])
+
+    print(f"Пользователей: {args.users}")
+    print(f"По одному: {single_s * 1000:.0f} мс, SQL-запросов: {single_queries}")
+    print(f"Пакетно:   {bulk_s * 1000:.0f} мс, SQL-запросов: {bulk_queries} (x{single_s / bulk_s:.0f} быстрее)")
+    print(f"Расхождений: {mismatches}")
+    for row in table.by_goal():
+        print(f"  {row['goal']:<13} {row['users']:>7} польз.  {row['calories']} ккал  "
+              f"Б {row['proteins']}  Ж {row['fats']}  У {row['carbs']}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
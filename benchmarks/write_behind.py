@@ -0,0 +1,94 @@
+"""Запись приёмов пищи: коммит на каждый приём против write-behind с разными окнами
+
+Для каждого окна — свежая SQLite в --dir (по умолчанию рядом с запуском:
+/tmp бывает tmpfs, где fsync ничего не стоит) и --meals приёмов пищи от
+--users пользователей, которые --concurrency корутин сохраняют через
+SQLiteStorage.save_meal, как хендлеры. Окно 0 — текущий режим: отдельная
+транзакция на каждый приём пищи в потоке пула. Печатает вставки в секунду,
+латентность save_meal, число транзакций и проверяет, что в meals и
+daily_summaries ничего не потерялось.
+
+Запуск: python -m benchmarks.write_behind --meals 5000 --windows 0,1,2,5,10
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from benchmarks.stats import percentiles
+from database import Database
+from models import Kbju
+from storage import SQLiteStorage
+
+async def run_window(path: str, window_ms: float, args) -> Dict:
+    storage = SQLiteStorage(Database(path, write_behind_ms=window_ms))
+    latencies: List[float] = []
+    failed = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def save(number: int):
+        nonlocal failed
+        async with semaphore:
+            kbju = Kbju(random.randint(50, 800), random.randint(1, 50), random.randint(1, 40), random.randint(1, 90))
+            started = time.perf_counter()
+            meal_id = await storage.save_meal(number % args.users + 1, f"блюдо {number % 50}", kbju)
+            latencies.append(time.perf_counter() - started)
+            if meal_id is None:
+                failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(save(number) for number in range(args.meals)))
+    elapsed = time.perf_counter() - started
+    await storage.close()
+
+    writer = storage.db.writer
+    with sqlite3.connect(path) as conn:
+        meals = conn.execute('SELECT COUNT(*) FROM meals').fetchone()[0]
+        counted = conn.execute('SELECT COALESCE(SUM(meals_count), 0) FROM daily_summaries').fetchone()[0]
+    return {
+        'inserts_per_s': args.meals / elapsed,
+        'latency_ms': percentiles(latencies),
+        'transactions': writer.batches if writer else args.meals,
+        'failed': failed,
+        'consistent': meals == counted == args.meals,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--meals', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--windows', default='0,1,2,5,10', help='окна пакетной записи в мс через запятую; 0 — без неё')
+    parser.add_argument('--dir', default='.', help='где создавать временные базы')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='write_behind_', dir=args.dir)
+    problems = 0
+    try:
+        print(f"Приёмов пищи: {args.meals}, пользователей: {args.users}, параллельно: {args.concurrency}")
+        for window_ms in [float(value) for value in args.windows.split(',')]:
+            path = os.path.join(workdir, f'window_{window_ms:g}.db')
+            result = asyncio.run(run_window(path, window_ms, args))
+            latency = result['latency_ms']
+            title = 'коммит на приём' if window_ms == 0 else f'окно {window_ms:g} мс'
+            print(f"  {title:<16} {result['inserts_per_s']:8.0f} вставок/с  "
+                  f"транзакций {result['transactions']:>5} (по {args.meals / result['transactions']:.1f})  "
+                  f"p50={latency['p50']} p99={latency['p99']} мс"
+                  + ('' if result['consistent'] and not result['failed'] else '  РАСХОЖДЕНИЕ'))
+            problems += not result['consistent'] or result['failed'] > 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
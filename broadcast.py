@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from storage import Storage
+from sender import BULK, INTERACTIVE, send_priority_var
+from tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+# id администраторов через запятую; только им доступна /broadcast
+ADMIN_IDS = {int(value) for value in os.getenv('ADMIN_IDS', '').replace(' ', '').split(',') if value}
+# Получателей на страницу: столько id в памяти, и не больше стольких сообщений отправится повторно после рестарта
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', '100'))
+
+def is_admin(user_id: int) -> bool:
+    return user_id in ADMIN_IDS
+
+def render_report(broadcast: Dict) -> str:
+    status = {'running': 'идёт', 'done': 'завершена', 'failed': 'прервана ошибкой'}.get(broadcast['status'], broadcast['status'])
+    return (
+        f"📣 Рассылка #{broadcast['id']} — {status}\n"
+        f"✅ Доставлено: {broadcast['delivered']}\n"
+        f"🚫 Заблокировали бота: {broadcast['blocked']}\n"
+        f"⚠️ Ошибок: {broadcast['failed']}"
+    )
+
+class Broadcaster:
+    """Рассылка всем пользователям с продолжением после рестарта
+
+    Получатели читаются страницами по первичному ключу (user_id > последний),
+    так что в памяти только одна страница. Страница целиком ставится в
+    массовую полосу очереди исходящих, которая держит лимиты Telegram, и после
+    неё в broadcasts сохраняются last_user_id и счётчики. После рестарта
+    рассылка продолжается с последней сохранённой страницы.
+    """
+
+    def __init__(self, db: Storage, page_size: int = BROADCAST_PAGE_SIZE):
+        self.db = db
+        self.page_size = page_size
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def is_running(self) -> bool:
+        return any(not task.done() for task in self._tasks.values())
+
+    def start(self, bot: Bot, broadcast: Dict) -> asyncio.Task:
+        task = asyncio.create_task(self._run(bot, broadcast))
+        self._tasks[broadcast['id']] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast['id'], None))
+        return task
+
+    async def resume(self, bot: Bot) -> List[asyncio.Task]:
+        """Продолжает рассылки, прерванные рестартом; вызывается из App.run()"""
+        tasks = []
+        for broadcast in await self.db.get_running_broadcasts():
+            if broadcast['id'] not in self._tasks:
+                logger.info("Продолжаем рассылку", extra={'broadcast_id': broadcast['id'], 'after_user_id': broadcast['last_user_id']})
+                tasks.append(self.start(bot, broadcast))
+        return tasks
+
+    async def _run(self, bot: Bot, broadcast: Dict):
+        send_priority_var.set(BULK)
+        broadcast_id = broadcast['id']
+        counters = {key: broadcast[key] for key in ('delivered', 'blocked', 'failed')}
+        last_user_id = broadcast['last_user_id']
+
+        try:
+            while True:
+                user_ids = await self.db.get_user_ids_after(last_user_id, self.page_size)
+                if not user_ids:
+                    break
+
+                with start_trace('broadcast.page', broadcast_id=broadcast_id, recipients=len(user_ids)):
+                    await self._send_page(bot, broadcast['text'], user_ids, counters)
+
+                last_user_id = user_ids[-1]
+                await self.db.save_broadcast_progress(broadcast_id, last_user_id, **counters)
+                logger.debug("Страница рассылки отправлена", extra={'broadcast_id': broadcast_id, **counters})
+
+            await self.db.save_broadcast_progress(broadcast_id, last_user_id, status='done', **counters)
+        except Exception as e:
+            logger.exception("Рассылка #%s прервана: %s", broadcast_id, e)
+            # Рассылка не должна остаться в статусе running: иначе можно запустить вторую,
+            # а после рестарта resume() продолжит обе
+            try:
+                await self.db.save_broadcast_progress(broadcast_id, last_user_id, status='failed', **counters)
+            except Exception as e:
+                logger.error("Не удалось сохранить статус рассылки #%s: %s", broadcast_id, e)
+            return
+
+        report = render_report(await self.db.get_broadcast(broadcast_id))
+        logger.info("Рассылка завершена", extra={'broadcast_id': broadcast_id, **counters})
+
+        # Отчёт администратору — обычный ответ, не часть рассылки
+        send_priority_var.set(INTERACTIVE)
+        try:
+            await bot.send_message(broadcast['created_by'], report)
+        except Exception as e:
+            logger.warning("Не удалось отправить отчёт о рассылке: %s", e)
+
+    async def _send_page(self, bot: Bot, text: str, user_ids: List[int], counters: Dict[str, int]):
+        results = await asyncio.gather(
+            *(bot.send_message(user_id, text) for user_id in user_ids),
+            return_exceptions=True
+        )
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, TelegramForbiddenError):
+                counters['blocked'] += 1
+            elif isinstance(result, Exception):
+                counters['failed'] += 1
+                logger.debug("Сообщение рассылки не доставлено %s: %s", user_id, result)
+            else:
+                counters['delivered'] += 1
@@ -1,19 +1,199 @@
+import logging
+import queue
 import sqlite3
 import os
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime, date
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
+from frequent import index_rows, logaddexp, logsubexp, meal_key, use_score
+from goals import classify_goal
+from models import DailySummary, FrequentMeal, HealthDay, Kbju, Meal, UserProfile
+from targets import TARGET_COLUMNS, TargetTable, profile_bmr, profile_target, target_table
+from tracing import trace_methods
+
+logger = logging.getLogger(__name__)
+
+# Сколько id подставлять в один запрос IN (...); лимит параметров старых SQLite — 999
+BULK_CHUNK_SIZE = 500
+
+# Окно пакетной записи приёмов пищи в мс (см. MealWriter); 0 — коммит на каждый приём пищи
+DB_WRITE_BEHIND_MS = float(os.getenv('DB_WRITE_BEHIND_MS', '0'))
+# Больше записей в одну транзакцию не собираем, даже если окно ещё не истекло
+DB_WRITE_BEHIND_MAX_BATCH = int(os.getenv('DB_WRITE_BEHIND_MAX_BATCH', '500'))
+
+# Колонки SELECT в порядке аргументов конструкторов моделей (для row_factory)
+PROFILE_COLUMNS = (
+    'user_id, gender, age, height, weight, activity, goal, goal_category, target_calories, health_active_energy'
+)
+KBJU_COLUMNS = 'COALESCE(calories, 0), COALESCE(proteins, 0), COALESCE(fats, 0), COALESCE(carbs, 0)'
+MEAL_COLUMNS = f'id, description, {KBJU_COLUMNS}'
+# Момент записи приёма пищи в секундах эпохи (created_at в UTC); для строк без него — дата
+MEAL_USED_AT = "CAST(strftime('%s', COALESCE(created_at, date)) AS REAL)"
+FREQUENT_COLUMNS = f'id, description, {KBJU_COLUMNS}, uses'
+SUMMARY_COLUMNS = (
+    'COALESCE(total_calories, 0), COALESCE(total_proteins, 0), '
+    'COALESCE(total_fats, 0), COALESCE(total_carbs, 0), COALESCE(meals_count, 0)'
+)
+
+# Приём пищи в очереди на запись: (user_id, описание, КБЖУ, дата)
+MealWrite = Tuple[int, str, Kbju, str]
+
+def _chunks(items: Sequence, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class MealWriter:
+    """Write-behind для приёмов пищи: пачка за окно в несколько мс — одна транзакция
+
+    Каждый save_meal — отдельный коммит и fsync, и в обеденный пик запись
+    упирается в частоту fsync диска. Здесь приёмы пищи от всех пользователей
+    копятся в очереди не дольше window_ms от первого в пачке, а фоновый
+    поток пишет их вместе с дельтами дневных сводок одной транзакцией.
+    Future каждой записи завершается только после коммита её пачки, так что
+    хендлер, дождавшийся id, видит запись на диске. close() дописывает
+    очередь и останавливает поток.
+    """
+
+    def __init__(self, db: 'Database', window_ms: float, max_batch: int = DB_WRITE_BEHIND_MAX_BATCH):
+        self.db = db
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, write: MealWrite) -> Optional[Future]:
+        """Ставит приём пищи в очередь; None, если писатель уже закрыт"""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                return None
+            # Поток мог упасть на неожиданной ошибке — поднимаем новый, очередь он дочитает
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='meal-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((write, future))
+        return future
+
+    def close(self):
+        """Дописывает всё, что уже в очереди, и останавливает поток"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            if thread is not None and thread.is_alive():
+                self._queue.put(None)
+            else:
+                thread = None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        conn: Optional[sqlite3.Connection] = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.window
+                stop = False
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                conn = self._flush(conn, batch)
+                if stop:
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _flush(self, conn: Optional[sqlite3.Connection],
+               batch: List[Tuple[MealWrite, Future]]) -> Optional[sqlite3.Connection]:
+        """Пишет пачку и завершает Future каждой записи; возвращает соединение для следующей
+
+        Соединение открывается при первой пачке. Если его не удалось открыть
+        или оно сломалось (не прошёл даже rollback), записи пачки без id
+        получают None, как при ошибке save_meal, а следующая пачка
+        подключится заново.
+        """
+        writes = [write for write, _ in batch]
+        meal_ids: List[Optional[int]] = []
+        try:
+            if conn is None:
+                conn = self.db._connect()
+            try:
+                meal_ids = self.db._write_meals(conn, writes)
+            except Exception as e:
+                conn.rollback()
+                logger.error("Ошибка пакетной записи %s приёмов пищи, пишем по одному: %s", len(writes), e)
+                # Одна сбойная запись не должна потерять остальные
+                for write in writes:
+                    try:
+                        meal_ids += self.db._write_meals(conn, [write])
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error("Ошибка сохранения приёма пищи: %s", e)
+                        meal_ids.append(None)
+        except Exception as e:
+            logger.error("Ошибка соединения пакетной записи, переподключимся: %s", e)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            conn = None
+        finally:
+            self.batches += 1
+            self.writes += len(writes)
+            meal_ids += [None] * (len(batch) - len(meal_ids))
+            for (_, future), meal_id in zip(batch, meal_ids):
+                future.set_result(meal_id)
+        return conn
+
+@trace_methods('db')
 class Database:
-    def __init__(self, db_path: str = "nutrition_bot.db"):
+    def __init__(self, db_path: str = "nutrition_bot.db", write_behind_ms: float = 0, init: bool = True):
         self.db_path = db_path
-        self.init_database()
+        # Пакетная запись приёмов пищи включается явно, см. MealWriter
+        self.writer = MealWriter(self, write_behind_ms) if write_behind_ms > 0 else None
+        # init=False — схему создаст SQLiteStorage.connect(), а не конструктор
+        if init:
+            self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Новое соединение с базой; все методы ходят в базу только через него"""
+        conn = sqlite3.connect(self.db_path)
+        # Сложение и вычитание рейтингов частых блюд (frequent.logaddexp, frequent.logsubexp)
+        conn.create_function('logaddexp', 2, logaddexp, deterministic=True)
+        conn.create_function('logsubexp', 2, logsubexp, deterministic=True)
+        return conn
+
+    def close(self):
+        """Дописывает отложенные приёмы пищи; вызывается при остановке бота"""
+        if self.writer is not None:
+            self.writer.close()
 
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
-        print(f"DEBUG: Инициализация БД: {self.db_path}")
+        logger.info("Инициализация БД: %s", self.db_path)
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # Таблица пользователей
@@ -29,7 +209,8 @@ class Database:
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 ''')
-                print("DEBUG: Таблица users создана/проверена")
+                logger.debug("Таблица users создана/проверена")
+                self._migrate_users(cursor)
                 
                 # Таблица приёмов пищи
                 cursor.execute('''
@@ -46,7 +227,9 @@ class Database:
                         FOREIGN KEY (user_id) REFERENCES users (user_id)
                     )
                 ''')
-                print("DEBUG: Таблица meals создана/проверена")
+                # Все чтения meals — по пользователю и дате (день, /meals, архивация по горизонту)
+                cursor.execute('CREATE INDEX IF NOT EXISTS meals_user_date ON meals (user_id, date)')
+                logger.debug("Таблица meals создана/проверена")
                 
                 # Таблица дневных сводок
                 cursor.execute('''
@@ -65,347 +248,820 @@ class Database:
                         UNIQUE(user_id, date)
                     )
                 ''')
-                print("DEBUG: Таблица daily_summaries создана/проверена")
+                logger.debug("Таблица daily_summaries создана/проверена")
+                
+                # Таблица подписок на напоминания и вечерние сводки
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS subscriptions (
+                        user_id INTEGER PRIMARY KEY,
+                        utc_offset_minutes INTEGER DEFAULT 180,
+                        reminder_time TEXT,
+                        summary_time TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (user_id) REFERENCES users (user_id)
+                    )
+                ''')
+                logger.debug("Таблица subscriptions создана/проверена")
+                
+                # Таблица рассылок; last_user_id — контрольная точка для продолжения после рестарта
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS broadcasts (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        text TEXT,
+                        created_by INTEGER,
+                        status TEXT DEFAULT 'running',
+                        last_user_id INTEGER DEFAULT 0,
+                        delivered INTEGER DEFAULT 0,
+                        blocked INTEGER DEFAULT 0,
+                        failed INTEGER DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                logger.debug("Таблица broadcasts создана/проверена")
+                
+                # Дневные итоги из Apple Health
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS health_days (
+                        user_id INTEGER,
+                        date TEXT,
+                        active_energy INTEGER,
+                        basal_energy INTEGER,
+                        steps INTEGER,
+                        body_mass REAL,
+                        PRIMARY KEY (user_id, date)
+                    )
+                ''')
+                logger.debug("Таблица health_days создана/проверена")
+                
+                # Расход GPT: строка на пользователя, день и модель; latency_ms — сумма по запросам
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS gpt_usage (
+                        user_id INTEGER,
+                        date TEXT,
+                        model TEXT,
+                        requests INTEGER DEFAULT 0,
+                        prompt_tokens INTEGER DEFAULT 0,
+                        completion_tokens INTEGER DEFAULT 0,
+                        cost REAL DEFAULT 0,
+                        latency_ms INTEGER DEFAULT 0,
+                        max_latency_ms INTEGER DEFAULT 0,
+                        PRIMARY KEY (user_id, date, model)
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS gpt_usage_date ON gpt_usage (date)')
+                logger.debug("Таблица gpt_usage создана/проверена")
+                
+                # Частые блюда: строка на пользователя и описание (frequent.meal_key),
+                # КБЖУ последнего раза и рейтинг «часто и недавно» (frequent.use_score)
+                index_exists = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'frequent_meals'"
+                ).fetchone()
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS frequent_meals (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER,
+                        meal_key TEXT,
+                        description TEXT,
+                        calories INTEGER,
+                        proteins INTEGER,
+                        fats INTEGER,
+                        carbs INTEGER,
+                        uses INTEGER DEFAULT 0,
+                        score REAL,
+                        UNIQUE (user_id, meal_key)
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS frequent_meals_rank ON frequent_meals (user_id, score)')
+                if not index_exists:
+                    self._fill_frequent_meals(cursor)
+                logger.debug("Таблица frequent_meals создана/проверена")
                 
                 conn.commit()
-                print("DEBUG: База данных инициализирована успешно")
+                logger.info("База данных инициализирована успешно")
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка инициализации БД: {e}")
+            logger.error("Ошибка инициализации БД: %s", e)
 
-    def save_user_profile(self, user_id: int, profile_data: Dict) -> bool:
-        """Сохранение профиля пользователя"""
+    def _migrate_users(self, cursor):
+        """Колонки goal_category, target_calories и health_active_energy для баз, созданных до них, и заполнение категорий"""
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(users)')}
+        if 'goal_category' not in columns:
+            cursor.execute('ALTER TABLE users ADD COLUMN goal_category INTEGER')
+        if 'target_calories' not in columns:
+            cursor.execute('ALTER TABLE users ADD COLUMN target_calories INTEGER')
+        if 'health_active_energy' not in columns:
+            cursor.execute('ALTER TABLE users ADD COLUMN health_active_energy INTEGER')
+        
+        rows = cursor.execute('SELECT user_id, goal FROM users WHERE goal_category IS NULL').fetchall()
+        if rows:
+            cursor.executemany(
+                'UPDATE users SET goal_category = ? WHERE user_id = ?',
+                [(int(classify_goal(goal)), user_id) for user_id, goal in rows]
+            )
+            logger.info("Категории целей заполнены для %s профилей", len(rows))
+
+    def _fill_frequent_meals(self, cursor):
+        """Первое заполнение индекса частых блюд из истории; дальше его ведёт save_meal"""
+        rows = index_rows(cursor.execute(
+            'SELECT user_id, description, calories, proteins, fats, carbs, date FROM meals ORDER BY id'
+        ))
+        cursor.executemany('''
+            INSERT INTO frequent_meals
+            (user_id, meal_key, description, calories, proteins, fats, carbs, uses, score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        if rows:
+            logger.info("Индекс частых блюд заполнен из истории: %s строк", len(rows))
+
+    def save_user_profile(self, profile: UserProfile) -> bool:
+        """Сохранение профиля пользователя
+
+        Текст цели разбирается здесь, один раз: категория сохраняется в
+        goal_category, и расчёт таргета дальше обходится без поиска подстрок.
+        """
+        profile.goal_category = int(classify_goal(profile.goal))
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
+                # health_active_energy не трогаем: её пишет импорт Apple Health
                 cursor.execute('''
-                    INSERT OR REPLACE INTO users 
-                    (user_id, gender, age, height, weight, activity, goal)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO users 
+                    (user_id, gender, age, height, weight, activity, goal, goal_category, target_calories)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        gender = excluded.gender, age = excluded.age, height = excluded.height,
+                        weight = excluded.weight, activity = excluded.activity, goal = excluded.goal,
+                        goal_category = excluded.goal_category, target_calories = excluded.target_calories
                 ''', (
-                    user_id,
-                    profile_data.get('gender'),
-                    profile_data.get('age'),
-                    profile_data.get('height'),
-                    profile_data.get('weight'),
-                    profile_data.get('activity'),
-                    profile_data.get('goal')
+                    profile.user_id,
+                    profile.gender,
+                    profile.age,
+                    profile.height,
+                    profile.weight,
+                    profile.activity,
+                    profile.goal,
+                    profile.goal_category,
+                    profile.target_calories
                 ))
                 
                 conn.commit()
-                print(f"DEBUG: Профиль пользователя {user_id} сохранён")
+                logger.debug("Профиль пользователя %s сохранён", profile.user_id)
                 return True
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка сохранения профиля: {e}")
+            logger.error("Ошибка сохранения профиля: %s", e)
             return False
 
-    def get_user_profile(self, user_id: int) -> Optional[Dict]:
+    def get_user_profile(self, user_id: int) -> Optional[UserProfile]:
         """Получение профиля пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = UserProfile.row_factory
                 
-                cursor.execute('''
-                    SELECT gender, age, height, weight, activity, goal
+                cursor.execute(f'''
+                    SELECT {PROFILE_COLUMNS}
                     FROM users WHERE user_id = ?
                 ''', (user_id,))
                 
-                row = cursor.fetchone()
-                if row:
-                    return {
-                        'gender': row[0],
-                        'age': row[1],
-                        'height': row[2],
-                        'weight': row[3],
-                        'activity': row[4],
-                        'goal': row[5]
-                    }
-                return None
+                return cursor.fetchone()
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка получения профиля: {e}")
+            logger.error("Ошибка получения профиля: %s", e)
             return None
 
     def user_profile_exists(self, user_id: int) -> bool:
         """Проверка существования профиля пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,))
                 return cursor.fetchone() is not None
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка проверки профиля: {e}")
+            logger.error("Ошибка проверки профиля: %s", e)
             return False
 
-    def save_meal(self, user_id: int, description: str, kbju_data: Dict) -> bool:
-        """Сохранение приёма пищи"""
+    def save_meal(self, user_id: int, description: str, kbju: Kbju) -> Optional[int]:
+        """Сохранение приёма пищи, возвращает id записи
+
+        В режиме write-behind ждёт коммита пачки, в которую попала запись.
+        """
+        future = self.submit_meal(user_id, description, kbju)
+        if future is not None:
+            return future.result()
+        
+        today = date.today().strftime('%Y-%m-%d')
+        try:
+            with self._connect() as conn:
+                meal_id, = self._write_meals(conn, [(user_id, description, kbju, today)])
+                logger.debug("Приём пищи %s сохранён в таблицу meals", meal_id)
+                return meal_id
+                
+        except Exception as e:
+            logger.error("Ошибка сохранения приёма пищи: %s", e)
+            return None
+
+    def submit_meal(self, user_id: int, description: str, kbju: Kbju) -> Optional[Future]:
+        """Приём пищи в очередь write-behind; Future с id после коммита пачки
+
+        None, если режим выключен или писатель уже остановлен: тогда
+        сохранять нужно обычным save_meal.
+        """
+        if self.writer is None:
+            return None
+        return self.writer.submit((user_id, description, kbju, date.today().strftime('%Y-%m-%d')))
+
+    def _write_meals(self, conn: sqlite3.Connection, writes: List[MealWrite]) -> List[int]:
+        """Вставка приёмов пищи, сводок и частых блюд одной транзакцией; возвращает id по порядку
+
+        Дельты сводок по одному пользователю и дню складываются, поэтому на
+        пачку приходится по одному UPSERT в daily_summaries на пользователя.
+        """
+        cursor = conn.cursor()
+        meal_ids = []
+        deltas: Dict[Tuple[int, str], Tuple[Kbju, int]] = {}
+        
+        for user_id, description, kbju, date_str in writes:
+            cursor.execute('''
+                INSERT INTO meals 
+                (user_id, description, calories, proteins, fats, carbs, date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                user_id,
+                description,
+                kbju.calories,
+                kbju.proteins,
+                kbju.fats,
+                kbju.carbs,
+                date_str
+            ))
+            meal_ids.append(cursor.lastrowid)
+            
+            total, count = deltas.get((user_id, date_str), (Kbju(), 0))
+            deltas[(user_id, date_str)] = (total + kbju, count + 1)
+            self._bump_frequent_meal(conn, user_id, description, kbju)
+        
+        # Дневные сводки в той же транзакции
+        for (user_id, date_str), (delta, count) in deltas.items():
+            self._apply_summary_delta(cursor, user_id, date_str, delta, count)
+        
+        conn.commit()
+        return meal_ids
+
+    def update_meal(self, user_id: int, meal_id: int, description: str, kbju: Kbju) -> bool:
+        """Изменение приёма пищи с поправкой дневной сводки на разницу"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                today = date.today().strftime('%Y-%m-%d')
+                cursor.execute(f'''
+                    SELECT {MEAL_COLUMNS}, date, {MEAL_USED_AT}
+                    FROM meals WHERE id = ? AND user_id = ?
+                ''', (meal_id, user_id))
+                
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                old, meal_date, used_at = Meal(*row[:6]), row[6], row[7]
                 
                 cursor.execute('''
-                    INSERT INTO meals 
-                    (user_id, description, calories, proteins, fats, carbs, date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    UPDATE meals 
+                    SET description = ?, calories = ?, proteins = ?, fats = ?, carbs = ?
+                    WHERE id = ?
                 ''', (
-                    user_id,
                     description,
-                    kbju_data.get('calories', 0),
-                    kbju_data.get('proteins', 0),
-                    kbju_data.get('fats', 0),
-                    kbju_data.get('carbs', 0),
-                    today
+                    kbju.calories,
+                    kbju.proteins,
+                    kbju.fats,
+                    kbju.carbs,
+                    meal_id
                 ))
                 
-                conn.commit()
-                print("DEBUG: Приём пищи сохранён в таблицу meals")
+                self._apply_summary_delta(cursor, user_id, meal_date, kbju - old, 0)
                 
-                # Обновляем дневную сводку
-                self._update_daily_summary(user_id, today, kbju_data)
+                # В частых блюдах — исправленное описание и КБЖУ, а не ошибочные
+                self._unbump_frequent_meal(cursor, user_id, old, used_at)
+                self._bump_frequent_meal(conn, user_id, description, kbju)
                 
+                conn.commit()
+                logger.debug("Приём пищи %s изменён", meal_id)
                 return True
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка сохранения приёма пищи: {e}")
+            logger.error("Ошибка изменения приёма пищи: %s", e)
             return False
 
-    def _update_daily_summary(self, user_id: int, date_str: str, new_meal_kbju: Dict):
-        """Обновление дневной сводки"""
+    def delete_meal(self, user_id: int, meal_id: int) -> Optional[Meal]:
+        """Удаление приёма пищи с вычитанием его из дневной сводки"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
-                # Получаем текущие итоги
-                cursor.execute('''
-                    SELECT total_calories, total_proteins, total_fats, total_carbs, meals_count
-                    FROM daily_summaries 
-                    WHERE user_id = ? AND date = ?
-                ''', (user_id, date_str))
+                cursor.execute(f'''
+                    SELECT {MEAL_COLUMNS}, date, {MEAL_USED_AT}
+                    FROM meals WHERE id = ? AND user_id = ?
+                ''', (meal_id, user_id))
                 
                 row = cursor.fetchone()
+                if not row:
+                    return None
+                deleted, meal_date, used_at = Meal(*row[:6]), row[6], row[7]
                 
-                if row:
-                    # Обновляем существующую запись
-                    current_calories = row[0] or 0
-                    current_proteins = row[1] or 0
-                    current_fats = row[2] or 0
-                    current_carbs = row[3] or 0
-                    current_meals = row[4] or 0
-                    
-                    new_calories = current_calories + new_meal_kbju.get('calories', 0)
-                    new_proteins = current_proteins + new_meal_kbju.get('proteins', 0)
-                    new_fats = current_fats + new_meal_kbju.get('fats', 0)
-                    new_carbs = current_carbs + new_meal_kbju.get('carbs', 0)
-                    new_meals = current_meals + 1
-                    
-                    cursor.execute('''
-                        UPDATE daily_summaries 
-                        SET total_calories = ?, total_proteins = ?, total_fats = ?, 
-                            total_carbs = ?, meals_count = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE user_id = ? AND date = ?
-                    ''', (new_calories, new_proteins, new_fats, new_carbs, new_meals, user_id, date_str))
-                    
-                else:
-                    # Создаём новую запись
-                    cursor.execute('''
-                        INSERT INTO daily_summaries 
-                        (user_id, date, total_calories, total_proteins, total_fats, total_carbs, meals_count)
-                        VALUES (?, ?, ?, ?, ?, ?, 1)
-                    ''', (
-                        user_id, date_str,
-                        new_meal_kbju.get('calories', 0),
-                        new_meal_kbju.get('proteins', 0),
-                        new_meal_kbju.get('fats', 0),
-                        new_meal_kbju.get('carbs', 0)
-                    ))
+                cursor.execute('DELETE FROM meals WHERE id = ?', (meal_id,))
+                self._apply_summary_delta(cursor, user_id, meal_date, -deleted, -1)
+                
+                # Удалённая по ошибке запись не должна оставаться в частых блюдах
+                self._unbump_frequent_meal(cursor, user_id, deleted, used_at)
                 
                 conn.commit()
-                print("DEBUG: Дневные итоги обновлены")
-                print("DEBUG: Транзакция зафиксирована")
+                logger.debug("Приём пищи %s удалён", meal_id)
+                return deleted
+                
+        except Exception as e:
+            logger.error("Ошибка удаления приёма пищи: %s", e)
+            return None
+
+    def _apply_summary_delta(self, cursor, user_id: int, date_str: str, delta: Kbju, meals_delta: int):
+        """Сдвиг дневной сводки на разницу КБЖУ (в транзакции вызывающего)"""
+        cursor.execute('''
+            INSERT INTO daily_summaries 
+            (user_id, date, total_calories, total_proteins, total_fats, total_carbs, meals_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, date) DO UPDATE SET
+                total_calories = COALESCE(total_calories, 0) + excluded.total_calories,
+                total_proteins = COALESCE(total_proteins, 0) + excluded.total_proteins,
+                total_fats = COALESCE(total_fats, 0) + excluded.total_fats,
+                total_carbs = COALESCE(total_carbs, 0) + excluded.total_carbs,
+                meals_count = COALESCE(meals_count, 0) + excluded.meals_count,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (
+            user_id, date_str,
+            delta.calories,
+            delta.proteins,
+            delta.fats,
+            delta.carbs,
+            meals_delta
+        ))
+        logger.debug("Дневные итоги обновлены")
+
+    def _bump_frequent_meal(self, conn: sqlite3.Connection, user_id: int, description: str, kbju: Kbju):
+        """Прибавляет использование к частому блюду (в транзакции вызывающего)
+
+        Одна строка на блюдо, без чтения истории: описание и КБЖУ — последние,
+        рейтинг складывается с весом текущего момента (frequent.use_score).
+        """
+        if kbju.calories <= 0:
+            return
+        conn.execute('''
+            INSERT INTO frequent_meals
+            (user_id, meal_key, description, calories, proteins, fats, carbs, uses, score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(user_id, meal_key) DO UPDATE SET
+                description = excluded.description,
+                calories = excluded.calories,
+                proteins = excluded.proteins,
+                fats = excluded.fats,
+                carbs = excluded.carbs,
+                uses = uses + 1,
+                score = logaddexp(score, excluded.score)
+        ''', (
+            user_id, meal_key(description), description,
+            kbju.calories, kbju.proteins, kbju.fats, kbju.carbs, use_score()
+        ))
+
+    def _unbump_frequent_meal(self, cursor, user_id: int, meal: Meal, used_at: float):
+        """Убирает одно использование частого блюда, а с последним — и само блюдо (в транзакции вызывающего)
+
+        Из рейтинга вычитается вес этого использования на момент записи
+        приёма пищи (used_at) — тот же, что прибавил _bump_frequent_meal.
+        """
+        if meal.calories <= 0:
+            return
+        key = meal_key(meal.description or '')
+        cursor.execute(
+            'UPDATE frequent_meals SET uses = uses - 1, score = logsubexp(score, ?) '
+            'WHERE user_id = ? AND meal_key = ?',
+            (use_score(used_at), user_id, key)
+        )
+        cursor.execute(
+            'DELETE FROM frequent_meals WHERE user_id = ? AND meal_key = ? AND uses <= 0', (user_id, key)
+        )
+
+    def get_frequent_meals(self, user_id: int, limit: int) -> List[FrequentMeal]:
+        """Частые блюда пользователя, сначала часто и недавно съедаемые"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = FrequentMeal.row_factory
+                cursor.execute(f'''
+                    SELECT {FREQUENT_COLUMNS}
+                    FROM frequent_meals
+                    WHERE user_id = ?
+                    ORDER BY score DESC
+                    LIMIT ?
+                ''', (user_id, limit))
+                return cursor.fetchall()
                 
         except Exception as e:
-            print(f"Ошибка обновления дневных итогов: {e}")
+            logger.error("Ошибка получения частых блюд: %s", e)
+            return []
 
-    def get_daily_summary(self, user_id: int, date_str: str = None) -> Dict:
+    def get_frequent_meal(self, user_id: int, frequent_id: int) -> Optional[FrequentMeal]:
+        """Частое блюдо по id строки индекса; чужие блюда не находятся"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f'SELECT {FREQUENT_COLUMNS} FROM frequent_meals WHERE id = ? AND user_id = ?',
+                    (frequent_id, user_id)
+                ).fetchone()
+                return FrequentMeal(*row) if row else None
+                
+        except Exception as e:
+            logger.error("Ошибка получения частого блюда: %s", e)
+            return None
+
+    def get_daily_summary(self, user_id: int, date_str: str = None) -> DailySummary:
         """Получение дневной сводки"""
         if date_str is None:
             date_str = date.today().strftime('%Y-%m-%d')
         
-        print(f"DEBUG: Получаем дневные итоги: user_id={user_id}, date={date_str}")
+        logger.debug("Получаем дневные итоги: user_id=%s, date=%s", user_id, date_str)
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = DailySummary.row_factory
                 
-                cursor.execute('''
-                    SELECT total_calories, total_proteins, total_fats, total_carbs, meals_count
+                cursor.execute(f'''
+                    SELECT {SUMMARY_COLUMNS}
                     FROM daily_summaries 
                     WHERE user_id = ? AND date = ?
                 ''', (user_id, date_str))
                 
-                row = cursor.fetchone()
-                print(f"DEBUG: Результат запроса из daily_summaries: {row}")
+                summary = cursor.fetchone()
+                logger.debug("Результат запроса из daily_summaries: %s", summary)
                 
-                if row:
-                    result = {
-                        'calories': row[0] or 0,
-                        'proteins': row[1] or 0,
-                        'fats': row[2] or 0,
-                        'carbs': row[3] or 0,
-                        'meals': row[4] or 0
-                    }
-                    print(f"DEBUG: Возвращаем итоги из daily_summaries: {result}")
-                    return result
+                if summary:
+                    return summary
                 
                 # Если нет данных в daily_summaries, считаем из meals
                 cursor.execute('''
-                    SELECT SUM(calories), SUM(proteins), SUM(fats), SUM(carbs), COUNT(*)
+                    SELECT COALESCE(SUM(calories), 0), COALESCE(SUM(proteins), 0),
+                           COALESCE(SUM(fats), 0), COALESCE(SUM(carbs), 0), COUNT(*)
                     FROM meals 
                     WHERE user_id = ? AND date = ?
                 ''', (user_id, date_str))
                 
-                row = cursor.fetchone()
-                print(f"DEBUG: Результат запроса из meals: {row}")
-                
-                if row and row[0] is not None:
-                    result = {
-                        'calories': row[0],
-                        'proteins': row[1] or 0,
-                        'fats': row[2] or 0,
-                        'carbs': row[3] or 0,
-                        'meals': row[4] or 0
-                    }
-                    print(f"DEBUG: Возвращаем итоги из meals: {result}")
-                    return result
-                
-                print("DEBUG: Данных нет, возвращаем нули")
-                return {'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0, 'meals': 0}
+                summary = cursor.fetchone()
+                logger.debug("Результат запроса из meals: %s", summary)
+                return summary
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка получения дневной сводки: {e}")
-            return {'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0, 'meals': 0}
+            logger.error("Ошибка получения дневной сводки: %s", e)
+            return DailySummary()
 
-    def get_meals_for_day(self, user_id: int, date_str: str = None) -> List[Dict]:
+    def get_meals_for_day(self, user_id: int, date_str: str = None) -> List[Meal]:
         """Получение всех приёмов пищи за день"""
         if date_str is None:
             date_str = date.today().strftime('%Y-%m-%d')
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
+                cursor.row_factory = Meal.row_factory
                 
-                cursor.execute('''
-                    SELECT description, calories, proteins, fats, carbs
+                cursor.execute(f'''
+                    SELECT {MEAL_COLUMNS}
                     FROM meals 
                     WHERE user_id = ? AND date = ?
-                    ORDER BY created_at
+                    ORDER BY created_at, id
                 ''', (user_id, date_str))
                 
-                rows = cursor.fetchall()
-                meals = []
+                return cursor.fetchall()
                 
-                for row in rows:
-                    meals.append({
-                        'description': row[0],
-                        'calories': row[1],
-                        'proteins': row[2],
-                        'fats': row[3],
-                        'carbs': row[4]
-                    })
+        except Exception as e:
+            logger.error("Ошибка получения приёмов пищи: %s", e)
+            return []
+
+    def get_subscription(self, user_id: int) -> Optional[Dict]:
+        """Настройки напоминаний пользователя"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
                 
-                return meals
+                cursor.execute('''
+                    SELECT utc_offset_minutes, reminder_time, summary_time
+                    FROM subscriptions WHERE user_id = ?
+                ''', (user_id,))
+                
+                row = cursor.fetchone()
+                if row:
+                    return {
+                        'user_id': user_id,
+                        'utc_offset_minutes': row[0],
+                        'reminder_time': row[1],
+                        'summary_time': row[2]
+                    }
+                return None
                 
         except Exception as e:
-            print(f"DEBUG: Ошибка получения приёмов пищи: {e}")
-            return []
+            logger.error("Ошибка получения подписки: %s", e)
+            return None
 
-    def calculate_bmr(self, user_id: int) -> int:
-        """Расчёт базового обмена веществ (BMR) по формуле Миффлина-Сан Жеора"""
-        profile = self.get_user_profile(user_id)
-        if not profile:
-            return 0
+    def save_subscription(self, user_id: int, **fields) -> Optional[Dict]:
+        """Изменение настроек напоминаний; возвращает итоговую подписку"""
+        allowed = ('utc_offset_minutes', 'reminder_time', 'summary_time')
+        fields = {key: value for key, value in fields.items() if key in allowed}
         
-        gender = profile.get('gender', '').lower()
-        age = profile.get('age', 0)
-        height = profile.get('height', 0)
-        weight = profile.get('weight', 0)
-        
-        if gender == 'мужской':
-            bmr = 10 * weight + 6.25 * height - 5 * age + 5
-        else:
-            bmr = 10 * weight + 6.25 * height - 5 * age - 161
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('INSERT OR IGNORE INTO subscriptions (user_id) VALUES (?)', (user_id,))
+                if fields:
+                    assignments = ', '.join(f"{key} = ?" for key in fields)
+                    cursor.execute(
+                        f"UPDATE subscriptions SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?",
+                        (*fields.values(), user_id)
+                    )
+                conn.commit()
+                
+        except Exception as e:
+            logger.error("Ошибка сохранения подписки: %s", e)
+            return None
         
-        return int(bmr)
+        return self.get_subscription(user_id)
 
-    def calculate_target_calories(self, user_id: int) -> Dict:
-        """Расчёт целевых калорий и макросов с учётом цели пользователя и пояснением"""
-        bmr = self.calculate_bmr(user_id)
-        if bmr == 0:
-            return {'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0, 'explanation': 'Нет профиля'}
-        
-        profile = self.get_user_profile(user_id)
-        activity = profile.get('activity', 'Средний').lower()
-        goal = profile.get('goal', '').lower()
-        weight = profile.get('weight', 0)
-        explanation = []
+    def iter_subscriptions(self) -> Iterator[Dict]:
+        """Все активные подписки одним запросом, построчно"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT user_id, utc_offset_minutes, reminder_time, summary_time
+                FROM subscriptions
+                WHERE reminder_time IS NOT NULL OR summary_time IS NOT NULL
+            ''')
+            for row in cursor:
+                yield {
+                    'user_id': row[0],
+                    'utc_offset_minutes': row[1],
+                    'reminder_time': row[2],
+                    'summary_time': row[3]
+                }
+
+    def get_daily_summaries_bulk(self, user_ids: List[int], date_str: str) -> Dict[int, DailySummary]:
+        """Дневные сводки многих пользователей за дату; у кого нет записи — нули"""
+        # Пустая сводка одна на всех: результат только читают
+        empty = DailySummary()
+        result = dict.fromkeys(user_ids, empty)
         
-        # Коэффициенты активности
-        activity_multipliers = {
-            'низкий': 1.2,      # Сидячий образ жизни
-            'средний': 1.55,    # Умеренная активность
-            'высокий': 1.725    # Высокая активность
-        }
-        tdee = bmr * activity_multipliers.get(activity, 1.55)
-        explanation.append(f"TDEE рассчитан с коэффициентом активности '{activity}': {activity_multipliers.get(activity, 1.55)}")
+        try:
+            with self._connect() as conn:
+                for chunk in _chunks(user_ids, BULK_CHUNK_SIZE):
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor = conn.execute(f'''
+                        SELECT user_id, {SUMMARY_COLUMNS}
+                        FROM daily_summaries
+                        WHERE date = ? AND user_id IN ({placeholders})
+                    ''', (date_str, *chunk))
+                    for user_id, *values in cursor:
+                        result[user_id] = DailySummary(*values)
+                        
+        except Exception as e:
+            logger.error("Ошибка получения дневных сводок: %s", e)
         
-        # Базовые значения
-        target_calories = int(tdee)
-        target_proteins = int(weight * 1.2)
-        target_fats = int(weight * 1)
-        target_carbs = int((target_calories - target_proteins * 4 - target_fats * 9) / 4)
+        return result
+
+    def get_user_profiles_bulk(self, user_ids: List[int]) -> Dict[int, UserProfile]:
+        """Профили многих пользователей пачками запросов"""
+        result = {}
         
-        # Корректировка по целям
-        if any(word in goal for word in ['похудение', 'похудеть', 'сбросить вес']):
-            target_calories = int(tdee * 0.85)
-            target_proteins = int(weight * 1.6)
-            target_fats = int(weight * 0.8)
-            target_carbs = int((target_calories - target_proteins * 4 - target_fats * 9) / 4)
-            explanation.append("Цель — похудение: калорийность снижена на 15%, белок повышен до 1.6 г/кг, жиры снижены до 0.8 г/кг")
-        elif any(word in goal for word in ['набор массы', 'набрать вес', 'нарастить мышцы']):
-            target_calories = int(tdee * 1.15)
-            target_proteins = int(weight * 1.6)
-            target_fats = int(weight * 1)
-            target_carbs = int((target_calories - target_proteins * 4 - target_fats * 9) / 4)
-            explanation.append("Цель — набор массы: калорийность увеличена на 15%, белок 1.6 г/кг, жиры 1 г/кг")
-        elif 'белок' in goal or 'протеин' in goal:
-            target_proteins = int(weight * 2)
-            target_fats = int(weight * 1)
-            target_carbs = int((target_calories - target_proteins * 4 - target_fats * 9) / 4)
-            explanation.append("Цель — повысить белок: белок 2 г/кг, жиры 1 г/кг, калории по TDEE")
-        elif 'холестерин' in goal or 'жиры' in goal:
-            target_fats = int(weight * 0.7)
-            target_carbs = int((target_calories - target_proteins * 4 - target_fats * 9) / 4)
-            explanation.append("Цель — снизить жиры/холестерин: жиры 0.7 г/кг, калории по TDEE")
-        elif 'поддержание' in goal or 'поддерживать вес' in goal:
-            explanation.append("Цель — поддержание: калории по TDEE, белок 1.2 г/кг, жиры 1 г/кг")
-        else:
-            explanation.append("Стандартные значения: калории по TDEE, белок 1.2 г/кг, жиры 1 г/кг")
+        try:
+            with self._connect() as conn:
+                for chunk in _chunks(user_ids, BULK_CHUNK_SIZE):
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor = conn.cursor()
+                    cursor.row_factory = UserProfile.row_factory
+                    cursor.execute(f'''
+                        SELECT {PROFILE_COLUMNS}
+                        FROM users WHERE user_id IN ({placeholders})
+                    ''', chunk)
+                    for profile in cursor:
+                        result[profile.user_id] = profile
+                        
+        except Exception as e:
+            logger.error("Ошибка получения профилей: %s", e)
         
+        return result
+
+    def get_user_ids_after(self, after_user_id: int, limit: int) -> List[int]:
+        """Следующая страница id пользователей по возрастанию (keyset-пагинация по первичному ключу)"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?',
+                (after_user_id, limit)
+            )
+            return [row[0] for row in cursor]
+
+    def create_broadcast(self, text: str, created_by: int) -> Optional[int]:
+        """Новая рассылка; возвращает её id"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO broadcasts (text, created_by) VALUES (?, ?)',
+                    (text, created_by)
+                )
+                conn.commit()
+                return cursor.lastrowid
+                
+        except Exception as e:
+            logger.error("Ошибка создания рассылки: %s", e)
+            return None
+
+    def _broadcast_from_row(self, row) -> Dict:
         return {
-            'calories': target_calories,
-            'proteins': target_proteins,
-            'fats': target_fats,
-            'carbs': target_carbs,
-            'bmr': bmr,
-            'tdee': int(tdee),
-            'explanation': '; '.join(explanation)
+            'id': row[0],
+            'text': row[1],
+            'created_by': row[2],
+            'status': row[3],
+            'last_user_id': row[4],
+            'delivered': row[5],
+            'blocked': row[6],
+            'failed': row[7]
         }
 
-# Создаём глобальный экземпляр базы данных
-db = Database() 
\ No newline at end of file
+    def get_broadcast(self, broadcast_id: Optional[int] = None) -> Optional[Dict]:
+        """Рассылка по id, без id — последняя"""
+        with self._connect() as conn:
+            columns = 'id, text, created_by, status, last_user_id, delivered, blocked, failed'
+            if broadcast_id is None:
+                cursor = conn.execute(f'SELECT {columns} FROM broadcasts ORDER BY id DESC LIMIT 1')
+            else:
+                cursor = conn.execute(f'SELECT {columns} FROM broadcasts WHERE id = ?', (broadcast_id,))
+            row = cursor.fetchone()
+            return self._broadcast_from_row(row) if row else None
+
+    def get_running_broadcasts(self) -> List[Dict]:
+        """Незавершённые рассылки — их нужно продолжить после рестарта"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT id, text, created_by, status, last_user_id, delivered, blocked, failed
+                FROM broadcasts WHERE status = 'running' ORDER BY id
+            ''')
+            return [self._broadcast_from_row(row) for row in cursor]
+
+    def save_broadcast_progress(self, broadcast_id: int, last_user_id: int, delivered: int,
+                                blocked: int, failed: int, status: str = 'running'):
+        """Контрольная точка рассылки после очередной страницы получателей"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE broadcasts
+                SET last_user_id = ?, delivered = ?, blocked = ?, failed = ?, status = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (last_user_id, delivered, blocked, failed, status, broadcast_id))
+            conn.commit()
+
+    def save_health_days(self, user_id: int, days: List[HealthDay], active_energy: Optional[int],
+                         weight: Optional[int]) -> bool:
+        """Дневные итоги Apple Health и выведенные из них активная энергия и вес профиля
+
+        Повторный импорт того же экспорта перезаписывает дни, а не удваивает их.
+        """
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO health_days
+                    (user_id, date, active_energy, basal_energy, steps, body_mass)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [
+                    (user_id, day.date, day.active_energy, day.basal_energy, day.steps, day.body_mass)
+                    for day in days
+                ])
+                cursor.execute(
+                    'UPDATE users SET health_active_energy = ?, weight = COALESCE(?, weight) WHERE user_id = ?',
+                    (active_energy, weight, user_id)
+                )
+                
+                conn.commit()
+                logger.debug("Данные Apple Health пользователя %s сохранены: %s дней", user_id, len(days))
+                return True
+                
+        except Exception as e:
+            logger.error("Ошибка сохранения данных Apple Health: %s", e)
+            return False
+
+    def save_gpt_usage(self, rows: List[tuple]) -> bool:
+        """Прибавляет накопленный расход к дневным строкам одной транзакцией
+
+        Строка: (user_id, date, model, requests, prompt_tokens, completion_tokens,
+        cost, latency_ms, max_latency_ms).
+        """
+        try:
+            with self._connect() as conn:
+                conn.executemany('''
+                    INSERT INTO gpt_usage
+                    (user_id, date, model, requests, prompt_tokens, completion_tokens, cost, latency_ms, max_latency_ms)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, date, model) DO UPDATE SET
+                        requests = requests + excluded.requests,
+                        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                        completion_tokens = completion_tokens + excluded.completion_tokens,
+                        cost = cost + excluded.cost,
+                        latency_ms = latency_ms + excluded.latency_ms,
+                        max_latency_ms = MAX(max_latency_ms, excluded.max_latency_ms)
+                ''', rows)
+                conn.commit()
+                return True
+                
+        except Exception as e:
+            logger.error("Ошибка записи расхода GPT: %s", e)
+            return False
+
+    def get_gpt_spent(self, user_id: int, date_str: str) -> float:
+        """Сколько долларов пользователь потратил на GPT за день"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT COALESCE(SUM(cost), 0) FROM gpt_usage WHERE user_id = ? AND date = ?',
+                    (user_id, date_str)
+                ).fetchone()
+                return row[0]
+                
+        except Exception as e:
+            logger.error("Ошибка получения расхода GPT: %s", e)
+            return 0.0
+
+    def get_gpt_usage_report(self, date_from: str, date_to: str) -> List[Dict]:
+        """Расход по моделям за период включительно, дорогие модели первыми"""
+        try:
+            with self._connect() as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute('''
+                    SELECT model, SUM(requests) AS requests, COUNT(DISTINCT user_id) AS users,
+                           SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                           SUM(cost) AS cost, SUM(latency_ms) AS latency_ms, MAX(max_latency_ms) AS max_latency_ms
+                    FROM gpt_usage
+                    WHERE date BETWEEN ? AND ?
+                    GROUP BY model
+                    ORDER BY cost DESC
+                ''', (date_from, date_to)).fetchall()
+                return [dict(row) for row in rows]
+                
+        except Exception as e:
+            logger.error("Ошибка получения отчёта о расходе GPT: %s", e)
+            return []
+
+    def find_meal_kbju(self, user_id: int, description: str) -> Optional[Kbju]:
+        """КБЖУ последнего приёма пищи пользователя с тем же описанием (по индексу частых блюд)"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    f'SELECT {KBJU_COLUMNS} FROM frequent_meals WHERE user_id = ? AND meal_key = ?',
+                    (user_id, meal_key(description))
+                ).fetchone()
+                return Kbju(*row) if row else None
+                
+        except Exception as e:
+            logger.error("Ошибка поиска приёма пищи по описанию: %s", e)
+            return None
+
+    def calculate_targets_bulk(self, user_ids: Optional[List[int]] = None) -> TargetTable:
+        """Таргеты КБЖУ для многих пользователей (по умолчанию — всех) одним проходом по users
+
+        Расчёт векторный (targets.TargetTable), категория цели берётся из
+        сохранённой колонки goal_category, без разбора текста цели.
+        """
+        query = f'SELECT {TARGET_COLUMNS} FROM users'
+        rows = []
+        with self._connect() as conn:
+            if user_ids is None:
+                rows = conn.execute(query).fetchall()
+            else:
+                for chunk in _chunks(user_ids, BULK_CHUNK_SIZE):
+                    placeholders = ','.join('?' * len(chunk))
+                    rows += conn.execute(f"{query} WHERE user_id IN ({placeholders})", chunk).fetchall()
+        
+        return target_table(rows)
+
+    def calculate_bmr(self, user_id: int, profile: Optional[UserProfile] = None) -> int:
+        """Расчёт базового обмена веществ (BMR) по формуле Миффлина-Сан Жеора"""
+        if profile is None:
+            profile = self.get_user_profile(user_id)
+        return profile_bmr(profile)
+
+    def calculate_target_calories(self, user_id: int, profile: Optional[UserProfile] = None) -> Dict:
+        """Расчёт целевых калорий и макросов с учётом цели пользователя и пояснением
+
+        Профиль можно передать уже загруженным (например, из get_user_profiles_bulk).
+        """
+        if profile is None:
+            profile = self.get_user_profile(user_id)
+        return profile_target(profile)
@@ -0,0 +1,272 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from models import DailySummary, Kbju, Meal, UserProfile
+
+COPY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profile_copy.txt')
+
+_SECTION_RE = re.compile(r'^=== (?:\d+\. )?(.+?) ===$')
+_LABEL_RE = re.compile(r'^[А-ЯЁA-Z0-9 %()/.-]+:$')
+_PLACEHOLDER_RE = re.compile(r'\[[^\]]+\]')
+
+def load_copy(path: str = COPY_PATH) -> Dict[Tuple[str, Optional[str]], List[str]]:
+    """Разбирает profile_copy.txt в блоки текста по (раздел, подпись)"""
+    blocks: Dict[Tuple[str, Optional[str]], List[str]] = {}
+    section = None
+    label = None
+    buffer = None
+
+    with open(path, encoding='utf-8') as f:
+        for raw_line in f:
+            line = raw_line.rstrip('\n')
+
+            # Продолжение многострочного блока в кавычках
+            if buffer is not None:
+                if line.endswith('"'):
+                    buffer.append(line[:-1])
+                    blocks.setdefault((section, label), []).append('\n'.join(buffer))
+                    buffer = None
+                else:
+                    buffer.append(line)
+                continue
+
+            stripped = line.strip()
+            section_match = _SECTION_RE.match(stripped)
+            if section_match:
+                section = section_match.group(1)
+                label = None
+            elif _LABEL_RE.match(stripped):
+                label = stripped[:-1]
+            elif stripped.startswith('- "') and stripped.endswith('"'):
+                blocks.setdefault((section, label), []).append(stripped[3:-1])
+            elif stripped.startswith('"'):
+                if len(stripped) > 1 and stripped.endswith('"'):
+                    blocks.setdefault((section, label), []).append(stripped[1:-1])
+                else:
+                    buffer = [stripped[1:]]
+
+    return blocks
+
+def escape_html(text) -> str:
+    """Экранирует пользовательский текст для ParseMode.HTML (быстрый путь без спецсимволов)"""
+    text = str(text)
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+class Template:
+    """Шаблон, заранее разобранный в строку для %-подстановки: рендер — одна сборка строки"""
+
+    __slots__ = ('fields', 'render')
+
+    def __init__(self, text: str, fields: Sequence[str], escaped: Sequence[str] = ()):
+        parts = _PLACEHOLDER_RE.split(text)
+        if len(parts) - 1 != len(fields):
+            raise ValueError(f"Шаблон ожидает {len(parts) - 1} полей, передано {len(fields)}: {text!r}")
+
+        self.fields = tuple(fields)
+        # render(*values) подставляет значения полей в порядке self.fields
+        self.render = self._compile(parts, [name in escaped for name in self.fields])
+
+    @staticmethod
+    def _compile(parts: List[str], escaped: List[bool]) -> Callable[..., str]:
+        # Знаки % текста удваиваются, плейсхолдеры становятся %s: рендер — одна
+        # %-подстановка, текст шаблона никогда не исполняется как код (str.format
+        # заметно медленнее на коротких строках). Поля с пользовательским текстом
+        # экранируются под ParseMode.HTML
+        text = '%s'.join(part.replace('%', '%%') for part in parts)
+        escaped_indexes = [index for index, needs_escape in enumerate(escaped) if needs_escape]
+
+        if not escaped_indexes:
+            def render(*values) -> str:
+                return text % values
+        else:
+            def render(*values) -> str:
+                values = list(values)
+                for index in escaped_indexes:
+                    values[index] = escape_html(values[index])
+                return text % tuple(values)
+
+        return render
+
+_copy = load_copy()
+
+def _block(section: str, label: Optional[str] = None, index: int = 0) -> str:
+    return _copy[(section, label)][index]
+
+def _template(section: str, label: Optional[str], fields: Sequence[str], escaped: Sequence[str] = ()) -> Template:
+    return Template(_block(section, label), fields, escaped)
+
+_KBJU_FIELDS = ('calories', 'proteins', 'fats', 'carbs')
+
+PROFILE = _template(
+    'ПОДТВЕРЖДЕНИЕ ТАРГЕТА', 'ПРОФИЛЬ',
+    ('gender', 'age', 'height', 'weight', 'activity', 'goal'),
+    escaped=('goal',)
+)
+TARGET = _template(
+    'ПОДТВЕРЖДЕНИЕ ТАРГЕТА', 'ТАРГЕТ',
+    ('bmr', 'tdee') + _KBJU_FIELDS + ('explanation',)
+)
+CONFIRM_QUESTION = _block('ПОДТВЕРЖДЕНИЕ ТАРГЕТА', 'ВОПРОС')
+GOAL_UPDATED = _template(
+    'ФИНАЛЬНЫЕ СООБЩЕНИЯ', 'ПРИ КОРРЕКТИРОВКЕ ЦЕЛИ',
+    ('goal', 'target'),
+    escaped=('goal',)
+)
+
+ANALYZING = _block('ОЦЕНКА ЕДЫ', 'АНАЛИЗ')
+RECALCULATING = _block('ОЦЕНКА ЕДЫ', 'ПЕРЕСЧЁТ')
+PHOTO_ANALYZING = _block('ОЦЕНКА ЕДЫ', 'ФОТО')
+PHOTO_CACHED = _block('ОЦЕНКА ЕДЫ', 'ФОТО ИЗ КЭША')
+PHOTO_NOT_RECOGNIZED = _block('ОЦЕНКА ЕДЫ', 'ФОТО НЕ РАСПОЗНАНО')
+VOICE_LISTENING = _block('ОЦЕНКА ЕДЫ', 'ГОЛОСОВОЕ')
+VOICE_RECOGNIZED = _template('ОЦЕНКА ЕДЫ', 'ГОЛОСОВОЕ РАСПОЗНАНО', ('text',), escaped=('text',))
+VOICE_NOT_RECOGNIZED = _block('ОЦЕНКА ЕДЫ', 'ГОЛОСОВОЕ НЕ РАСПОЗНАНО')
+VOICE_BUSY = _block('ОЦЕНКА ЕДЫ', 'ГОЛОСОВЫХ СЛИШКОМ МНОГО')
+VOICE_TOO_LONG = _block('ОЦЕНКА ЕДЫ', 'ГОЛОСОВОЕ СЛИШКОМ ДЛИННОЕ')
+FROM_HISTORY = _block('ОЦЕНКА ЕДЫ', 'ИЗ ИСТОРИИ')
+REPEATED = _block('ОЦЕНКА ЕДЫ', 'ПОВТОР')
+BUDGET_EXCEEDED = _block('ОЦЕНКА ЕДЫ', 'ЛИМИТ ОЦЕНОК')
+MEAL = _template('ОЦЕНКА ЕДЫ', 'ПРИЁМ ПИЩИ', ('description',) + _KBJU_FIELDS, escaped=('description',))
+DAY_TOTAL = _template('ОЦЕНКА ЕДЫ', 'ИТОГО ЗА ДЕНЬ', ('meals',) + _KBJU_FIELDS)
+PROGRESS = _template('ОЦЕНКА ЕДЫ', 'ПРОГРЕСС', ('progress',))
+
+DAY_SUMMARY = _template(
+    'СВОДКА ДНЯ (/day)', None,
+    ('meals',) + tuple(
+        f"{key}_{suffix}" for key in _KBJU_FIELDS for suffix in ('value', 'target', 'progress')
+    )
+)
+DAY_EMPTY = _block('СВОДКА ДНЯ (/day)', 'ПУСТОЙ ДЕНЬ')
+DAY_TIP_LOW = _block('СВОДКА ДНЯ (/day)', 'МЕНЬШЕ 50%')
+DAY_TIP_HIGH = _block('СВОДКА ДНЯ (/day)', 'БОЛЬШЕ 120%')
+DAY_TIP_OK = _block('СВОДКА ДНЯ (/day)', 'В НОРМЕ')
+
+TARGET_DETAILS = _template(
+    'ЦЕЛИ (/target)', None,
+    ('gender', 'bmr', 'tdee') + _KBJU_FIELDS + ('goal', 'activity', 'explanation'),
+    escaped=('goal',)
+)
+
+REMINDER = _block('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'НАПОМИНАНИЕ')
+EVENING_SUMMARY = _template('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'ВЕЧЕРНЯЯ СВОДКА', ('summary',))
+REMINDER_ON = _template('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'НАПОМИНАНИЯ ВКЛЮЧЕНЫ', ('time',))
+SUMMARY_ON = _template('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'СВОДКА ВКЛЮЧЕНА', ('time',))
+REMINDER_OFF = _block('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'НАПОМИНАНИЯ ВЫКЛЮЧЕНЫ')
+SUMMARY_OFF = _block('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'СВОДКА ВЫКЛЮЧЕНА')
+TIMEZONE = _template('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'ЧАСОВОЙ ПОЯС', ('offset',))
+TIME_ERROR = _block('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'ОШИБКА ВРЕМЕНИ')
+TIMEZONE_ERROR = _block('НАПОМИНАНИЯ (/remind, /evening, /tz)', 'ОШИБКА ЧАСОВОГО ПОЯСА')
+
+MEALS_HEADER = _template('ПРИЁМЫ ПИЩИ (/meals)', 'ЗАГОЛОВОК', ('count',))
+MEALS_ROW = _template(
+    'ПРИЁМЫ ПИЩИ (/meals)', 'СТРОКА',
+    ('number', 'description') + _KBJU_FIELDS,
+    escaped=('description',)
+)
+FREQUENT_HEADER = _block('ПРИЁМЫ ПИЩИ (/meals)', 'ЧАСТЫЕ БЛЮДА')
+# Текст кнопки не разбирается как HTML, поэтому без экранирования
+FREQUENT_BUTTON = _template('ПРИЁМЫ ПИЩИ (/meals)', 'КНОПКА', ('description', 'calories'))
+# Длиннее кнопка всё равно обрежется клиентом Telegram
+FREQUENT_BUTTON_MAX_DESCRIPTION = 32
+
+def _percent(value: float, target: float) -> str:
+    return f"{(value / target) * 100 if target > 0 else 0:.1f}"
+
+def render_target(target: Dict) -> str:
+    """Блок рассчитанных целевых показателей"""
+    return TARGET.render(
+        target['bmr'], target['tdee'],
+        target['calories'], target['proteins'], target['fats'], target['carbs'],
+        target.get('explanation', '')
+    )
+
+def render_profile_confirmation(profile: UserProfile, target: Dict) -> str:
+    """Профиль, таргет и вопрос о подтверждении"""
+    return '\n\n'.join((
+        PROFILE.render(*[getattr(profile, name) for name in PROFILE.fields]),
+        render_target(target),
+        CONFIRM_QUESTION
+    ))
+
+def render_goal_updated(goal: str, target: Dict) -> str:
+    """Ответ на корректировку цели"""
+    return GOAL_UPDATED.render(goal, render_target(target))
+
+def render_meal(description: str, kbju: Kbju) -> str:
+    """Оценка одного приёма пищи"""
+    return MEAL.render(description, kbju.calories, kbju.proteins, kbju.fats, kbju.carbs)
+
+def render_meal_result(header: str, description: str, kbju: Kbju, summary: DailySummary, target_calories: int) -> str:
+    """Оценка приёма пищи, итоги дня и прогресс к цели"""
+    blocks = [
+        header,
+        render_meal(description, kbju),
+        DAY_TOTAL.render(
+            summary.meals, summary.calories, summary.proteins, summary.fats, summary.carbs
+        )
+    ]
+    if target_calories > 0:
+        blocks.append(PROGRESS.render(_percent(summary.calories, target_calories)))
+    return '\n\n'.join(blocks)
+
+def render_day_summary(summary: DailySummary, target: Dict) -> str:
+    """Сводка /day с прогрессом по каждому макросу и советом"""
+    values = [summary.meals]
+    for key in _KBJU_FIELDS:
+        eaten = getattr(summary, key)
+        values += (eaten, target[key], _percent(eaten, target[key]))
+
+    calories_progress = (summary.calories / target['calories']) * 100 if target['calories'] > 0 else 0
+    if summary.meals == 0:
+        tip = DAY_EMPTY
+    elif calories_progress < 50:
+        tip = DAY_TIP_LOW
+    elif calories_progress > 120:
+        tip = DAY_TIP_HIGH
+    else:
+        tip = DAY_TIP_OK
+
+    return DAY_SUMMARY.render(*values) + '\n\n' + tip
+
+def render_evening_summary(summary: DailySummary, target: Dict) -> str:
+    """Вечерняя сводка из планировщика"""
+    return EVENING_SUMMARY.render(render_day_summary(summary, target))
+
+def render_utc_offset(utc_offset_minutes: int) -> str:
+    hours, minutes = divmod(abs(utc_offset_minutes), 60)
+    sign = '-' if utc_offset_minutes < 0 else '+'
+    return TIMEZONE.render(f"{sign}{hours}" + (f":{minutes:02d}" if minutes else ''))
+
+def render_target_details(profile: UserProfile, target: Dict) -> str:
+    """Сообщение /target"""
+    return TARGET_DETAILS.render(
+        profile.gender or 'пользователя',
+        target['bmr'], target['tdee'],
+        target['calories'], target['proteins'], target['fats'], target['carbs'],
+        profile.goal or 'Не указана',
+        profile.activity or 'Не указана',
+        target.get('explanation', '')
+    )
+
+def render_meals(meals: List[Meal]) -> str:
+    """Список приёмов пищи за день с номерами для /edit и /delete"""
+    row = MEALS_ROW.render
+    rows = [MEALS_HEADER.render(len(meals))]
+    rows += [
+        row(number, meal.description, meal.calories, meal.proteins, meal.fats, meal.carbs)
+        for number, meal in enumerate(meals, 1)
+    ]
+    return '\n\n'.join(rows)
+
+def render_frequent_button(description: str, calories: int) -> str:
+    """Подпись кнопки частого блюда"""
+    if len(description) > FREQUENT_BUTTON_MAX_DESCRIPTION:
+        description = description[:FREQUENT_BUTTON_MAX_DESCRIPTION - 1].rstrip() + '…'
+    return FREQUENT_BUTTON.render(description, calories)
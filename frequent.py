@@ -0,0 +1,72 @@
+# frequent.py
+# Частые блюда пользователя: ключ описания и рейтинг «часто и недавно» для индекса frequent_meals
+import math
+import os
+import re
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Сколько блюд показывать кнопками под /day и /meals
+FREQUENT_MEALS_LIMIT = int(os.getenv('FREQUENT_MEALS_LIMIT', '6'))
+# Через сколько дней прошлое использование блюда весит вдвое меньше нового
+FREQUENT_HALF_LIFE_DAYS = float(os.getenv('FREQUENT_HALF_LIFE_DAYS', '14'))
+
+# Отсчёт времени для рейтинга; сдвиг эпохи меняет все рейтинги одинаково и порядок не трогает
+_EPOCH = datetime(2024, 1, 1).timestamp()
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def meal_key(description: str) -> str:
+    """Ключ описания еды: регистр и лишние пробелы не важны"""
+    return _WHITESPACE_RE.sub(' ', description).strip().lower()
+
+def use_score(timestamp: Optional[float] = None) -> float:
+    """Логарифм веса одного использования в момент timestamp
+
+    Рейтинг блюда — log от суммы 2^(t / период полураспада) по всем его
+    использованиям. Старые использования не нужно пересчитывать: у всех
+    блюд они «затухают» одинаково, поэтому порядок по сохранённому рейтингу
+    совпадает с порядком по честно затухающему счётчику. Логарифм нужен,
+    чтобы сумма не переполнила float за годы работы.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    return (timestamp - _EPOCH) / (FREQUENT_HALF_LIFE_DAYS * 86400) * math.log(2)
+
+def logaddexp(a: float, b: float) -> float:
+    """log(e^a + e^b) без переполнения; в SQLite регистрируется как функция"""
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+def logsubexp(a: float, b: float) -> float:
+    """log(e^a - e^b): рейтинг без одного использования; в SQLite регистрируется как функция
+
+    Если b не меньше a, вычесть нечего (вес использования оценён с запасом,
+    например по дате для строк из index_rows) — рейтинг остаётся прежним.
+    """
+    if b >= a:
+        return a
+    return a + math.log1p(-math.exp(b - a))
+
+def index_rows(meals: Iterable[Tuple]) -> List[Tuple]:
+    """Строки frequent_meals из истории — для первого заполнения индекса
+
+    meals: (user_id, description, calories, proteins, fats, carbs, date) в
+    порядке id. Описание и КБЖУ берутся из последнего приёма пищи.
+    Возвращает (user_id, meal_key, description, calories, proteins, fats,
+    carbs, uses, score).
+    """
+    index: Dict[Tuple[int, str], list] = {}
+    for user_id, description, calories, proteins, fats, carbs, date_str in meals:
+        if not description or not calories:
+            continue
+        key = meal_key(description)
+        score = use_score(datetime.strptime(date_str, '%Y-%m-%d').timestamp())
+        row = index.get((user_id, key))
+        if row is None:
+            index[(user_id, key)] = [user_id, key, description, calories, proteins, fats, carbs, 1, score]
+        else:
+            row[2:7] = [description, calories, proteins, fats, carbs]
+            row[7] += 1
+            row[8] = logaddexp(row[8], score)
+    return [tuple(row) for row in index.values()]
@@ -0,0 +1,63 @@
+# goals.py
+# Категории целей пользователя и коэффициенты таргета для каждой из них
+from enum import IntEnum
+from typing import Optional
+
+class GoalCategory(IntEnum):
+    """Категория цели; хранится в users.goal_category как целое число"""
+    DEFAULT = 0
+    LOSE_WEIGHT = 1
+    GAIN_MASS = 2
+    MORE_PROTEIN = 3
+    LESS_FAT = 4
+    MAINTAIN = 5
+
+# Ключевые слова проверяются по порядку: первая совпавшая категория и есть цель
+GOAL_KEYWORDS = (
+    (GoalCategory.LOSE_WEIGHT, ('похудение', 'похудеть', 'сбросить вес')),
+    (GoalCategory.GAIN_MASS, ('набор массы', 'набрать вес', 'нарастить мышцы')),
+    (GoalCategory.MORE_PROTEIN, ('белок', 'протеин')),
+    (GoalCategory.LESS_FAT, ('холестерин', 'жиры')),
+    (GoalCategory.MAINTAIN, ('поддержание', 'поддерживать вес')),
+)
+
+# Множитель калорий к TDEE, белок и жиры в г/кг, пояснение для /target
+GOAL_PARAMS = {
+    GoalCategory.DEFAULT: (1.0, 1.2, 1.0, "Стандартные значения: калории по TDEE, белок 1.2 г/кг, жиры 1 г/кг"),
+    GoalCategory.LOSE_WEIGHT: (0.85, 1.6, 0.8, "Цель — похудение: калорийность снижена на 15%, белок повышен до 1.6 г/кг, жиры снижены до 0.8 г/кг"),
+    GoalCategory.GAIN_MASS: (1.15, 1.6, 1.0, "Цель — набор массы: калорийность увеличена на 15%, белок 1.6 г/кг, жиры 1 г/кг"),
+    GoalCategory.MORE_PROTEIN: (1.0, 2.0, 1.0, "Цель — повысить белок: белок 2 г/кг, жиры 1 г/кг, калории по TDEE"),
+    GoalCategory.LESS_FAT: (1.0, 1.2, 0.7, "Цель — снизить жиры/холестерин: жиры 0.7 г/кг, калории по TDEE"),
+    GoalCategory.MAINTAIN: (1.0, 1.2, 1.0, "Цель — поддержание: калории по TDEE, белок 1.2 г/кг, жиры 1 г/кг"),
+}
+
+# Белок и жиры в г/кг, когда калории задал пользователь: прежние значения диалога /profile,
+# отличные от GOAL_PARAMS; для остальных целей — EXPLICIT_MACROS_DEFAULT
+EXPLICIT_MACROS = {
+    GoalCategory.LOSE_WEIGHT: (1.6, 0.8),
+    GoalCategory.MORE_PROTEIN: (2.0, 0.8),
+}
+EXPLICIT_MACROS_DEFAULT = (1.2, 1.0)
+
+# Коэффициенты активности
+ACTIVITY_MULTIPLIERS = {
+    'низкий': 1.2,      # Сидячий образ жизни
+    'средний': 1.55,    # Умеренная активность
+    'высокий': 1.725    # Высокая активность
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.55
+
+def classify_goal(goal: Optional[str]) -> GoalCategory:
+    """Категория цели по тексту пользователя"""
+    text = (goal or '').lower()
+    for category, keywords in GOAL_KEYWORDS:
+        if any(word in text for word in keywords):
+            return category
+    return GoalCategory.DEFAULT
+
+def activity_multiplier(activity: Optional[str]) -> float:
+    return ACTIVITY_MULTIPLIERS.get((activity or 'Средний').lower(), DEFAULT_ACTIVITY_MULTIPLIER)
+
+def explicit_macros(category: GoalCategory) -> tuple:
+    """(белок, жиры) в г/кг для калорий, заданных пользователем"""
+    return EXPLICIT_MACROS.get(category, EXPLICIT_MACROS_DEFAULT)
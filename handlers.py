@@ -1,2 +1,919 @@
 # handlers.py
-# Здесь будут обработчики команд и сообщений Telegram-бота 
\ No newline at end of file
+# Обработчики команд и сообщений Telegram-бота
+#
+# Модуль импортируется без побочных эффектов: хранилище, планировщик и
+# рассылки приходят в хендлеры аргументами из Dispatcher (см. app.create_app).
+import logging
+import os
+import re
+import tempfile
+import zipfile
+from io import BytesIO
+from datetime import date
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import (
+    CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message,
+    ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
+)
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from storage import Storage
+from models import DailySummary, Kbju, UserProfile
+import formatting
+import photos
+import voice
+import health
+from frequent import FREQUENT_MEALS_LIMIT
+from usage import BudgetExceeded, UsageLedger, usage_report
+from scheduler import ReminderScheduler, parse_time, parse_utc_offset
+from sender import send_coalesce_var
+from broadcast import Broadcaster, is_admin, render_report
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+class ProfileStates(StatesGroup):
+    waiting_for_gender = State()
+    waiting_for_age = State()
+    waiting_for_height = State()
+    waiting_for_weight = State()
+    waiting_for_activity = State()
+    waiting_for_goal = State()
+    waiting_for_target_confirmation = State()
+    waiting_for_goal_correction = State()
+
+class FoodStates(StatesGroup):
+    waiting_for_food_description = State()
+    waiting_for_clarification = State()
+
+class RepeatMeal(CallbackData, prefix='repeat'):
+    """Кнопка частого блюда: id строки индекса frequent_meals"""
+    id: int
+
+async def save_food_to_daily(db: Storage, user_id: int, food_description: str, kbju: Kbju):
+    """Сохраняет еду в дневной учет, возвращает id приёма пищи"""
+    logger.debug("Сохраняем приём пищи: user_id=%s, description=%r, kbju=%s", user_id, food_description, kbju)
+    
+    meal_id = await db.save_meal(user_id, food_description, kbju)
+    if not meal_id:
+        logger.warning("Приём пищи не сохранён: user_id=%s", user_id)
+    
+    return meal_id
+
+async def get_meal_by_ordinal(db: Storage, user_id: int, ordinal_text: str):
+    """Находит приём пищи по номеру из списка /meals"""
+    try:
+        ordinal = int(ordinal_text)
+    except (TypeError, ValueError):
+        return None
+    
+    meals = await db.get_meals_for_day(user_id)
+    if ordinal < 1 or ordinal > len(meals):
+        return None
+    
+    return meals[ordinal - 1]
+
+async def get_daily_summary(db: Storage, user_id: int) -> DailySummary:
+    """Получает дневную сводку"""
+    today = date.today().strftime('%Y-%m-%d')
+    return await db.get_daily_summary(user_id, today)
+
+async def frequent_meals_keyboard(db: Storage, user_id: int):
+    """Кнопки частых блюд пользователя или None, если записывать ещё нечего"""
+    items = await db.get_frequent_meals(user_id, FREQUENT_MEALS_LIMIT)
+    if not items:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=formatting.render_frequent_button(item.description, item.calories),
+            callback_data=RepeatMeal(id=item.id).pack()
+        )]
+        for item in items
+    ])
+
+async def analyze_food_text(message: Message, state: FSMContext, db: Storage, ledger: UsageLedger, user_food: str):
+    """Оценивает КБЖУ текста о еде, сохраняет приём пищи и отвечает сводкой"""
+    logger.debug("Анализируем еду: %r", user_food)
+    
+    try:
+        # Оценка GPT (модель по сложности описания) или, сверх бюджета, прошлая оценка
+        kbju, local = await ledger.estimate_kbju(message.from_user.id, user_food, with_summary_hint=False)
+        
+        # Если не удалось извлечь калории, просим уточнить
+        if kbju.calories == 0:
+            clarification_prompt = f"Для оценки КБЖУ {formatting.escape_html(user_food)} нужно больше информации о размере порции. Пожалуйста, уточните количество."
+            await message.answer(clarification_prompt)
+            await state.update_data(original_food=user_food)
+            await state.set_state(FoodStates.waiting_for_clarification)
+            return
+        
+        # Сохраняем еду в дневной учет
+        await save_food_to_daily(db, message.from_user.id, user_food, kbju)
+        
+        # Получаем дневную сводку
+        daily_summary = await get_daily_summary(db, message.from_user.id)
+        
+        # Формируем ответ с дневной сводкой и прогрессом к цели
+        target = await db.calculate_target_calories(message.from_user.id)
+        header = formatting.FROM_HISTORY if local else formatting.ANALYZING
+        response_text = formatting.render_meal_result(
+            header, user_food, kbju, daily_summary, target['calories']
+        )
+        
+        await message.answer(response_text)
+        
+    except BudgetExceeded:
+        await message.answer(formatting.BUDGET_EXCEEDED)
+    except Exception as e:
+        logger.exception("Ошибка при анализе еды: %s", e)
+        await message.answer("Извини, произошла ошибка при анализе еды. Попробуй ещё раз.")
+
+@router.message(Command("start", "help"))
+async def send_welcome(message: Message):
+    await message.answer(
+        "Привет! Я бот, который не учит, а просто считает КБЖУ.\n\n"
+        "📍 Напиши, что ты ел(а) — я разберу по БЖУ\n"
+        "⚙️ Хочешь точности — настрой профиль: /profile\n"
+        "📊 Посмотреть цели: /target\n"
+        "📅 Отчёт за день: /day\n"
+        "✏️ Исправить запись: /undo, /delete N, /edit N описание\n"
+        "⏰ Напоминания: /remind 13:00, итоги дня: /evening 21:00, часовой пояс: /tz +3\n\n"
+        "Всё просто. Без диет и занудства."
+    )
+
+@router.message(Command("profile"))
+async def profile_start(message: Message, state: FSMContext, db: Storage):
+    if await db.user_profile_exists(message.from_user.id):
+        await message.answer("У тебя уже есть профиль! Используй /target чтобы посмотреть целевые калории.")
+        return
+    
+    keyboard = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="Мужской"), KeyboardButton(text="Женский")]
+        ],
+        resize_keyboard=True
+    )
+    
+    await message.answer(
+        "Начнём с профиля — так расчёт КБЖУ будет точнее.\n\n"
+        "Сначала — пол. Он влияет на обмен веществ.",
+        reply_markup=keyboard
+    )
+    await state.set_state(ProfileStates.waiting_for_gender)
+
+@router.message(ProfileStates.waiting_for_gender)
+async def process_gender(message: Message, state: FSMContext):
+    gender = message.text.strip()
+    if gender not in ["Мужской", "Женский"]:
+        await message.answer("Пожалуйста, выбери 'Мужской' или 'Женский'")
+        return
+    
+    await state.update_data(gender=gender)
+    
+    # Убираем кнопки
+    await message.answer("Сколько тебе лет?", reply_markup=ReplyKeyboardRemove())
+    await state.set_state(ProfileStates.waiting_for_age)
+
+@router.message(ProfileStates.waiting_for_age)
+async def process_age(message: Message, state: FSMContext):
+    try:
+        age = int(message.text.strip())
+        if age < 10 or age > 100:
+            await message.answer("Пожалуйста, введите реальный возраст (10-100 лет)")
+            return
+    except ValueError:
+        await message.answer("Пожалуйста, введите число")
+        return
+    
+    await state.update_data(age=age)
+    
+    await message.answer("Рост в см? Например: 170")
+    await state.set_state(ProfileStates.waiting_for_height)
+
+@router.message(ProfileStates.waiting_for_height)
+async def process_height(message: Message, state: FSMContext):
+    try:
+        height = int(message.text.strip())
+        if height < 100 or height > 250:
+            await message.answer("Пожалуйста, введите реальный рост (100-250 см)")
+            return
+    except ValueError:
+        await message.answer("Пожалуйста, введите число")
+        return
+    
+    await state.update_data(height=height)
+    
+    await message.answer("Вес в кг? Например: 65")
+    await state.set_state(ProfileStates.waiting_for_weight)
+
+@router.message(ProfileStates.waiting_for_weight)
+async def process_weight(message: Message, state: FSMContext):
+    try:
+        weight = int(message.text.strip())
+        if weight < 30 or weight > 300:
+            await message.answer("Пожалуйста, введите реальный вес (30-300 кг)")
+            return
+    except ValueError:
+        await message.answer("Пожалуйста, введите число")
+        return
+    
+    await state.update_data(weight=weight)
+    
+    keyboard = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="Низкий"), KeyboardButton(text="Средний"), KeyboardButton(text="Высокий")]
+        ],
+        resize_keyboard=True
+    )
+    
+    await message.answer(
+        "Выбери уровень активности:\n\n"
+        "🏃‍♀️ Низкий — почти нет спорта\n"
+        "🏃‍♀️ Средний — спорт 2–3 раза в неделю\n"
+        "🏃‍♀️ Высокий — 4+ раз в неделю или физическая работа",
+        reply_markup=keyboard
+    )
+    await state.set_state(ProfileStates.waiting_for_activity)
+
+@router.message(ProfileStates.waiting_for_activity)
+async def process_activity(message: Message, state: FSMContext):
+    activity = message.text.strip()
+    if activity not in ["Низкий", "Средний", "Высокий"]:
+        await message.answer("Пожалуйста, выбери один из вариантов: Низкий, Средний, Высокий")
+        return
+    
+    await state.update_data(activity=activity)
+    
+    # Убираем кнопки и добавляем примеры целей
+    await message.answer(
+        "Какая у тебя цель? Вот примеры:\n\n"
+        "🎯 Похудеть\n"
+        "💪 Набрать массу\n"
+        "⚖️ Поддерживать вес\n"
+        "💪 Следить за белком\n"
+        "🩸 Для здоровья\n"
+        "🥗 Больше разнообразия\n\n"
+        "Или просто напиши, чего хочешь 🙂",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    await state.set_state(ProfileStates.waiting_for_goal)
+
+@router.message(ProfileStates.waiting_for_goal)
+async def process_goal(message: Message, state: FSMContext, db: Storage):
+    goal = message.text.strip()
+    if len(goal) < 3:
+        await message.answer("Напиши цель чуть подробнее 🙂")
+        return
+    
+    # Проверяем, не ввел ли пользователь число (калории)
+    if goal.isdigit():
+        calories = int(goal)
+        if 800 <= calories <= 5000:  # разумный диапазон калорий
+            # Пользователь ввел целевые калории
+            await message.answer(
+                f"Понял! Устанавливаю {calories} ккал как цель.\n\n"
+                "Теперь напиши цель словами (например: похудеть, набрать массу, поддерживать вес):",
+                reply_markup=ReplyKeyboardRemove()
+            )
+            await state.update_data(target_calories=calories)
+            return
+        else:
+            await message.answer("Это слишком много или мало калорий. Напиши цель словами 🙂")
+            return
+    
+    # Ищем числа в тексте (например: "например 1700", "калории 1800", "хочу 1500")
+    numbers = re.findall(r'\d+', goal)
+    if numbers:
+        calories = int(numbers[0])
+        if 800 <= calories <= 5000:  # разумный диапазон калорий
+            # Пользователь ввел калории в тексте
+            await message.answer(
+                f"Понял! Устанавливаю {calories} ккал как цель.\n\n"
+                "Теперь напиши цель словами (например: похудеть, набрать массу, поддерживать вес):",
+                reply_markup=ReplyKeyboardRemove()
+            )
+            await state.update_data(target_calories=calories)
+            return
+    
+    await state.update_data(goal=goal)
+    
+    # Получаем все данные профиля
+    data = await state.get_data()
+    
+    # Рассчитываем целевые калории
+    user_id = message.from_user.id
+    
+    # Временно сохраняем профиль для расчёта таргета
+    profile = UserProfile.from_state(user_id, data)
+    temp_success = await db.save_user_profile(profile)
+    if not temp_success:
+        await message.answer("Ошибка сохранения профиля. Попробуй ещё раз.")
+        await state.clear()
+        return
+    
+    # Калории, если пользователь их назвал, сохранены в профиле и учтены в таргете;
+    # профиль перечитываем, чтобы учесть ранее импортированные данные Apple Health
+    target = await db.calculate_target_calories(user_id)
+    
+    # Проверяем, это новая цель или корректировка
+    is_correction = await state.get_state() == ProfileStates.waiting_for_goal and 'goal' in data
+    
+    # Кнопки для подтверждения
+    keyboard = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="✅ Принять таргет"), KeyboardButton(text="✏️ Изменить профиль")]
+        ],
+        resize_keyboard=True
+    )
+    
+    if is_correction:
+        # Если это корректировка цели, показываем специальное сообщение
+        await message.answer(
+            formatting.render_goal_updated(goal, target),
+            reply_markup=keyboard
+        )
+    else:
+        # Если это новая цель, показываем полный профиль
+        await message.answer(
+            formatting.render_profile_confirmation(profile, target),
+            reply_markup=keyboard
+        )
+    
+    # Сохраняем данные для возможного редактирования
+    await state.update_data(target=target)
+    await state.set_state(ProfileStates.waiting_for_target_confirmation)
+
+@router.message(ProfileStates.waiting_for_target_confirmation)
+async def process_target_confirmation(message: Message, state: FSMContext):
+    choice = message.text.strip()
+    
+    if choice == "✅ Принять таргет":
+        # Профиль уже сохранён, просто подтверждаем
+        await message.answer(
+            "Готово! Всё на месте.\n\n"
+            "Что дальше:\n"
+            "• Присылай еду — посчитаю КБЖУ\n"
+            "• /target — цели\n"
+            "• /day — сводка дня",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        await state.clear()
+        
+    elif choice == "✏️ Изменить профиль":
+        # Спрашиваем, что именно нужно изменить
+        await message.answer(
+            "Что поменяем? Напиши, что хочешь поправить 🙂",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        await state.set_state(ProfileStates.waiting_for_goal_correction)
+        
+    else:
+        await message.answer(
+            "Выбери: ✅ Принять или ✏️ Изменить профиль"
+        )
+
+@router.message(ProfileStates.waiting_for_goal_correction)
+async def process_goal_correction(message: Message, state: FSMContext):
+    user_feedback = message.text.strip().lower()
+    
+    # Получаем текущие данные профиля
+    data = await state.get_data()
+    current_goal = data.get('goal', '')
+    
+    # Анализируем обратную связь пользователя
+    new_goal = current_goal  # по умолчанию оставляем как есть
+    
+    if any(word in user_feedback for word in ['цель', 'задача', 'хочу', 'нужно']):
+        # Пользователь хочет изменить цель
+        await message.answer(
+            "Понял! Напиши новую цель своими словами:",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        await state.set_state(ProfileStates.waiting_for_goal)
+        return
+    
+    elif any(word in user_feedback for word in ['возраст', 'лет', 'года']):
+        # Пользователь хочет изменить возраст
+        await message.answer("Сколько тебе лет?")
+        await state.set_state(ProfileStates.waiting_for_age)
+        return
+    
+    elif any(word in user_feedback for word in ['рост', 'высота', 'см']):
+        # Пользователь хочет изменить рост
+        await message.answer("Рост в см? Например: 170")
+        await state.set_state(ProfileStates.waiting_for_height)
+        return
+    
+    elif any(word in user_feedback for word in ['вес', 'масса', 'кг']):
+        # Пользователь хочет изменить вес
+        await message.answer("Вес в кг? Например: 65")
+        await state.set_state(ProfileStates.waiting_for_weight)
+        return
+    
+    elif any(word in user_feedback for word in ['активность', 'спорт', 'движение']):
+        # Пользователь хочет изменить активность
+        keyboard = ReplyKeyboardMarkup(
+            keyboard=[
+                [KeyboardButton(text="Низкий"), KeyboardButton(text="Средний"), KeyboardButton(text="Высокий")]
+            ],
+            resize_keyboard=True
+        )
+        await message.answer(
+            "Выбери уровень активности:\n\n"
+            "🏃‍♀️ Низкий — почти нет спорта\n"
+            "🏃‍♀️ Средний — спорт 2–3 раза в неделю\n"
+            "🏃‍♀️ Высокий — 4+ раз в неделю или физическая работа",
+            reply_markup=keyboard
+        )
+        await state.set_state(ProfileStates.waiting_for_activity)
+        return
+    
+    elif any(word in user_feedback for word in ['пол', 'мужской', 'женский']):
+        # Пользователь хочет изменить пол
+        keyboard = ReplyKeyboardMarkup(
+            keyboard=[
+                [KeyboardButton(text="Мужской"), KeyboardButton(text="Женский")]
+            ],
+            resize_keyboard=True
+        )
+        await message.answer(
+            "Укажи биологический пол — он влияет на расчёт калорий.",
+            reply_markup=keyboard
+        )
+        await state.set_state(ProfileStates.waiting_for_gender)
+        return
+    
+    else:
+        # Если не поняли, что хочет изменить, предлагаем изменить цель
+        await message.answer(
+            "Понял! Напиши новую цель своими словами:",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        await state.set_state(ProfileStates.waiting_for_goal)
+
+@router.message(F.text & ~F.text.startswith('/'))
+async def auto_food_analysis(message: Message, state: FSMContext, db: Storage, ledger: UsageLedger):
+    # Проверяем, не находимся ли мы в другом диалоге
+    current_state = await state.get_state()
+    if current_state:
+        return
+    
+    user_food = message.text.strip()
+    
+    # Игнорируем очень короткие сообщения
+    if len(user_food) < 2:
+        return
+    
+    # Проверяем, есть ли профиль
+    if not await db.user_profile_exists(message.from_user.id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    await message.answer(formatting.ANALYZING)
+    await analyze_food_text(message, state, db, ledger, user_food)
+
+@router.message(F.voice)
+async def voice_food_analysis(message: Message, state: FSMContext, db: Storage, ledger: UsageLedger):
+    # Проверяем, не находимся ли мы в другом диалоге
+    if await state.get_state():
+        return
+    
+    if not await db.user_profile_exists(message.from_user.id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    if message.voice.duration > voice.VOICE_MAX_DURATION:
+        await message.answer(formatting.VOICE_TOO_LONG)
+        return
+    
+    # Не качаем запись, если её всё равно некуда поставить
+    if voice.transcription_queue.is_full():
+        await message.answer(formatting.VOICE_BUSY)
+        return
+    
+    await message.answer(formatting.VOICE_LISTENING)
+    
+    try:
+        audio = await message.bot.download(message.voice, destination=BytesIO())
+        user_food = (await voice.transcription_queue.transcribe(audio.getvalue(), 'voice.ogg')).strip()
+    except voice.QueueFull:
+        await message.answer(formatting.VOICE_BUSY)
+        return
+    except Exception as e:
+        logger.exception("Ошибка при распознавании голосового: %s", e)
+        await message.answer(formatting.VOICE_NOT_RECOGNIZED)
+        return
+    
+    if len(user_food) < 2:
+        await message.answer(formatting.VOICE_NOT_RECOGNIZED)
+        return
+    
+    await message.answer(formatting.VOICE_RECOGNIZED.render(user_food))
+    await analyze_food_text(message, state, db, ledger, user_food)
+
+@router.message(F.photo)
+async def photo_food_analysis(message: Message, state: FSMContext, db: Storage, ledger: UsageLedger):
+    # Проверяем, не находимся ли мы в другом диалоге
+    if await state.get_state():
+        return
+    
+    if not await db.user_profile_exists(message.from_user.id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    await message.answer(formatting.PHOTO_ANALYZING)
+    
+    try:
+        # Скачивание, уменьшение и хэш — вне event loop, повторное фото берётся из кэша
+        description, kbju, cached = await photos.analyze_photo(
+            message.bot, message.photo, ledger, message.from_user.id, (message.caption or '').strip()
+        )
+        
+        if kbju.calories == 0:
+            await message.answer(formatting.PHOTO_NOT_RECOGNIZED)
+            return
+        
+        await save_food_to_daily(db, message.from_user.id, description, kbju)
+        daily_summary = await get_daily_summary(db, message.from_user.id)
+        
+        target = await db.calculate_target_calories(message.from_user.id)
+        header = formatting.PHOTO_CACHED if cached else formatting.PHOTO_ANALYZING
+        await message.answer(formatting.render_meal_result(
+            header, description, kbju, daily_summary, target['calories']
+        ))
+        
+    except BudgetExceeded:
+        await message.answer(formatting.BUDGET_EXCEEDED)
+    except Exception as e:
+        logger.exception("Ошибка при анализе фото: %s", e)
+        await message.answer("Извини, произошла ошибка при анализе еды. Попробуй ещё раз.")
+
+@router.message(F.document.file_name.endswith('.zip'))
+async def import_apple_health(message: Message, state: FSMContext, db: Storage):
+    """export.zip из приложения «Здоровье»: активная энергия, шаги и вес по дням"""
+    if await state.get_state():
+        return
+    
+    user_id = message.from_user.id
+    if not await db.user_profile_exists(user_id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    if (message.document.file_size or 0) > health.HEALTH_MAX_FILE_SIZE:
+        await message.answer(
+            f"Файл больше {health.HEALTH_MAX_FILE_SIZE // 1024 // 1024} МБ — Telegram не отдаёт ботам такие файлы. "
+            "Экспортируй данные за более короткий период."
+        )
+        return
+    
+    await message.answer("⏳ Разбираю экспорт Apple Health, это может занять пару минут...")
+    
+    # На диск, а не в память: экспорт бывает на сотни мегабайт
+    fd, path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    try:
+        await message.bot.download(message.document, destination=path)
+        days, records = await health.import_export(path)
+    except (health.ExportError, zipfile.BadZipFile) as e:
+        await message.answer(f"Не получилось прочитать экспорт: {e}")
+        return
+    except Exception as e:
+        logger.exception("Ошибка импорта Apple Health: %s", e)
+        await message.answer("Извини, произошла ошибка при импорте. Попробуй ещё раз.")
+        return
+    finally:
+        os.remove(path)
+    
+    active_energy = health.average_active_energy(days)
+    body_mass = health.latest_body_mass(days)
+    weight = round(body_mass) if body_mass else None
+    if not days:
+        await message.answer("В экспорте нет данных об активности, шагах или весе.")
+        return
+    if not await db.save_health_days(user_id, days, active_energy, weight):
+        await message.answer("Не удалось сохранить данные, попробуй ещё раз.")
+        return
+    
+    target = await db.calculate_target_calories(user_id)
+    lines = [
+        f"✅ Импортировано дней: {len(days)} ({days[0].date} — {days[-1].date}), записей: {records}",
+    ]
+    if active_energy:
+        lines.append(f"🔥 Активная энергия: в среднем {active_energy} ккал/день")
+    if weight:
+        lines.append(f"⚖️ Вес: {weight} кг")
+    lines.append(f"🎯 Таргет: {target['calories']} ккал")
+    await message.answer('\n'.join(lines))
+
+@router.message(FoodStates.waiting_for_clarification)
+async def food_clarification(message: Message, state: FSMContext, db: Storage, ledger: UsageLedger):
+    data = await state.get_data()
+    original_food = data.get('original_food', '')
+    clarification = message.text.strip()
+    
+    combined_food = f"{original_food} {clarification}"
+    
+    await message.answer(formatting.RECALCULATING)
+    
+    try:
+        # Отправляем запрос к GPT с уточнением
+        kbju, _ = await ledger.estimate_kbju(message.from_user.id, combined_food)
+        
+        # Сохраняем еду в дневной учет
+        await save_food_to_daily(db, message.from_user.id, combined_food, kbju)
+        
+        # Получаем дневную сводку
+        daily_summary = await get_daily_summary(db, message.from_user.id)
+        
+        # Формируем ответ с дневной сводкой и прогрессом к цели
+        target = await db.calculate_target_calories(message.from_user.id)
+        response_text = formatting.render_meal_result(
+            formatting.RECALCULATING, combined_food, kbju, daily_summary, target['calories']
+        )
+        
+        await message.answer(response_text)
+        
+    except BudgetExceeded:
+        await message.answer(formatting.BUDGET_EXCEEDED)
+    except Exception as e:
+        logger.exception("Ошибка при уточнении еды: %s", e)
+        await message.answer("Извини, произошла ошибка при анализе еды. Попробуй ещё раз.")
+    
+    await state.clear()
+
+@router.message(Command("day"))
+async def show_daily_summary(message: Message, db: Storage):
+    user_id = message.from_user.id
+    
+    if not await db.user_profile_exists(user_id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    # Получаем дневную сводку
+    daily_summary = await get_daily_summary(db, user_id)
+    
+    # Получаем целевые калории
+    target = await db.calculate_target_calories(user_id)
+    
+    if target['calories'] == 0:
+        await message.answer("Ошибка расчёта целевых калорий. Проверь свой профиль.")
+        return
+    
+    text = formatting.render_day_summary(daily_summary, target)
+    keyboard = await frequent_meals_keyboard(db, user_id)
+    if keyboard:
+        text += '\n\n' + formatting.FREQUENT_HEADER
+    await message.answer(text, reply_markup=keyboard)
+
+@router.message(Command("target"))
+async def show_target_calories(message: Message, db: Storage):
+    user_id = message.from_user.id
+    
+    if not await db.user_profile_exists(user_id):
+        await message.answer(
+            "Сначала нужно настроить профиль! Используй команду /profile"
+        )
+        return
+    
+    profile = await db.get_user_profile(user_id)
+    target = await db.calculate_target_calories(user_id)
+    logger.debug("Профиль: %s, целевые калории: %s", profile, target)
+    
+    if target['calories'] == 0:
+        await message.answer("Ошибка расчёта целевых калорий. Проверь свой профиль.")
+        return
+    
+    await message.answer(formatting.render_target_details(profile, target))
+
+@router.message(Command("meals"))
+async def show_meals(message: Message, command: CommandObject, db: Storage):
+    user_id = message.from_user.id
+    
+    if not await db.user_profile_exists(user_id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    # /meals ГГГГ-ММ-ДД — история за прошлый день, в том числе из архива
+    if command.args:
+        try:
+            day = date.fromisoformat(command.args.strip()).isoformat()
+        except ValueError:
+            await message.answer("Формат: /meals или /meals ГГГГ-ММ-ДД")
+            return
+        meals = await db.get_meals_between(user_id, day, day)
+        if not meals:
+            await message.answer(f"За {day} записей нет.")
+            return
+        await message.answer(f"📅 {day}\n\n" + formatting.render_meals(meals))
+        return
+    
+    meals = await db.get_meals_for_day(user_id)
+    text = formatting.render_meals(meals) if meals else "Сегодня ты ещё ничего не ел(а). Добавь еду!"
+    
+    keyboard = await frequent_meals_keyboard(db, user_id)
+    if keyboard:
+        text += '\n\n' + formatting.FREQUENT_HEADER
+    await message.answer(text, reply_markup=keyboard)
+
+@router.callback_query(RepeatMeal.filter())
+async def repeat_frequent_meal(callback: CallbackQuery, callback_data: RepeatMeal, db: Storage):
+    """Нажатие на частое блюдо: запись с сохранённым КБЖУ, без GPT"""
+    user_id = callback.from_user.id
+    
+    item = await db.get_frequent_meal(user_id, callback_data.id)
+    if item is None:
+        await callback.answer("Этого блюда уже нет в частых", show_alert=True)
+        return
+    
+    kbju = Kbju(item.calories, item.proteins, item.fats, item.carbs)
+    if not await save_food_to_daily(db, user_id, item.description, kbju):
+        await callback.answer("Не получилось записать. Попробуй ещё раз.", show_alert=True)
+        return
+    
+    daily_summary = await get_daily_summary(db, user_id)
+    target = await db.calculate_target_calories(user_id)
+    await callback.answer()
+    await callback.bot.send_message(user_id, formatting.render_meal_result(
+        formatting.REPEATED, item.description, kbju, daily_summary, target['calories']
+    ))
+
+@router.message(Command("undo"))
+async def undo_last_meal(message: Message, db: Storage):
+    user_id = message.from_user.id
+    
+    meals = await db.get_meals_for_day(user_id)
+    if not meals:
+        await message.answer("Сегодня ещё нечего отменять.")
+        return
+    
+    deleted = await db.delete_meal(user_id, meals[-1].id)
+    if not deleted:
+        await message.answer("Не получилось отменить запись. Попробуй ещё раз.")
+        return
+    
+    await message.answer(f"↩️ Отменил: {formatting.escape_html(deleted.description)} ({deleted.calories} ккал)")
+
+@router.message(Command("delete"))
+async def delete_meal(message: Message, command: CommandObject, db: Storage):
+    user_id = message.from_user.id
+    
+    meal = await get_meal_by_ordinal(db, user_id, command.args)
+    if not meal:
+        await message.answer("Укажи номер приёма пищи из /meals, например: /delete 2")
+        return
+    
+    deleted = await db.delete_meal(user_id, meal.id)
+    if not deleted:
+        await message.answer("Не получилось удалить запись. Попробуй ещё раз.")
+        return
+    
+    await message.answer(f"🗑 Удалил: {formatting.escape_html(deleted.description)} ({deleted.calories} ккал)")
+
+@router.message(Command("edit"))
+async def edit_meal(message: Message, command: CommandObject, db: Storage, ledger: UsageLedger):
+    user_id = message.from_user.id
+    
+    ordinal_text, _, new_description = (command.args or '').partition(' ')
+    new_description = new_description.strip()
+    meal = await get_meal_by_ordinal(db, user_id, ordinal_text)
+    if not meal or len(new_description) < 2:
+        await message.answer("Укажи номер из /meals и новое описание, например: /edit 2 овсянка 200 г")
+        return
+    
+    await message.answer(formatting.RECALCULATING)
+    
+    try:
+        kbju, _ = await ledger.estimate_kbju(user_id, new_description)
+        
+        if kbju.calories == 0:
+            await message.answer("Не получилось оценить КБЖУ. Уточни размер порции, например: /edit 2 овсянка 200 г")
+            return
+        
+        if not await db.update_meal(user_id, meal.id, new_description, kbju):
+            await message.answer("Не получилось изменить запись. Попробуй ещё раз.")
+            return
+        
+        daily_summary = await get_daily_summary(db, user_id)
+        
+        response_text = '\n\n'.join((
+            f"✏️ Запись {ordinal_text} обновлена",
+            formatting.render_meal(new_description, kbju),
+            f"📊 Итого за день: {daily_summary.calories} ккал"
+        ))
+        
+        await message.answer(response_text)
+        
+    except BudgetExceeded:
+        await message.answer(formatting.BUDGET_EXCEEDED)
+    except Exception as e:
+        logger.exception("Ошибка при изменении еды: %s", e)
+        await message.answer("Извини, произошла ошибка при анализе еды. Попробуй ещё раз.")
+
+@router.message(Command("remind", "evening"))
+async def set_reminder(message: Message, command: CommandObject, db: Storage, scheduler: ReminderScheduler):
+    user_id = message.from_user.id
+    
+    if not await db.user_profile_exists(user_id):
+        await message.answer("Сначала нужно настроить профиль! Используй команду /profile")
+        return
+    
+    is_reminder = command.command == "remind"
+    field = 'reminder_time' if is_reminder else 'summary_time'
+    args = (command.args or '').strip().lower()
+    
+    if args in ('off', 'выкл', 'нет'):
+        scheduler.update_user(await db.save_subscription(user_id, **{field: None}))
+        await message.answer(formatting.REMINDER_OFF if is_reminder else formatting.SUMMARY_OFF)
+        return
+    
+    parsed = parse_time(args or ('13:00' if is_reminder else '21:00'))
+    if not parsed:
+        await message.answer(formatting.TIME_ERROR)
+        return
+    
+    hhmm = f"{parsed[0]:02d}:{parsed[1]:02d}"
+    scheduler.update_user(await db.save_subscription(user_id, **{field: hhmm}))
+    template = formatting.REMINDER_ON if is_reminder else formatting.SUMMARY_ON
+    await message.answer(template.render(hhmm))
+
+@router.message(Command("tz"))
+async def set_timezone(message: Message, command: CommandObject, db: Storage, scheduler: ReminderScheduler):
+    user_id = message.from_user.id
+    
+    if not command.args:
+        subscription = await db.get_subscription(user_id) or {'utc_offset_minutes': 180}
+        await message.answer(formatting.render_utc_offset(subscription['utc_offset_minutes']))
+        return
+    
+    offset = parse_utc_offset(command.args)
+    if offset is None:
+        await message.answer(formatting.TIMEZONE_ERROR)
+        return
+    
+    subscription = await db.save_subscription(user_id, utc_offset_minutes=offset)
+    scheduler.update_user(subscription)
+    await message.answer(formatting.render_utc_offset(offset))
+
+@router.message(Command("broadcast"))
+async def start_broadcast(message: Message, command: CommandObject, db: Storage, broadcaster: Broadcaster):
+    # Команда только для администраторов; остальным бот делает вид, что её нет
+    if not is_admin(message.from_user.id):
+        return
+    
+    if not command.args:
+        broadcast = await db.get_broadcast()
+        await message.answer(render_report(broadcast) if broadcast else "Рассылок ещё не было. Формат: /broadcast текст")
+        return
+    
+    if broadcaster.is_running():
+        await message.answer("Рассылка уже идёт, дождись её завершения. Статус: /broadcast")
+        return
+    
+    # Рассылка уходит с HTML-разметкой: текст с ошибкой разметки Telegram отклонит
+    # у каждого получателя, поэтому сначала он отправляется администратору как превью,
+    # отдельным сообщением, не склеенным с соседними ответами
+    token = send_coalesce_var.set(False)
+    try:
+        await message.answer(command.args)
+    except TelegramBadRequest as e:
+        await message.answer(f"Telegram не принял текст рассылки, она не запущена: {e.message}", parse_mode=None)
+        return
+    finally:
+        send_coalesce_var.reset(token)
+    
+    broadcast_id = await db.create_broadcast(command.args, message.from_user.id)
+    if broadcast_id is None:
+        await message.answer("Не удалось создать рассылку, попробуй ещё раз")
+        return
+    
+    broadcaster.start(message.bot, await db.get_broadcast(broadcast_id))
+    await message.answer(f"📣 Рассылка #{broadcast_id} запущена. Статус: /broadcast")
+
+@router.message(Command("storage"))
+async def show_storage(message: Message, db: Storage):
+    if not is_admin(message.from_user.id):
+        return
+    
+    await message.answer(await db.size_report())
+
+@router.message(Command("usage"))
+async def show_usage(message: Message, command: CommandObject, db: Storage):
+    """Расход GPT по моделям и очередь голосовых: /usage — за сегодня, /usage 7 — за неделю"""
+    if not is_admin(message.from_user.id):
+        return
+    
+    try:
+        days = int(command.args) if command.args else 1
+    except ValueError:
+        days = 0
+    if days < 1:
+        await message.answer("Формат: /usage или /usage N (дней)")
+        return
+    
+    # Очередь распознавания живёт в процессе: её метрики — с момента запуска бота
+    report = await usage_report(db, days)
+    await message.answer(f"{report}\n\n{voice.render_queue_stats(voice.transcription_queue.stats())}")
@@ -0,0 +1,166 @@
+# health.py
+# Импорт export.zip из Apple Health: потоковый разбор XML в пуле процессов
+import asyncio
+import logging
+import os
+import zipfile
+from collections import defaultdict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from models import HealthDay
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+HEALTH_WORKERS = int(os.getenv('HEALTH_WORKERS', '1'))
+# Bot API без локального сервера не отдаёт ботам файлы больше 20 МБ
+HEALTH_MAX_FILE_SIZE = int(os.getenv('HEALTH_MAX_FILE_SIZE', str(20 * 1024 * 1024)))
+# Защита от zip-бомбы: сколько распакованного XML читаем максимум
+HEALTH_MAX_XML_SIZE = int(os.getenv('HEALTH_MAX_XML_SIZE', str(4 * 1024 * 1024 * 1024)))
+# За сколько последних дней с данными усредняем активную энергию для TDEE
+HEALTH_TDEE_DAYS = int(os.getenv('HEALTH_TDEE_DAYS', '14'))
+
+ACTIVE_ENERGY = 'HKQuantityTypeIdentifierActiveEnergyBurned'
+BASAL_ENERGY = 'HKQuantityTypeIdentifierBasalEnergyBurned'
+STEPS = 'HKQuantityTypeIdentifierStepCount'
+BODY_MASS = 'HKQuantityTypeIdentifierBodyMass'
+# Суммируемые за день показатели -> поле HealthDay
+SUMMED = {ACTIVE_ENERGY: 'active_energy', BASAL_ENERGY: 'basal_energy', STEPS: 'steps'}
+# Перевод в ккал и кг
+UNITS = {'kcal': 1.0, 'Cal': 1.0, 'kJ': 1 / 4.184, 'kg': 1.0, 'lb': 0.45359237, 'g': 0.001, 'count': 1.0}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+class ExportError(Exception):
+    """Файл не похож на экспорт Apple Health"""
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Пул процессов поднимается при первом импорте"""
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: к этому моменту в процессе уже работают потоки логов, трейсинга и записи
+        # в базу, и их захваченные блокировки скопировались бы в дочерний процесс
+        _pool = ProcessPoolExecutor(max_workers=HEALTH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def shutdown():
+    """Останавливает пул процессов; вызывается из App.shutdown"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+class _LimitedReader:
+    """Файловый объект поверх потока из zip, который обрывает чтение после limit байт"""
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.consumed = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.consumed += len(data)
+        if self.consumed > self.limit:
+            raise ExportError("Распакованный export.xml слишком большой")
+        return data
+
+def _find_export_xml(archive: zipfile.ZipFile) -> str:
+    for name in archive.namelist():
+        if name.endswith('/export.xml') or name == 'export.xml':
+            return name
+    raise ExportError("В архиве нет export.xml")
+
+def _collect(elem, sums: Dict, body_mass: Dict):
+    kind = elem.get('type')
+    if kind not in SUMMED and kind != BODY_MASS:
+        return
+    start = elem.get('startDate') or ''
+    # Дата по местному времени устройства: '2024-01-15 08:00:00 +0300'
+    day = start[:10]
+    try:
+        value = float(elem.get('value')) * UNITS[elem.get('unit', 'count')]
+    except (KeyError, TypeError, ValueError):
+        return
+    if not day:
+        return
+    if kind == BODY_MASS:
+        if day not in body_mass or body_mass[day][0] <= start:
+            body_mass[day] = (start, value)
+    else:
+        sums[(kind, day)][elem.get('sourceName', '')] += value
+
+def parse_export(path: str, max_xml_size: int = HEALTH_MAX_XML_SIZE) -> Tuple[List[HealthDay], int]:
+    """Разбирает export.zip в дневные итоги; выполняется в процессе пула
+
+    XML читается прямо из zip и разбирается iterparse: каждая запись
+    обрабатывается в момент закрытия тега, после чего корень очищается,
+    так что дерево в памяти не растёт и пик памяти не зависит от размера
+    выгрузки. iPhone и часы пишут одни и те же шаги и энергию, поэтому
+    суммируемые показатели считаются по каждому источнику отдельно и за
+    день берётся максимум по источникам. Вес — последний замер дня.
+
+    Возвращает (дни по возрастанию даты, число разобранных записей).
+    """
+    # (показатель, день) -> источник -> сумма
+    sums: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    # день -> (время замера, кг)
+    body_mass: Dict[str, Tuple[str, float]] = {}
+    records = 0
+
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(_find_export_xml(archive)) as stream:
+            context = ElementTree.iterparse(_LimitedReader(stream, max_xml_size), events=('start', 'end'))
+            _, root = next(context)
+            if root.tag != 'HealthData':
+                raise ExportError("export.xml не из Apple Health")
+
+            # Глубина вложенности: записи — прямые потомки корня; Record внутри
+            # Correlation дублируют верхнеуровневые и пропускаются
+            depth = 1
+            for event, elem in context:
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if elem.tag == 'Record':
+                    records += 1
+                    _collect(elem, sums, body_mass)
+                root.clear()
+
+    days: Dict[str, HealthDay] = {}
+    for (kind, day), by_source in sums.items():
+        setattr(days.setdefault(day, HealthDay(day)), SUMMED[kind], round(max(by_source.values())))
+    for day, (_, kg) in body_mass.items():
+        days.setdefault(day, HealthDay(day)).body_mass = round(kg, 1)
+
+    return [days[day] for day in sorted(days)], records
+
+def average_active_energy(days: List[HealthDay], window: int = HEALTH_TDEE_DAYS) -> Optional[int]:
+    """Средняя активная энергия за последние window дней, в которые она записана"""
+    values = [day.active_energy for day in days if day.active_energy][-window:]
+    if not values:
+        return None
+    return round(sum(values) / len(values))
+
+def latest_body_mass(days: List[HealthDay]) -> Optional[float]:
+    for day in reversed(days):
+        if day.body_mass:
+            return day.body_mass
+    return None
+
+async def import_export(path: str) -> Tuple[List[HealthDay], int]:
+    """Разбор export.zip в пуле процессов, чтобы цикл событий не ждал сотни мегабайт XML"""
+    loop = asyncio.get_running_loop()
+    with span('health.parse', file_size=os.path.getsize(path)) as current:
+        days, records = await loop.run_in_executor(_get_pool(), parse_export, path)
+        if current is not None:
+            current.set_attribute('health.records', records)
+            current.set_attribute('health.days', len(days))
+    logger.info("Экспорт Apple Health разобран", extra={'records': records, 'days': len(days)})
+    return days, records
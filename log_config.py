@@ -0,0 +1,97 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Контекст текущего апдейта: проставляется мидлварью и попадает в каждую запись лога
+correlation_id_var: ContextVar[Optional[str]] = ContextVar('correlation_id', default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar('user_id', default=None)
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями из extra=
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[QueueListener] = None
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись correlation_id и user_id из контекста апдейта"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _ContextQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в потоке event loop'а"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение склеиваем сразу: аргументы могут измениться до записи в слушателе
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(level: Optional[str] = None) -> QueueListener:
+    """Настраивает JSON-логи с записью в stdout из фонового потока
+
+    Уровень берётся из LOG_LEVEL (по умолчанию INFO). Вызовы ниже уровня
+    отсекаются в logger.isEnabledFor, до склейки аргументов сообщения.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _ContextQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+def shutdown_logging():
+    """Дописывает оставшиеся записи и останавливает фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def elapsed_ms(started: float) -> float:
+    """Миллисекунды с момента time.perf_counter() == started"""
+    return round((time.perf_counter() - started) * 1000, 2)
@@ -0,0 +1,92 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import SendMessage, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from log_config import correlation_id_var, elapsed_ms, user_id_var
+from sender import OutboundDispatcher, send_coalesce_var, send_priority_var
+from tracing import span, start_trace
+
+logger = logging.getLogger(__name__)
+
+class UpdateContextMiddleware(BaseMiddleware):
+    """Проставляет correlation_id/user_id для логов апдейта и пишет его латентность"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        correlation_token = correlation_id_var.set(
+            f"upd-{event.update_id}" if isinstance(event, Update) else None
+        )
+        user_token = user_id_var.set(user.id if user else None)
+        started = time.perf_counter()
+
+        try:
+            return await handler(event, data)
+        except Exception:
+            logger.exception("Ошибка обработки апдейта", extra={'update_type': update_type})
+            raise
+        finally:
+            logger.info(
+                "Апдейт обработан",
+                extra={'update_type': update_type, 'latency_ms': elapsed_ms(started)}
+            )
+            user_id_var.reset(user_token)
+            correlation_id_var.reset(correlation_token)
+
+class TracingMiddleware(BaseMiddleware):
+    """Корневой спан на каждый апдейт; дочерние спаны вешаются на него через контекст"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get('event_from_user')
+        root = start_trace(
+            'aiogram.update',
+            update_id=getattr(event, 'update_id', None),
+            update_type=getattr(event, 'event_type', None),
+            user_id=user.id if user else None,
+        )
+        with root:
+            return await handler(event, data)
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Спан на каждый исходящий вызов Telegram Bot API"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        with span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+class OutboundRequestMiddleware(BaseRequestMiddleware):
+    """Пропускает sendMessage через очередь исходящих с лимитами Telegram"""
+
+    def __init__(self, dispatcher: OutboundDispatcher):
+        self.dispatcher = dispatcher
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        if not isinstance(method, SendMessage):
+            return await make_request(bot, method)
+        return await self.dispatcher.submit(make_request, bot, method, send_priority_var.get(), send_coalesce_var.get())
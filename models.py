@@ -0,0 +1,165 @@
+# models.py
+# Модели данных бота: компактные объекты со __slots__ вместо словаря на каждую строку БД
+from typing import Dict, Optional
+
+class Kbju:
+    """Калории и БЖУ приёма пищи или их разница"""
+
+    __slots__ = ('calories', 'proteins', 'fats', 'carbs')
+
+    def __init__(self, calories: int = 0, proteins: int = 0, fats: int = 0, carbs: int = 0):
+        self.calories = calories
+        self.proteins = proteins
+        self.fats = fats
+        self.carbs = carbs
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """row_factory для sqlite3: колонки SELECT идут в порядке аргументов конструктора"""
+        return cls(*row)
+
+    def __add__(self, other: 'Kbju') -> 'Kbju':
+        return Kbju(
+            self.calories + other.calories,
+            self.proteins + other.proteins,
+            self.fats + other.fats,
+            self.carbs + other.carbs
+        )
+
+    def __sub__(self, other: 'Kbju') -> 'Kbju':
+        return Kbju(
+            self.calories - other.calories,
+            self.proteins - other.proteins,
+            self.fats - other.fats,
+            self.carbs - other.carbs
+        )
+
+    def __neg__(self) -> 'Kbju':
+        return Kbju(-self.calories, -self.proteins, -self.fats, -self.carbs)
+
+    def __eq__(self, other) -> bool:
+        # Равны только объекты одной модели: у Meal и Kbju разные наборы полей
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in _all_slots(type(self)))
+
+    # Модели изменяемые, поэтому как ключи словарей и элементы множеств не годятся
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in _all_slots(type(self)))
+        return f"{type(self).__name__}({fields})"
+
+class DailySummary(Kbju):
+    """Итоги дня: сумма КБЖУ и число приёмов пищи"""
+
+    __slots__ = ('meals',)
+
+    def __init__(self, calories: int = 0, proteins: int = 0, fats: int = 0, carbs: int = 0, meals: int = 0):
+        super().__init__(calories, proteins, fats, carbs)
+        self.meals = meals
+
+class Meal(Kbju):
+    """Запись о приёме пищи"""
+
+    __slots__ = ('id', 'description')
+
+    def __init__(self, id: int, description: str, calories: int = 0, proteins: int = 0, fats: int = 0, carbs: int = 0):
+        super().__init__(calories, proteins, fats, carbs)
+        self.id = id
+        self.description = description
+
+class FrequentMeal(Meal):
+    """Блюдо из индекса частых блюд пользователя; id — строки frequent_meals, а не meals"""
+
+    __slots__ = ('uses',)
+
+    def __init__(self, id: int, description: str, calories: int = 0, proteins: int = 0, fats: int = 0,
+                 carbs: int = 0, uses: int = 0):
+        super().__init__(id, description, calories, proteins, fats, carbs)
+        self.uses = uses
+
+class UserProfile:
+    """Профиль пользователя из таблицы users"""
+
+    __slots__ = ('user_id', 'gender', 'age', 'height', 'weight', 'activity', 'goal',
+                 'goal_category', 'target_calories', 'active_energy')
+
+    def __init__(self, user_id: int, gender: Optional[str] = None, age: int = 0, height: int = 0,
+                 weight: int = 0, activity: Optional[str] = None, goal: Optional[str] = None,
+                 goal_category: Optional[int] = None, target_calories: Optional[int] = None,
+                 active_energy: Optional[int] = None):
+        self.user_id = user_id
+        self.gender = gender
+        self.age = age
+        self.height = height
+        self.weight = weight
+        self.activity = activity
+        self.goal = goal
+        # Категория цели (goals.GoalCategory) — заполняется при сохранении профиля
+        self.goal_category = goal_category
+        # Калории, которые пользователь задал сам; None — считать по TDEE
+        self.target_calories = target_calories
+        # Средняя активная энергия в день из Apple Health; None — TDEE по уровню активности
+        self.active_energy = active_energy
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+    @classmethod
+    def from_state(cls, user_id: int, data: Dict) -> 'UserProfile':
+        """Из данных анкеты /profile в FSM"""
+        return cls(
+            user_id,
+            data.get('gender'),
+            data.get('age', 0),
+            data.get('height', 0),
+            data.get('weight', 0),
+            data.get('activity'),
+            data.get('goal'),
+            target_calories=data.get('target_calories')
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, UserProfile):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"UserProfile({fields})"
+
+class HealthDay:
+    """Дневные итоги из Apple Health: энергия в ккал, шаги, вес в кг"""
+
+    __slots__ = ('date', 'active_energy', 'basal_energy', 'steps', 'body_mass')
+
+    def __init__(self, date: str, active_energy: Optional[int] = None, basal_energy: Optional[int] = None,
+                 steps: Optional[int] = None, body_mass: Optional[float] = None):
+        self.date = date
+        self.active_energy = active_energy
+        self.basal_energy = basal_energy
+        self.steps = steps
+        self.body_mass = body_mass
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        return cls(*row)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, HealthDay):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"HealthDay({fields})"
+
+def _all_slots(cls) -> tuple:
+    """Слоты класса вместе со слотами родителей, от базового к наследнику"""
+    return tuple(name for klass in reversed(cls.__mro__) for name in getattr(klass, '__slots__', ()))
@@ -0,0 +1,662 @@
+# pg_storage.py
+# Хранилище на PostgreSQL: пул соединений asyncpg и подготовленные запросы
+import logging
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from frequent import index_rows, meal_key, use_score
+from goals import classify_goal
+from models import DailySummary, FrequentMeal, HealthDay, Kbju, Meal, UserProfile
+from storage import Storage
+from targets import TARGET_COLUMNS, TargetTable, target_table
+
+logger = logging.getLogger(__name__)
+
+PG_POOL_MIN_SIZE = int(os.getenv('PG_POOL_MIN_SIZE', '1'))
+PG_POOL_MAX_SIZE = int(os.getenv('PG_POOL_MAX_SIZE', '10'))
+# Сколько подготовленных запросов держит каждое соединение пула
+PG_STATEMENT_CACHE_SIZE = int(os.getenv('PG_STATEMENT_CACHE_SIZE', '100'))
+
+# Даты хранятся строками ГГГГ-ММ-ДД, как и в SQLite: остальной код работает со строками
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        gender TEXT,
+        age INTEGER,
+        height INTEGER,
+        weight INTEGER,
+        activity TEXT,
+        goal TEXT,
+        goal_category SMALLINT,
+        target_calories INTEGER,
+        health_active_energy INTEGER,
+        created_at TIMESTAMPTZ DEFAULT now()
+    );
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS health_active_energy INTEGER;
+    CREATE TABLE IF NOT EXISTS meals (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT,
+        description TEXT,
+        calories INTEGER,
+        proteins INTEGER,
+        fats INTEGER,
+        carbs INTEGER,
+        date TEXT,
+        created_at TIMESTAMPTZ DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS meals_user_date ON meals (user_id, date);
+    CREATE TABLE IF NOT EXISTS daily_summaries (
+        user_id BIGINT,
+        date TEXT,
+        total_calories INTEGER,
+        total_proteins INTEGER,
+        total_fats INTEGER,
+        total_carbs INTEGER,
+        meals_count INTEGER,
+        created_at TIMESTAMPTZ DEFAULT now(),
+        updated_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (user_id, date)
+    );
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        user_id BIGINT PRIMARY KEY,
+        utc_offset_minutes INTEGER DEFAULT 180,
+        reminder_time TEXT,
+        summary_time TEXT,
+        updated_at TIMESTAMPTZ DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id BIGSERIAL PRIMARY KEY,
+        text TEXT,
+        created_by BIGINT,
+        status TEXT DEFAULT 'running',
+        last_user_id BIGINT DEFAULT 0,
+        delivered INTEGER DEFAULT 0,
+        blocked INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        created_at TIMESTAMPTZ DEFAULT now(),
+        updated_at TIMESTAMPTZ DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS health_days (
+        user_id BIGINT,
+        date TEXT,
+        active_energy INTEGER,
+        basal_energy INTEGER,
+        steps INTEGER,
+        body_mass REAL,
+        PRIMARY KEY (user_id, date)
+    );
+    CREATE TABLE IF NOT EXISTS gpt_usage (
+        user_id BIGINT,
+        date TEXT,
+        model TEXT,
+        requests INTEGER DEFAULT 0,
+        prompt_tokens BIGINT DEFAULT 0,
+        completion_tokens BIGINT DEFAULT 0,
+        cost DOUBLE PRECISION DEFAULT 0,
+        latency_ms BIGINT DEFAULT 0,
+        max_latency_ms INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, date, model)
+    );
+    CREATE INDEX IF NOT EXISTS gpt_usage_date ON gpt_usage (date);
+    CREATE TABLE IF NOT EXISTS frequent_meals (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT,
+        meal_key TEXT,
+        description TEXT,
+        calories INTEGER,
+        proteins INTEGER,
+        fats INTEGER,
+        carbs INTEGER,
+        uses INTEGER DEFAULT 0,
+        score DOUBLE PRECISION,
+        UNIQUE (user_id, meal_key)
+    );
+    CREATE INDEX IF NOT EXISTS frequent_meals_rank ON frequent_meals (user_id, score DESC);
+'''
+
+# Колонки SELECT в порядке аргументов конструкторов моделей, как в database.py
+PROFILE_COLUMNS = (
+    'user_id, gender, age, height, weight, activity, goal, goal_category, target_calories, health_active_energy'
+)
+MEAL_COLUMNS = 'id, description, COALESCE(calories, 0), COALESCE(proteins, 0), COALESCE(fats, 0), COALESCE(carbs, 0)'
+# Момент записи приёма пищи в секундах эпохи; для строк без created_at — дата
+MEAL_USED_AT = 'EXTRACT(EPOCH FROM COALESCE(created_at, date::date))::float8'
+SUMMARY_COLUMNS = (
+    'COALESCE(total_calories, 0), COALESCE(total_proteins, 0), '
+    'COALESCE(total_fats, 0), COALESCE(total_carbs, 0), COALESCE(meals_count, 0)'
+)
+FREQUENT_COLUMNS = (
+    'id, description, COALESCE(calories, 0), COALESCE(proteins, 0), COALESCE(fats, 0), COALESCE(carbs, 0), uses'
+)
+BROADCAST_COLUMNS = 'id, text, created_by, status, last_user_id, delivered, blocked, failed'
+
+# Тексты запросов неизменны, поэтому asyncpg готовит каждый один раз на соединение
+# и дальше только передаёт параметры
+SAVE_PROFILE = '''
+    INSERT INTO users (user_id, gender, age, height, weight, activity, goal, goal_category, target_calories)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ON CONFLICT (user_id) DO UPDATE SET
+        gender = excluded.gender, age = excluded.age, height = excluded.height,
+        weight = excluded.weight, activity = excluded.activity, goal = excluded.goal,
+        goal_category = excluded.goal_category, target_calories = excluded.target_calories
+'''
+INSERT_MEAL = '''
+    INSERT INTO meals (user_id, description, calories, proteins, fats, carbs, date)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    RETURNING id
+'''
+APPLY_SUMMARY_DELTA = '''
+    INSERT INTO daily_summaries
+    (user_id, date, total_calories, total_proteins, total_fats, total_carbs, meals_count)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        total_calories = COALESCE(daily_summaries.total_calories, 0) + excluded.total_calories,
+        total_proteins = COALESCE(daily_summaries.total_proteins, 0) + excluded.total_proteins,
+        total_fats = COALESCE(daily_summaries.total_fats, 0) + excluded.total_fats,
+        total_carbs = COALESCE(daily_summaries.total_carbs, 0) + excluded.total_carbs,
+        meals_count = COALESCE(daily_summaries.meals_count, 0) + excluded.meals_count,
+        updated_at = now()
+'''
+# Рейтинг — log(e^старый + e^новый), как frequent.logaddexp; exp от большой
+# отрицательной разницы в PostgreSQL — ошибка underflow, поэтому разница ограничена
+BUMP_FREQUENT_MEAL = '''
+    INSERT INTO frequent_meals
+    (user_id, meal_key, description, calories, proteins, fats, carbs, uses, score)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, 1, $8)
+    ON CONFLICT (user_id, meal_key) DO UPDATE SET
+        description = excluded.description,
+        calories = excluded.calories,
+        proteins = excluded.proteins,
+        fats = excluded.fats,
+        carbs = excluded.carbs,
+        uses = frequent_meals.uses + 1,
+        score = GREATEST(frequent_meals.score, excluded.score)
+            + ln(1 + exp(-LEAST(abs(frequent_meals.score - excluded.score), 50)))
+'''
+# Рейтинг без одного использования — log(e^старый - e^вес), как frequent.logsubexp;
+# разница ограничена по той же причине, что и в BUMP_FREQUENT_MEAL
+UNBUMP_FREQUENT_MEAL = '''
+    UPDATE frequent_meals SET
+        uses = uses - 1,
+        score = CASE WHEN $3 < score THEN score + ln(1 - exp(GREATEST($3 - score, -50))) ELSE score END
+    WHERE user_id = $1 AND meal_key = $2
+'''
+INSERT_FREQUENT_MEAL = '''
+    INSERT INTO frequent_meals
+    (user_id, meal_key, description, calories, proteins, fats, carbs, uses, score)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+'''
+SAVE_HEALTH_DAY = '''
+    INSERT INTO health_days (user_id, date, active_energy, basal_energy, steps, body_mass)
+    VALUES ($1, $2, $3, $4, $5, $6)
+    ON CONFLICT (user_id, date) DO UPDATE SET
+        active_energy = excluded.active_energy, basal_energy = excluded.basal_energy,
+        steps = excluded.steps, body_mass = excluded.body_mass
+'''
+SAVE_GPT_USAGE = '''
+    INSERT INTO gpt_usage
+    (user_id, date, model, requests, prompt_tokens, completion_tokens, cost, latency_ms, max_latency_ms)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ON CONFLICT (user_id, date, model) DO UPDATE SET
+        requests = gpt_usage.requests + excluded.requests,
+        prompt_tokens = gpt_usage.prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = gpt_usage.completion_tokens + excluded.completion_tokens,
+        cost = gpt_usage.cost + excluded.cost,
+        latency_ms = gpt_usage.latency_ms + excluded.latency_ms,
+        max_latency_ms = GREATEST(gpt_usage.max_latency_ms, excluded.max_latency_ms)
+'''
+SUBSCRIPTION_FIELDS = ('utc_offset_minutes', 'reminder_time', 'summary_time')
+
+def _today() -> str:
+    return date.today().strftime('%Y-%m-%d')
+
+def _broadcast_from_row(row) -> Dict:
+    return dict(row.items())
+
+def _subscription_from_row(row) -> Dict:
+    return {
+        'user_id': row['user_id'],
+        'utc_offset_minutes': row['utc_offset_minutes'],
+        'reminder_time': row['reminder_time'],
+        'summary_time': row['summary_time']
+    }
+
+class PostgresStorage(Storage):
+    """Хранилище на PostgreSQL через пул asyncpg
+
+    Включается переменной DATABASE_URL (её же выставляет Heroku Postgres).
+    Вместо пачек IN (...) массовые выборки передают массив id одним
+    параметром (= ANY($1)), так что текст запроса не зависит от числа id.
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self):
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=PG_POOL_MIN_SIZE,
+            max_size=PG_POOL_MAX_SIZE,
+            statement_cache_size=PG_STATEMENT_CACHE_SIZE
+        )
+        async with self._pool.acquire() as conn:
+            index_exists = await conn.fetchval("SELECT to_regclass('frequent_meals') IS NOT NULL")
+            await conn.execute(SCHEMA)
+            if not index_exists:
+                # Первое заполнение индекса частых блюд; дальше его ведёт save_meal
+                rows = index_rows(await conn.fetch(
+                    'SELECT user_id, description, calories, proteins, fats, carbs, date FROM meals ORDER BY id'
+                ))
+                await conn.executemany(INSERT_FREQUENT_MEAL, rows)
+                logger.info("Индекс частых блюд заполнен из истории: %s строк", len(rows))
+            rows = await conn.fetch('SELECT user_id, goal FROM users WHERE goal_category IS NULL')
+            if rows:
+                await conn.executemany(
+                    'UPDATE users SET goal_category = $1 WHERE user_id = $2',
+                    [(int(classify_goal(row['goal'])), row['user_id']) for row in rows]
+                )
+                logger.info("Категории целей заполнены для %s профилей", len(rows))
+        logger.info("PostgreSQL подключён", extra={'pool_max_size': PG_POOL_MAX_SIZE})
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def save_user_profile(self, profile: UserProfile) -> bool:
+        profile.goal_category = int(classify_goal(profile.goal))
+
+        try:
+            await self._pool.execute(
+                SAVE_PROFILE,
+                profile.user_id, profile.gender, profile.age, profile.height, profile.weight,
+                profile.activity, profile.goal, profile.goal_category, profile.target_calories
+            )
+            logger.debug("Профиль пользователя %s сохранён", profile.user_id)
+            return True
+
+        except Exception as e:
+            logger.error("Ошибка сохранения профиля: %s", e)
+            return False
+
+    async def get_user_profile(self, user_id: int) -> Optional[UserProfile]:
+        try:
+            row = await self._pool.fetchrow(f'SELECT {PROFILE_COLUMNS} FROM users WHERE user_id = $1', user_id)
+            return UserProfile(*row) if row else None
+
+        except Exception as e:
+            logger.error("Ошибка получения профиля: %s", e)
+            return None
+
+    async def user_profile_exists(self, user_id: int) -> bool:
+        try:
+            return await self._pool.fetchval('SELECT 1 FROM users WHERE user_id = $1', user_id) is not None
+
+        except Exception as e:
+            logger.error("Ошибка проверки профиля: %s", e)
+            return False
+
+    async def save_meal(self, user_id: int, description: str, kbju: Kbju) -> Optional[int]:
+        today = _today()
+
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    meal_id = await conn.fetchval(
+                        INSERT_MEAL, user_id, description,
+                        kbju.calories, kbju.proteins, kbju.fats, kbju.carbs, today
+                    )
+                    # Дневная сводка и частые блюда в той же транзакции
+                    await self._apply_summary_delta(conn, user_id, today, kbju, 1)
+                    await self._bump_frequent_meal(conn, user_id, description, kbju)
+            logger.debug("Приём пищи %s сохранён в таблицу meals", meal_id)
+            return meal_id
+
+        except Exception as e:
+            logger.error("Ошибка сохранения приёма пищи: %s", e)
+            return None
+
+    async def update_meal(self, user_id: int, meal_id: int, description: str, kbju: Kbju) -> bool:
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    row = await conn.fetchrow(
+                        f'SELECT {MEAL_COLUMNS}, date, {MEAL_USED_AT} FROM meals WHERE id = $1 AND user_id = $2 FOR UPDATE',
+                        meal_id, user_id
+                    )
+                    if not row:
+                        return False
+                    old, meal_date, used_at = Meal(*row[:6]), row[6], row[7]
+
+                    await conn.execute(
+                        'UPDATE meals SET description = $1, calories = $2, proteins = $3, fats = $4, carbs = $5 '
+                        'WHERE id = $6',
+                        description, kbju.calories, kbju.proteins, kbju.fats, kbju.carbs, meal_id
+                    )
+                    await self._apply_summary_delta(conn, user_id, meal_date, kbju - old, 0)
+                    # В частых блюдах — исправленное описание и КБЖУ, а не ошибочные
+                    await self._unbump_frequent_meal(conn, user_id, old, used_at)
+                    await self._bump_frequent_meal(conn, user_id, description, kbju)
+            logger.debug("Приём пищи %s изменён", meal_id)
+            return True
+
+        except Exception as e:
+            logger.error("Ошибка изменения приёма пищи: %s", e)
+            return False
+
+    async def delete_meal(self, user_id: int, meal_id: int) -> Optional[Meal]:
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    row = await conn.fetchrow(
+                        f'DELETE FROM meals WHERE id = $1 AND user_id = $2 RETURNING {MEAL_COLUMNS}, date, {MEAL_USED_AT}',
+                        meal_id, user_id
+                    )
+                    if not row:
+                        return None
+                    deleted, meal_date, used_at = Meal(*row[:6]), row[6], row[7]
+                    await self._apply_summary_delta(conn, user_id, meal_date, -deleted, -1)
+
+                    await self._unbump_frequent_meal(conn, user_id, deleted, used_at)
+            logger.debug("Приём пищи %s удалён", meal_id)
+            return deleted
+
+        except Exception as e:
+            logger.error("Ошибка удаления приёма пищи: %s", e)
+            return None
+
+    async def _apply_summary_delta(self, conn, user_id: int, date_str: str, delta: Kbju, meals_delta: int):
+        await conn.execute(
+            APPLY_SUMMARY_DELTA, user_id, date_str,
+            delta.calories, delta.proteins, delta.fats, delta.carbs, meals_delta
+        )
+
+    async def _bump_frequent_meal(self, conn, user_id: int, description: str, kbju: Kbju):
+        if kbju.calories > 0:
+            await conn.execute(
+                BUMP_FREQUENT_MEAL, user_id, meal_key(description), description,
+                kbju.calories, kbju.proteins, kbju.fats, kbju.carbs, use_score()
+            )
+
+    async def _unbump_frequent_meal(self, conn, user_id: int, meal: Meal, used_at: float):
+        if meal.calories <= 0:
+            return
+        key = meal_key(meal.description or '')
+        await conn.execute(UNBUMP_FREQUENT_MEAL, user_id, key, use_score(used_at))
+        await conn.execute(
+            'DELETE FROM frequent_meals WHERE user_id = $1 AND meal_key = $2 AND uses <= 0', user_id, key
+        )
+
+    async def get_daily_summary(self, user_id: int, date_str: str = None) -> DailySummary:
+        date_str = date_str or _today()
+
+        try:
+            row = await self._pool.fetchrow(
+                f'SELECT {SUMMARY_COLUMNS} FROM daily_summaries WHERE user_id = $1 AND date = $2',
+                user_id, date_str
+            )
+            if row is None:
+                # Если нет сводки, считаем из meals
+                row = await self._pool.fetchrow(
+                    'SELECT COALESCE(SUM(calories), 0), COALESCE(SUM(proteins), 0), '
+                    'COALESCE(SUM(fats), 0), COALESCE(SUM(carbs), 0), COUNT(*) '
+                    'FROM meals WHERE user_id = $1 AND date = $2',
+                    user_id, date_str
+                )
+            return DailySummary(*row)
+
+        except Exception as e:
+            logger.error("Ошибка получения дневной сводки: %s", e)
+            return DailySummary()
+
+    async def get_meals_for_day(self, user_id: int, date_str: str = None) -> List[Meal]:
+        date_str = date_str or _today()
+        return await self.get_meals_between(user_id, date_str, date_str)
+
+    async def get_meals_between(self, user_id: int, date_from: str, date_to: str) -> List[Meal]:
+        try:
+            rows = await self._pool.fetch(
+                f'SELECT {MEAL_COLUMNS} FROM meals WHERE user_id = $1 AND date BETWEEN $2 AND $3 '
+                'ORDER BY date, created_at, id',
+                user_id, date_from, date_to
+            )
+            return [Meal(*row) for row in rows]
+
+        except Exception as e:
+            logger.error("Ошибка получения приёмов пищи: %s", e)
+            return []
+
+    async def get_frequent_meals(self, user_id: int, limit: int) -> List[FrequentMeal]:
+        try:
+            rows = await self._pool.fetch(
+                f'SELECT {FREQUENT_COLUMNS} FROM frequent_meals WHERE user_id = $1 ORDER BY score DESC LIMIT $2',
+                user_id, limit
+            )
+            return [FrequentMeal(*row) for row in rows]
+
+        except Exception as e:
+            logger.error("Ошибка получения частых блюд: %s", e)
+            return []
+
+    async def get_frequent_meal(self, user_id: int, frequent_id: int) -> Optional[FrequentMeal]:
+        try:
+            row = await self._pool.fetchrow(
+                f'SELECT {FREQUENT_COLUMNS} FROM frequent_meals WHERE id = $1 AND user_id = $2',
+                frequent_id, user_id
+            )
+            return FrequentMeal(*row) if row else None
+
+        except Exception as e:
+            logger.error("Ошибка получения частого блюда: %s", e)
+            return None
+
+    async def get_subscription(self, user_id: int) -> Optional[Dict]:
+        try:
+            row = await self._pool.fetchrow(
+                'SELECT user_id, utc_offset_minutes, reminder_time, summary_time '
+                'FROM subscriptions WHERE user_id = $1',
+                user_id
+            )
+            return _subscription_from_row(row) if row else None
+
+        except Exception as e:
+            logger.error("Ошибка получения подписки: %s", e)
+            return None
+
+    async def save_subscription(self, user_id: int, **fields) -> Optional[Dict]:
+        fields = {key: value for key, value in fields.items() if key in SUBSCRIPTION_FIELDS}
+
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        'INSERT INTO subscriptions (user_id) VALUES ($1) ON CONFLICT DO NOTHING', user_id
+                    )
+                    if fields:
+                        assignments = ', '.join(f"{key} = ${number}" for number, key in enumerate(fields, 2))
+                        await conn.execute(
+                            f"UPDATE subscriptions SET {assignments}, updated_at = now() WHERE user_id = $1",
+                            user_id, *fields.values()
+                        )
+
+        except Exception as e:
+            logger.error("Ошибка сохранения подписки: %s", e)
+            return None
+
+        return await self.get_subscription(user_id)
+
+    async def get_subscriptions(self) -> List[Dict]:
+        rows = await self._pool.fetch('''
+            SELECT user_id, utc_offset_minutes, reminder_time, summary_time
+            FROM subscriptions
+            WHERE reminder_time IS NOT NULL OR summary_time IS NOT NULL
+        ''')
+        return [_subscription_from_row(row) for row in rows]
+
+    async def get_daily_summaries_bulk(self, user_ids: List[int], date_str: str) -> Dict[int, DailySummary]:
+        empty = DailySummary()
+        result = dict.fromkeys(user_ids, empty)
+
+        try:
+            rows = await self._pool.fetch(
+                f'SELECT user_id, {SUMMARY_COLUMNS} FROM daily_summaries '
+                'WHERE date = $1 AND user_id = ANY($2::bigint[])',
+                date_str, user_ids
+            )
+            for user_id, *values in rows:
+                result[user_id] = DailySummary(*values)
+
+        except Exception as e:
+            logger.error("Ошибка получения дневных сводок: %s", e)
+
+        return result
+
+    async def get_user_profiles_bulk(self, user_ids: List[int]) -> Dict[int, UserProfile]:
+        try:
+            rows = await self._pool.fetch(
+                f'SELECT {PROFILE_COLUMNS} FROM users WHERE user_id = ANY($1::bigint[])', user_ids
+            )
+            return {row['user_id']: UserProfile(*row) for row in rows}
+
+        except Exception as e:
+            logger.error("Ошибка получения профилей: %s", e)
+            return {}
+
+    async def get_user_ids_after(self, after_user_id: int, limit: int) -> List[int]:
+        rows = await self._pool.fetch(
+            'SELECT user_id FROM users WHERE user_id > $1 ORDER BY user_id LIMIT $2',
+            after_user_id, limit
+        )
+        return [row[0] for row in rows]
+
+    async def create_broadcast(self, text: str, created_by: int) -> Optional[int]:
+        try:
+            return await self._pool.fetchval(
+                'INSERT INTO broadcasts (text, created_by) VALUES ($1, $2) RETURNING id', text, created_by
+            )
+
+        except Exception as e:
+            logger.error("Ошибка создания рассылки: %s", e)
+            return None
+
+    async def get_broadcast(self, broadcast_id: Optional[int] = None) -> Optional[Dict]:
+        if broadcast_id is None:
+            row = await self._pool.fetchrow(f'SELECT {BROADCAST_COLUMNS} FROM broadcasts ORDER BY id DESC LIMIT 1')
+        else:
+            row = await self._pool.fetchrow(f'SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE id = $1', broadcast_id)
+        return _broadcast_from_row(row) if row else None
+
+    async def get_running_broadcasts(self) -> List[Dict]:
+        rows = await self._pool.fetch(
+            f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY id"
+        )
+        return [_broadcast_from_row(row) for row in rows]
+
+    async def save_broadcast_progress(self, broadcast_id: int, last_user_id: int, delivered: int,
+                                      blocked: int, failed: int, status: str = 'running'):
+        await self._pool.execute('''
+            UPDATE broadcasts
+            SET last_user_id = $1, delivered = $2, blocked = $3, failed = $4, status = $5,
+                updated_at = now()
+            WHERE id = $6
+        ''', last_user_id, delivered, blocked, failed, status, broadcast_id)
+
+    async def save_health_days(self, user_id: int, days: List[HealthDay], active_energy: Optional[int],
+                               weight: Optional[int]) -> bool:
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(SAVE_HEALTH_DAY, [
+                        (user_id, day.date, day.active_energy, day.basal_energy, day.steps, day.body_mass)
+                        for day in days
+                    ])
+                    await conn.execute(
+                        'UPDATE users SET health_active_energy = $1, weight = COALESCE($2, weight) WHERE user_id = $3',
+                        active_energy, weight, user_id
+                    )
+            logger.debug("Данные Apple Health пользователя %s сохранены: %s дней", user_id, len(days))
+            return True
+
+        except Exception as e:
+            logger.error("Ошибка сохранения данных Apple Health: %s", e)
+            return False
+
+    async def save_gpt_usage(self, rows: List[tuple]) -> bool:
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(SAVE_GPT_USAGE, rows)
+            return True
+
+        except Exception as e:
+            logger.error("Ошибка записи расхода GPT: %s", e)
+            return False
+
+    async def get_gpt_spent(self, user_id: int, date_str: str) -> float:
+        try:
+            return await self._pool.fetchval(
+                'SELECT COALESCE(SUM(cost), 0) FROM gpt_usage WHERE user_id = $1 AND date = $2',
+                user_id, date_str
+            )
+
+        except Exception as e:
+            logger.error("Ошибка получения расхода GPT: %s", e)
+            return 0.0
+
+    async def get_gpt_usage_report(self, date_from: str, date_to: str) -> List[Dict]:
+        try:
+            rows = await self._pool.fetch('''
+                SELECT model, SUM(requests)::bigint AS requests, COUNT(DISTINCT user_id) AS users,
+                       SUM(prompt_tokens)::bigint AS prompt_tokens,
+                       SUM(completion_tokens)::bigint AS completion_tokens,
+                       SUM(cost) AS cost, SUM(latency_ms)::bigint AS latency_ms,
+                       MAX(max_latency_ms) AS max_latency_ms
+                FROM gpt_usage
+                WHERE date BETWEEN $1 AND $2
+                GROUP BY model
+                ORDER BY cost DESC
+            ''', date_from, date_to)
+            return [dict(row.items()) for row in rows]
+
+        except Exception as e:
+            logger.error("Ошибка получения отчёта о расходе GPT: %s", e)
+            return []
+
+    async def find_meal_kbju(self, user_id: int, description: str) -> Optional[Kbju]:
+        try:
+            row = await self._pool.fetchrow(
+                'SELECT COALESCE(calories, 0), COALESCE(proteins, 0), COALESCE(fats, 0), COALESCE(carbs, 0) '
+                'FROM frequent_meals WHERE user_id = $1 AND meal_key = $2',
+                user_id, meal_key(description)
+            )
+            return Kbju(*row) if row else None
+
+        except Exception as e:
+            logger.error("Ошибка поиска приёма пищи по описанию: %s", e)
+            return None
+
+    async def calculate_targets_bulk(self, user_ids: Optional[List[int]] = None) -> TargetTable:
+        if user_ids is None:
+            rows = await self._pool.fetch(f'SELECT {TARGET_COLUMNS} FROM users')
+        else:
+            rows = await self._pool.fetch(
+                f'SELECT {TARGET_COLUMNS} FROM users WHERE user_id = ANY($1::bigint[])', user_ids
+            )
+        return target_table([tuple(row) for row in rows])
+
+    async def size_report(self) -> str:
+        database_bytes = await self._pool.fetchval('SELECT pg_database_size(current_database())')
+        rows = await self._pool.fetch('''
+            SELECT relname, n_live_tup, pg_total_relation_size(relid)
+            FROM pg_stat_user_tables ORDER BY relname
+        ''')
+        lines = [f"🐘 PostgreSQL: {database_bytes / 1024 / 1024:.1f} МБ"]
+        lines += [
+            f"  {name}: ~{count} строк, {size / 1024 / 1024:.1f} МБ"
+            for name, count, size in rows
+        ]
+        return '\n'.join(lines)
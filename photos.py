@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.types import PhotoSize
+
+from frequent import meal_key
+from models import Kbju
+from tracing import span
+from usage import UsageLedger
+
+logger = logging.getLogger(__name__)
+
+PHOTO_WORKERS = int(os.getenv('PHOTO_WORKERS', '2'))
+# Длинная сторона после уменьшения; vision-модели в режиме detail=low большего не нужно
+PHOTO_MAX_SIDE = int(os.getenv('PHOTO_MAX_SIDE', '768'))
+PHOTO_JPEG_QUALITY = 80
+# Сколько последних фото помнить и насколько могут отличаться хэши одной картинки
+PHOTO_CACHE_SIZE = int(os.getenv('PHOTO_CACHE_SIZE', '2048'))
+PHOTO_HASH_DISTANCE = int(os.getenv('PHOTO_HASH_DISTANCE', '6'))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Пул процессов поднимается при первом фото"""
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: к этому моменту в процессе уже работают потоки логов, трейсинга и записи
+        # в базу, и их захваченные блокировки скопировались бы в дочерний процесс
+        _pool = ProcessPoolExecutor(max_workers=PHOTO_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def shutdown():
+    """Останавливает пул процессов; вызывается из App.shutdown"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+def prepare_image(data: bytes, max_side: int = PHOTO_MAX_SIDE, quality: int = PHOTO_JPEG_QUALITY) -> Tuple[bytes, int]:
+    """Уменьшает и пережимает фото в JPEG, считает dHash; выполняется в процессе пула"""
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as image:
+        image = image.convert('RGB')
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=quality, optimize=True)
+
+        # dHash: 9x8 в оттенках серого, бит = яркость растёт слева направо
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+
+    phash = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            phash = (phash << 1) | (left > right)
+
+    return output.getvalue(), phash
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class PhotoCache:
+    """LRU недавних фото по перцептивному хэшу: похожая картинка отдаёт прошлую оценку
+
+    Кэш свой у каждого пользователя, а подпись — часть ключа: похожие тарелки
+    разных людей не делят оценку, и повтор фото с поправкой («300 г», «без
+    соуса») идёт в модель. Близкие хэши ищутся не перебором, а по индексу
+    полос: хэш режется на max_distance + 1 полос, и у хэшей на расстоянии
+    не больше max_distance хотя бы одна полоса совпадает целиком.
+    """
+
+    def __init__(self, size: int = PHOTO_CACHE_SIZE, max_distance: int = PHOTO_HASH_DISTANCE):
+        self.size = size
+        self.max_distance = max_distance
+        count = min(max_distance + 1, 64)
+        bounds = [64 * index // count for index in range(count + 1)]
+        # (сдвиг, маска) каждой полосы 64-битного хэша
+        self._bands = [(bounds[index], (1 << (bounds[index + 1] - bounds[index])) - 1) for index in range(count)]
+        self._items: 'OrderedDict[Tuple[int, str, int], Tuple[str, Kbju]]' = OrderedDict()
+        self._index: Dict[Tuple[int, str, int, int], Set[int]] = {}
+
+    def _band_keys(self, user_id: int, caption: str, phash: int):
+        for number, (shift, mask) in enumerate(self._bands):
+            yield user_id, caption, number, (phash >> shift) & mask
+
+    def get(self, user_id: int, caption: str, phash: int) -> Optional[Tuple[str, Kbju]]:
+        caption = meal_key(caption)
+        key = (user_id, caption, phash)
+        if key in self._items:
+            self._items.move_to_end(key)
+            return self._items[key]
+
+        # Пережатое или слегка обрезанное фото даёт близкий, но не равный хэш
+        for band_key in self._band_keys(user_id, caption, phash):
+            for known in self._index.get(band_key, ()):
+                if hamming_distance(known, phash) <= self.max_distance:
+                    known_key = (user_id, caption, known)
+                    self._items.move_to_end(known_key)
+                    return self._items[known_key]
+        return None
+
+    def put(self, user_id: int, caption: str, phash: int, description: str, kbju: Kbju):
+        caption = meal_key(caption)
+        key = (user_id, caption, phash)
+        if key not in self._items:
+            for band_key in self._band_keys(user_id, caption, phash):
+                self._index.setdefault(band_key, set()).add(phash)
+        self._items[key] = (description, kbju)
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            (old_user_id, old_caption, old_phash), _ = self._items.popitem(last=False)
+            for band_key in self._band_keys(old_user_id, old_caption, old_phash):
+                known = self._index[band_key]
+                known.discard(old_phash)
+                if not known:
+                    del self._index[band_key]
+
+photo_cache = PhotoCache()
+
+def largest_photo(sizes: List[PhotoSize]) -> PhotoSize:
+    return max(sizes, key=lambda size: size.width * size.height)
+
+async def analyze_photo(bot: Bot, sizes: List[PhotoSize], ledger: UsageLedger, user_id: int,
+                        caption: str = '') -> Tuple[str, Kbju, bool]:
+    """Скачивает фото, готовит его в пуле процессов и оценивает КБЖУ
+
+    Возвращает (описание, КБЖУ, взято ли из кэша). Подпись к фото
+    участвует и в запросе к модели, и в ключе кэша. Расход модели
+    записывается на пользователя; сверх его бюджета — usage.BudgetExceeded.
+    """
+    photo = largest_photo(sizes)
+
+    with span('photo.download', file_size=photo.file_size):
+        buffer = await bot.download(photo, destination=BytesIO())
+
+    loop = asyncio.get_running_loop()
+    with span('photo.prepare'):
+        jpeg_bytes, phash = await loop.run_in_executor(_get_pool(), prepare_image, buffer.getvalue())
+
+    cached = photo_cache.get(user_id, caption, phash)
+    if cached is not None:
+        logger.debug("Фото %016x найдено в кэше", phash)
+        description, kbju = cached
+        return description, kbju, True
+
+    description, kbju = await ledger.estimate_kbju_from_photo(user_id, jpeg_bytes, caption)
+    if kbju.calories > 0:
+        photo_cache.put(user_id, caption, phash, description, kbju)
+    return description, kbju, False
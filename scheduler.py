@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+import formatting
+from storage import Storage
+from sender import BULK, send_priority_var
+from tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+REMINDER = 'reminder'
+SUMMARY = 'summary'
+KIND_FIELDS = {REMINDER: 'reminder_time', SUMMARY: 'summary_time'}
+
+# Сколько отправок держать в очереди исходящих одновременно; скорость ограничивает сама очередь
+SEND_CHUNK_SIZE = 200
+# Сколько наступивших задач обрабатывать за один проход (одна пачка чтений из БД)
+DUE_BATCH_SIZE = 1000
+
+def parse_time(text: str) -> Optional[Tuple[int, int]]:
+    """'9:00' / '21:30' -> (часы, минуты) или None"""
+    hours, sep, minutes = text.strip().partition(':')
+    if not sep or not hours.isdigit() or not minutes.isdigit():
+        return None
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours, minutes
+
+_UTC_OFFSET_RE = re.compile(r'(?:utc)?\s*([+-]?)(\d{1,2})(?::(\d{2}))?')
+# Минуты, которые встречаются в поясах мира: +5:30 Индия, +5:45 Непал
+UTC_OFFSET_MINUTES = (0, 30, 45)
+# Поясов дальше UTC±14:00 нет
+MAX_UTC_OFFSET_MINUTES = 14 * 60
+
+def parse_utc_offset(text: str) -> Optional[int]:
+    """'+3' / 'UTC-5:30' / '5:45' -> смещение от UTC в минутах или None"""
+    match = _UTC_OFFSET_RE.fullmatch(text.strip().lower())
+    if not match:
+        return None
+    minutes = int(match.group(3) or 0)
+    if minutes not in UTC_OFFSET_MINUTES:
+        return None
+    offset = int(match.group(2)) * 60 + minutes
+    if offset > MAX_UTC_OFFSET_MINUTES:
+        return None
+    return -offset if match.group(1) == '-' else offset
+
+def next_due(now: float, hhmm: str, utc_offset_minutes: int) -> float:
+    """Ближайший момент (UTC timestamp) после now, когда у пользователя местное время hhmm"""
+    hours, minutes = parse_time(hhmm)
+    offset = utc_offset_minutes * 60
+    local_now = now + offset
+    local_midnight = local_now - local_now % 86400
+    due_local = local_midnight + hours * 3600 + minutes * 60
+    if due_local <= local_now:
+        due_local += 86400
+    return due_local - offset
+
+def server_date(timestamp: float) -> str:
+    """Дата, под которой лежат приёмы пищи этого момента: хранилище пишет их по date.today() сервера
+
+    Местное время пользователя решает только, когда отправить напоминание;
+    сводку нужно читать за ту же дату, что покажет /day.
+    """
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+class ReminderScheduler:
+    """Напоминания и вечерние сводки на одной куче, упорядоченной по времени отправки
+
+    Вместо задачи на каждого пользователя — одна корутина, которая спит до
+    ближайшего срока, забирает все наступившие записи пачкой, читает нужные
+    сводки и профили несколькими запросами и отдаёт сообщения в массовую
+    полосу очереди исходящих (sender.py), которая соблюдает лимиты Telegram.
+    """
+
+    def __init__(self, db: Storage, chunk_size: int = SEND_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        # (срок, порядковый номер, user_id, вид, версия)
+        self._heap: List[Tuple[float, int, int, str, int]] = []
+        self._seq = itertools.count()
+        # Актуальная подписка и её версия; записи кучи со старой версией пропускаются
+        self._subscriptions: Dict[int, Dict] = {}
+        self._versions: Dict[int, int] = defaultdict(int)
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def load(self, now: Optional[float] = None):
+        """Строит кучу по всем подпискам из БД"""
+        subscriptions = await self.db.get_subscriptions()
+        now = time.time() if now is None else now
+        self._heap.clear()
+        for subscription in subscriptions:
+            self._subscriptions[subscription['user_id']] = subscription
+            self._schedule(subscription, now)
+        heapq.heapify(self._heap)
+        logger.info("Планировщик загружен", extra={'scheduled': len(self._heap)})
+
+    def update_user(self, subscription: Optional[Dict]):
+        """Подписка изменилась из хендлера: старые записи кучи станут неактуальными"""
+        if not subscription:
+            return
+        user_id = subscription['user_id']
+        self._versions[user_id] += 1
+        self._subscriptions[user_id] = subscription
+        self._schedule(subscription, time.time(), push=True)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _schedule(self, subscription: Dict, now: float, push: bool = False):
+        user_id = subscription['user_id']
+        for kind, field in KIND_FIELDS.items():
+            hhmm = subscription.get(field)
+            if not hhmm:
+                continue
+            entry = (
+                next_due(now, hhmm, subscription['utc_offset_minutes']),
+                next(self._seq), user_id, kind, self._versions[user_id]
+            )
+            if push:
+                heapq.heappush(self._heap, entry)
+            else:
+                self._heap.append(entry)
+
+    def _pop_due(self, now: float) -> List[Tuple[float, int, str]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < DUE_BATCH_SIZE:
+            due_at, _, user_id, kind, version = heapq.heappop(self._heap)
+            if version != self._versions[user_id]:
+                continue
+            due.append((due_at, user_id, kind))
+        return due
+
+    async def run(self, bot: Bot):
+        """Основной цикл; запускается из App.run() рядом с polling"""
+        self._wakeup = asyncio.Event()
+        # Все sendMessage этой задачи идут в массовую полосу и не задерживают ответы пользователям
+        send_priority_var.set(BULK)
+        await self.load()
+
+        while True:
+            timeout = self._heap[0][0] - time.time() if self._heap else 3600
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(timeout, 3600))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = self._pop_due(time.time())
+            if not due:
+                continue
+
+            try:
+                with start_trace('scheduler.batch', due=len(due)):
+                    await self._process(bot, due)
+            except Exception as e:
+                logger.exception("Ошибка обработки пачки планировщика: %s", e)
+
+            # Следующая отправка — через сутки по местному времени
+            now = time.time()
+            for _, user_id, kind in due:
+                subscription = self._subscriptions.get(user_id)
+                if subscription and subscription.get(KIND_FIELDS[kind]):
+                    heapq.heappush(self._heap, (
+                        next_due(now, subscription[KIND_FIELDS[kind]], subscription['utc_offset_minutes']),
+                        next(self._seq), user_id, kind, self._versions[user_id]
+                    ))
+
+    async def _process(self, bot: Bot, due: List[Tuple[float, int, str]]):
+        # Пачка может перейти через полночь сервера: сводки читаются одним запросом на дату
+        by_date: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        for due_at, user_id, kind in due:
+            by_date[server_date(due_at)].append((user_id, kind))
+
+        summary_users = [user_id for _, user_id, kind in due if kind == SUMMARY]
+        targets = await self.db.calculate_targets_bulk(summary_users) if summary_users else None
+
+        outgoing: List[Tuple[int, str]] = []
+        for date_str, items in by_date.items():
+            summaries = await self.db.get_daily_summaries_bulk([user_id for user_id, _ in items], date_str)
+            for user_id, kind in items:
+                summary = summaries[user_id]
+                if kind == REMINDER:
+                    # Напоминаем только тем, кто сегодня ещё ничего не записал
+                    if summary.meals == 0:
+                        outgoing.append((user_id, formatting.REMINDER))
+                    continue
+
+                target = targets.target(user_id)
+                if target and target['calories'] > 0:
+                    outgoing.append((user_id, formatting.render_evening_summary(summary, target)))
+
+        await self._send_batched(bot, outgoing)
+
+    async def _send_batched(self, bot: Bot, outgoing: List[Tuple[int, str]]):
+        """Отправка кусками по chunk_size; темп и RetryAfter — забота очереди исходящих"""
+        delivered = blocked = 0
+        for start in range(0, len(outgoing), self.chunk_size):
+            chunk = outgoing[start:start + self.chunk_size]
+            results = await asyncio.gather(
+                *(bot.send_message(user_id, text) for user_id, text in chunk),
+                return_exceptions=True
+            )
+
+            for (user_id, _), result in zip(chunk, results):
+                if isinstance(result, TelegramForbiddenError):
+                    # Бот заблокирован — отписываем, чтобы не тратить лимит
+                    blocked += 1
+                    self.update_user(await self.db.save_subscription(user_id, reminder_time=None, summary_time=None))
+                elif isinstance(result, Exception):
+                    logger.warning("Не удалось отправить напоминание %s: %s", user_id, result)
+                else:
+                    delivered += 1
+
+        if outgoing:
+            logger.info(
+                "Напоминания отправлены",
+                extra={'outgoing': len(outgoing), 'delivered': delivered, 'blocked': blocked}
+            )
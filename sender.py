@@ -0,0 +1,309 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета: ответы пользователю всегда уходят раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота и около одного в секунду в чат
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '28'))
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', '1'))
+# Сколько сообщений подряд можно отправить в чат без ожидания («Анализирую...» + результат)
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', '2'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+MAX_MESSAGE_LENGTH = 4096
+
+# Приоритет исходящих sendMessage текущего контекста; планировщик и рассылка ставят BULK
+send_priority_var: ContextVar[int] = ContextVar('send_priority', default=INTERACTIVE)
+# Можно ли склеивать sendMessage текущего контекста с соседними; превью /broadcast должно уйти как есть
+send_coalesce_var: ContextVar[bool] = ContextVar('send_coalesce', default=True)
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до свободного токена; 0 — можно отправлять"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class _Job:
+    __slots__ = ('chat_id', 'make_request', 'bot', 'method', 'priority', 'futures', 'parts', 'coalesce',
+                 'context', 'attempts', 'enqueued')
+
+    def __init__(self, chat_id, make_request, bot, method, priority, future, context, coalesce=True):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.futures = [future]
+        # Исходные сообщения склеенного: при BadRequest они отправляются по одному
+        self.parts = [method]
+        self.coalesce = coalesce
+        self.context = context
+        self.attempts = 0
+        self.enqueued = time.monotonic()
+
+class OutboundDispatcher:
+    """Очередь исходящих sendMessage с глобальным и початовым ограничением скорости
+
+    Хендлеры продолжают вызывать message.answer: запрос перехватывает
+    OutboundRequestMiddleware и ставит его сюда. Один цикл выбирает следующий
+    чат — сначала из интерактивной полосы, потом из массовой — и отправляет,
+    когда есть токены в общем ведре и в ведре чата. В один чат одновременно
+    летит не больше одного сообщения, так что порядок ответов сохраняется.
+    Несколько ещё не отправленных текстов в один чат склеиваются в одно
+    сообщение; если Telegram отверг склеенное (BadRequest, например из-за
+    разметки одной из частей), части уходят по одному и ошибку получает только
+    виновная. На RetryAfter очередь ждёт указанное время и повторяет сообщение.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 chat_burst: int = SEND_CHAT_BURST, max_retries: int = SEND_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        # Общее ведро без запаса: в любом секундном окне уходит не больше global_rate + 1
+        self._global = TokenBucket(global_rate, 1.0)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._pending: Dict[int, Deque[_Job]] = {}
+        self._lanes: List[Deque[int]] = [deque(), deque()]
+        self._in_lane: List[Set[int]] = [set(), set()]
+        self._in_flight: Set[int] = set()
+        self._paused_until = 0.0
+        self._pruned_at = time.monotonic()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            'submitted': 0,
+            'sent': 0,
+            'coalesced': 0,
+            'retry_after': 0,
+            'failed': 0,
+            'wait_ms_total': 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # Цикл не должен унаследовать контекст (correlation_id, спан) первого апдейта
+            self._task = contextvars.Context().run(asyncio.get_running_loop().create_task, self._run())
+
+    @property
+    def depth(self) -> int:
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    def stats(self) -> dict:
+        sent = self.metrics['sent'] or 1
+        return {
+            'depth': self.depth,
+            **self.metrics,
+            'avg_wait_ms': round(self.metrics['wait_ms_total'] / sent, 1),
+        }
+
+    async def submit(self, make_request: NextRequestMiddlewareType, bot: Bot, method: SendMessage,
+                     priority: int = INTERACTIVE, coalesce: bool = True) -> Any:
+        """Ставит sendMessage в очередь и ждёт ответ Bot API"""
+        self._ensure_started()
+        chat_id = method.chat_id
+        future = asyncio.get_running_loop().create_future()
+        self.metrics['submitted'] += 1
+
+        pending = self._pending.setdefault(chat_id, deque())
+        if coalesce and pending and self._coalesce(pending[-1], method, priority, future):
+            self.metrics['coalesced'] += 1
+        else:
+            pending.append(_Job(
+                chat_id, make_request, bot, method, priority, future, contextvars.copy_context(), coalesce
+            ))
+        self._enqueue_chat(chat_id, priority)
+        return await future
+
+    def _coalesce(self, job: _Job, method: SendMessage, priority: int, future: asyncio.Future) -> bool:
+        """Дописывает текст к ещё не отправленному сообщению в тот же чат, если это безопасно"""
+        if not job.coalesce:
+            return False
+        if job.method.reply_markup is not None or method.reply_markup is not None:
+            return False
+        text = f"{job.method.text}\n\n{method.text}"
+        if len(text) > MAX_MESSAGE_LENGTH:
+            return False
+        if job.method.model_dump(exclude={'text'}) != method.model_dump(exclude={'text'}):
+            return False
+        job.method = job.method.model_copy(update={'text': text})
+        job.priority = min(job.priority, priority)
+        job.futures.append(future)
+        job.parts.append(method)
+        return True
+
+    def _enqueue_chat(self, chat_id: int, priority: int):
+        if chat_id not in self._in_lane[priority]:
+            self._in_lane[priority].add(chat_id)
+            self._lanes[priority].append(chat_id)
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_chat(self, now: float):
+        """Следующий чат, готовый к отправке, или (None, сколько ждать)"""
+        wait = 60.0
+        for lane, members in zip(self._lanes, self._in_lane):
+            for _ in range(len(lane)):
+                chat_id = lane.popleft()
+                if not self._pending.get(chat_id):
+                    members.discard(chat_id)
+                    continue
+                if chat_id in self._in_flight:
+                    lane.append(chat_id)
+                    continue
+                delay = self._chat_bucket(chat_id).delay(now)
+                if delay > 0:
+                    wait = min(wait, delay)
+                    lane.append(chat_id)
+                    continue
+                members.discard(chat_id)
+                return chat_id, 0.0
+        return None, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._global.delay(now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            chat_id, wait = self._next_chat(now)
+            if chat_id is None:
+                self._prune(now)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.take()
+            self._chat_bucket(chat_id).take()
+            job = self._pending[chat_id].popleft()
+            self._in_flight.add(chat_id)
+            self.metrics['wait_ms_total'] += (now - job.enqueued) * 1000
+            # Отправка идёт в контексте хендлера, поставившего сообщение: логи и спаны на месте
+            job.context.run(asyncio.create_task, self._deliver(job))
+
+    async def _deliver(self, job: _Job):
+        chat_id = job.chat_id
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            self.metrics['retry_after'] += 1
+            # По ответу не понять, какой лимит превышен, поэтому ждём всей очередью:
+            # при исправных ведрах это редкость, а продолжение отправки продлило бы бан
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            job.attempts += 1
+            # После close() повторять некому
+            if job.attempts <= self.max_retries and self._task is not None:
+                logger.warning("Telegram просит подождать %s с перед отправкой в чат %s", e.retry_after, chat_id)
+                self._pending[chat_id].appendleft(job)
+            else:
+                self._fail(job, e)
+        except TelegramBadRequest as e:
+            if len(job.parts) > 1 and self._task is not None:
+                self._split(job)
+            else:
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.metrics['sent'] += 1
+            for future in job.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._in_flight.discard(chat_id)
+            self._release_chat(chat_id)
+
+    def _split(self, job: _Job):
+        """Склеенное сообщение отвергнуто: части встают в начало очереди чата по одной и больше не склеиваются"""
+        logger.warning("Telegram отверг склеенное сообщение в чат %s, отправляем %s частей по одной",
+                       job.chat_id, len(job.parts))
+        pending = self._pending[job.chat_id]
+        for method, future in reversed(list(zip(job.parts, job.futures))):
+            pending.appendleft(_Job(
+                job.chat_id, job.make_request, job.bot, method, job.priority, future, job.context, coalesce=False
+            ))
+
+    def _fail(self, job: _Job, error: Exception):
+        self.metrics['failed'] += 1
+        for future in job.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _release_chat(self, chat_id: int):
+        pending = self._pending.get(chat_id)
+        if pending:
+            self._enqueue_chat(chat_id, min(job.priority for job in pending))
+        else:
+            self._pending.pop(chat_id, None)
+
+    def _prune(self, now: float):
+        """Чат без очереди и с полным ведром ничем не отличается от нового — не держим его в памяти"""
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items()
+                        if chat_id not in self._pending and bucket.is_full(now)]:
+            del self._chat_buckets[chat_id]
+
+    async def close(self):
+        """Останавливает цикл отправки; ждущие в submit получают CancelledError, а не висят до конца процесса"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for jobs in self._pending.values():
+            for job in jobs:
+                for future in job.futures:
+                    future.cancel()
+        self._pending.clear()
+        for lane, members in zip(self._lanes, self._in_lane):
+            lane.clear()
+            members.clear()
+        self._in_flight.clear()
+
+outbound = OutboundDispatcher()
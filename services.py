@@ -1,2 +1,179 @@
 # services.py
-# Здесь будет логика работы с GPT и интеграция с Apple Health 
\ No newline at end of file
+# Логика работы с GPT (импорт Apple Health — в health.py)
+import base64
+import logging
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from models import Kbju
+from tracing import span
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+# Роутер моделей: короткое описание одного блюда уходит в дешёвую и быструю
+# модель, несколько блюд или расплывчатое описание — в более сильную
+GPT_CHEAP_MODEL = os.getenv('GPT_CHEAP_MODEL', "gpt-4o-mini")
+GPT_STRONG_MODEL = os.getenv('GPT_STRONG_MODEL', "gpt-4o")
+GPT_CHEAP_MAX_TOKENS = int(os.getenv('GPT_CHEAP_MAX_TOKENS', '150'))
+GPT_STRONG_MAX_TOKENS = int(os.getenv('GPT_STRONG_MAX_TOKENS', '300'))
+# Сколько слов ещё считается коротким описанием
+GPT_ROUTER_MAX_WORDS = int(os.getenv('GPT_ROUTER_MAX_WORDS', '6'))
+VISION_MODEL = os.getenv('VISION_MODEL', "gpt-4o-mini")
+SYSTEM_PROMPT = "Ты эксперт по питанию. Оценивай КБЖУ продуктов на основе описания пользователя."
+SUMMARY_HINT = "\n\nВключай в ответ саммари:\n🔥 Калории: 0 ккал\n🥩 Белки: 0 г\n🥑 Жиры: 0 г\n🍞 Углеводы: 0 г"
+
+# Разделители блюд в одном сообщении: «гречка, котлета и салат»
+_ITEM_SEPARATORS_RE = re.compile(r'[,;+\n]|\s(?:и|плюс|а также)\s', re.IGNORECASE)
+# Описания, по которым порцию и состав приходится угадывать
+_AMBIGUOUS_RE = re.compile(
+    r'\?|\b(?:или|что-то|какой-то|какая-то|немного|чуть-чуть|примерно|разн\w*|всяк\w*|остатки|как обычно)\b',
+    re.IGNORECASE
+)
+
+_client: Optional['openai.AsyncOpenAI'] = None
+
+class Completion:
+    """Ответ модели вместе с расходом токенов и временем запроса"""
+
+    __slots__ = ('text', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms')
+
+    def __init__(self, text: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                 latency_ms: int = 0):
+        self.text = text
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency_ms = latency_ms
+
+    def __repr__(self) -> str:
+        return (f"Completion(model={self.model!r}, prompt_tokens={self.prompt_tokens}, "
+                f"completion_tokens={self.completion_tokens}, latency_ms={self.latency_ms})")
+
+def parse_kbju_from_gpt(gpt_response: str) -> Kbju:
+    """Извлекает КБЖУ из ответа GPT"""
+    logger.debug("Парсим ответ GPT: %s", gpt_response)
+    
+    # Ищем калории
+    calories_match = re.search(r'калори[йи].*?(\d+(?:-\d+)?)', gpt_response, re.IGNORECASE)
+    if calories_match:
+        calories_str = calories_match.group(1)
+        if '-' in calories_str:
+            # Если диапазон, берем верхнее значение
+            calories = int(calories_str.split('-')[1])
+        else:
+            calories = int(calories_str)
+    else:
+        calories = 0
+    
+    # Ищем белки
+    proteins_match = re.search(r'белк[аи].*?(\d+(?:\.\d+)?)', gpt_response, re.IGNORECASE)
+    proteins = int(float(proteins_match.group(1))) if proteins_match else 0
+    
+    # Ищем жиры
+    fats_match = re.search(r'жир[аи].*?(\d+(?:\.\d+)?)', gpt_response, re.IGNORECASE)
+    fats = int(float(fats_match.group(1))) if fats_match else 0
+    
+    # Ищем углеводы
+    carbs_match = re.search(r'углевод[аи].*?(\d+(?:\.\d+)?)', gpt_response, re.IGNORECASE)
+    carbs = int(float(carbs_match.group(1))) if carbs_match else 0
+    
+    logger.debug(
+        "Извлеченные значения - калории: %s, белки: %s, жиры: %s, углеводы: %s",
+        calories, proteins, fats, carbs
+    )
+    
+    return Kbju(calories, proteins, fats, carbs)
+
+def get_client() -> 'openai.AsyncOpenAI':
+    """Клиент OpenAI создаётся при первом запросе; сам пакет openai тоже импортируется только здесь"""
+    global _client
+    if _client is None:
+        import openai
+        _client = openai.AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _client
+
+async def _complete(messages: list, model: str, max_tokens: int) -> Completion:
+    """Один вызов chat.completions со спаном трейсинга"""
+    started = time.perf_counter()
+    with span('gpt.chat_completion', model=model) as current:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        if current is not None and response.usage is not None:
+            current.set_attribute('gpt.prompt_tokens', response.usage.prompt_tokens)
+            current.set_attribute('gpt.completion_tokens', response.usage.completion_tokens)
+    
+    gpt_response = response.choices[0].message.content
+    logger.debug("Ответ GPT (%s): %s", model, gpt_response)
+    usage = response.usage
+    return Completion(
+        gpt_response,
+        model,
+        usage.prompt_tokens if usage else 0,
+        usage.completion_tokens if usage else 0,
+        round((time.perf_counter() - started) * 1000)
+    )
+
+def route_model(food_description: str) -> Tuple[str, int]:
+    """Модель и max_tokens для описания еды
+
+    Одно блюдо в нескольких словах без «или», «что-то», «примерно» и
+    вопросов оценивает дешёвая модель; перечисление блюд, длинное или
+    расплывчатое описание — сильная, с запасом токенов на разбор по позициям.
+    """
+    items = [item for item in _ITEM_SEPARATORS_RE.split(food_description) if item.strip()]
+    words = len(food_description.split())
+    if len(items) <= 1 and words <= GPT_ROUTER_MAX_WORDS and not _AMBIGUOUS_RE.search(food_description):
+        return GPT_CHEAP_MODEL, GPT_CHEAP_MAX_TOKENS
+    return GPT_STRONG_MODEL, GPT_STRONG_MAX_TOKENS
+
+async def ask_gpt(prompt: str, model: str = GPT_STRONG_MODEL, max_tokens: int = GPT_STRONG_MAX_TOKENS) -> Completion:
+    """Запрос к GPT в роли эксперта по питанию"""
+    return await _complete(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        model,
+        max_tokens
+    )
+
+async def estimate_kbju(food_description: str, with_summary_hint: bool = True) -> Tuple[Kbju, Completion]:
+    """Запрашивает у GPT оценку КБЖУ и парсит ответ; модель выбирает route_model"""
+    prompt = f"Оцени КБЖУ {food_description}"
+    if with_summary_hint:
+        prompt += SUMMARY_HINT
+    
+    completion = await ask_gpt(prompt, *route_model(food_description))
+    return parse_kbju_from_gpt(completion.text), completion
+
+async def estimate_kbju_from_photo(jpeg_bytes: bytes, caption: str = '') -> Tuple[str, Kbju, Completion]:
+    """Оценка КБЖУ по фото через vision-модель, возвращает (описание блюда, КБЖУ, ответ модели)"""
+    prompt = "Что за еда на фото? Первой строкой напиши «Блюдо: <название и примерная порция>», затем оцени КБЖУ."
+    if caption:
+        prompt += f" Подпись пользователя: {caption}"
+    prompt += SUMMARY_HINT
+    
+    image_url = "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode('ascii')
+    completion = await _complete(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image_url, "detail": "low"}}
+            ]}
+        ],
+        VISION_MODEL,
+        300
+    )
+    
+    dish_match = re.search(r'блюдо:\s*(.+)', completion.text, re.IGNORECASE)
+    description = dish_match.group(1).strip() if dish_match else (caption or 'Еда с фото')
+    return description, parse_kbju_from_gpt(completion.text), completion
@@ -0,0 +1,263 @@
+# storage.py
+# Интерфейс хранилища бота и выбор реализации по окружению
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from archive import MealArchive, render_size_report
+from database import DB_WRITE_BEHIND_MS, Database
+from models import DailySummary, FrequentMeal, HealthDay, Kbju, Meal, UserProfile
+from targets import TargetTable, profile_target
+
+logger = logging.getLogger(__name__)
+
+class Storage(ABC):
+    """Асинхронный доступ к данным бота
+
+    Хендлеры, планировщик и рассылки работают только через этот интерфейс.
+    Реализации: SQLiteStorage (файл рядом с ботом, по умолчанию) и
+    pg_storage.PostgresStorage (общая база для нескольких инстансов и
+    эфемерных дисков Heroku). Расчёт таргетов общий и от хранилища не зависит.
+    """
+
+    async def connect(self):
+        """Подключение и проверка схемы; вызывается из App.startup() до polling"""
+
+    async def close(self):
+        """Освобождение соединений при остановке"""
+
+    async def run_maintenance(self):
+        """Фоновое обслуживание хранилища; по умолчанию не требуется"""
+
+    @abstractmethod
+    async def save_user_profile(self, profile: UserProfile) -> bool: ...
+
+    @abstractmethod
+    async def get_user_profile(self, user_id: int) -> Optional[UserProfile]: ...
+
+    @abstractmethod
+    async def user_profile_exists(self, user_id: int) -> bool: ...
+
+    @abstractmethod
+    async def save_meal(self, user_id: int, description: str, kbju: Kbju) -> Optional[int]: ...
+
+    @abstractmethod
+    async def update_meal(self, user_id: int, meal_id: int, description: str, kbju: Kbju) -> bool: ...
+
+    @abstractmethod
+    async def delete_meal(self, user_id: int, meal_id: int) -> Optional[Meal]: ...
+
+    @abstractmethod
+    async def get_daily_summary(self, user_id: int, date_str: str = None) -> DailySummary: ...
+
+    @abstractmethod
+    async def get_meals_for_day(self, user_id: int, date_str: str = None) -> List[Meal]: ...
+
+    @abstractmethod
+    async def get_meals_between(self, user_id: int, date_from: str, date_to: str) -> List[Meal]:
+        """История за период включительно, в том числе за давно прошедшие дни"""
+
+    @abstractmethod
+    async def get_frequent_meals(self, user_id: int, limit: int) -> List[FrequentMeal]:
+        """Частые блюда по рейтингу «часто и недавно»; индекс ведёт save_meal"""
+
+    @abstractmethod
+    async def get_frequent_meal(self, user_id: int, frequent_id: int) -> Optional[FrequentMeal]: ...
+
+    @abstractmethod
+    async def get_subscription(self, user_id: int) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def save_subscription(self, user_id: int, **fields) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def get_subscriptions(self) -> List[Dict]:
+        """Все активные подписки на напоминания"""
+
+    @abstractmethod
+    async def get_daily_summaries_bulk(self, user_ids: List[int], date_str: str) -> Dict[int, DailySummary]: ...
+
+    @abstractmethod
+    async def get_user_profiles_bulk(self, user_ids: List[int]) -> Dict[int, UserProfile]: ...
+
+    @abstractmethod
+    async def get_user_ids_after(self, after_user_id: int, limit: int) -> List[int]: ...
+
+    @abstractmethod
+    async def create_broadcast(self, text: str, created_by: int) -> Optional[int]: ...
+
+    @abstractmethod
+    async def get_broadcast(self, broadcast_id: Optional[int] = None) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def get_running_broadcasts(self) -> List[Dict]: ...
+
+    @abstractmethod
+    async def save_broadcast_progress(self, broadcast_id: int, last_user_id: int, delivered: int,
+                                      blocked: int, failed: int, status: str = 'running'): ...
+
+    @abstractmethod
+    async def save_health_days(self, user_id: int, days: List[HealthDay], active_energy: Optional[int],
+                               weight: Optional[int]) -> bool:
+        """Дни из Apple Health; активная энергия и вес попадают в профиль для расчёта TDEE"""
+
+    @abstractmethod
+    async def save_gpt_usage(self, rows: List[tuple]) -> bool:
+        """Пачка приращений расхода GPT: (user_id, date, model, requests, prompt_tokens,
+        completion_tokens, cost, latency_ms, max_latency_ms)"""
+
+    @abstractmethod
+    async def get_gpt_spent(self, user_id: int, date_str: str) -> float: ...
+
+    @abstractmethod
+    async def get_gpt_usage_report(self, date_from: str, date_to: str) -> List[Dict]:
+        """Расход по моделям: requests, users, токены, cost, latency_ms (сумма) и max_latency_ms"""
+
+    @abstractmethod
+    async def find_meal_kbju(self, user_id: int, description: str) -> Optional[Kbju]:
+        """КБЖУ прошлого приёма пищи с тем же описанием — оценка без GPT"""
+
+    @abstractmethod
+    async def calculate_targets_bulk(self, user_ids: Optional[List[int]] = None) -> TargetTable: ...
+
+    @abstractmethod
+    async def size_report(self) -> str:
+        """Текст для /storage: размер базы и число строк по таблицам"""
+
+    async def calculate_target_calories(self, user_id: int, profile: Optional[UserProfile] = None) -> Dict:
+        """Таргет КБЖУ пользователя; профиль можно передать уже загруженным"""
+        if profile is None:
+            profile = await self.get_user_profile(user_id)
+        return profile_target(profile)
+
+class SQLiteStorage(Storage):
+    """Хранилище на SQLite: синхронный Database в потоках пула по умолчанию
+
+    Database открывает новое соединение на каждый вызов, поэтому вызовы из
+    разных потоков друг другу не мешают, а цикл событий не ждёт диск.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.archive = MealArchive(db)
+
+    async def _call(self, method, *args, **kwargs):
+        return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def connect(self):
+        # Таблицы, индексы и миграции; повторный вызов ничего не меняет
+        await self._call(self.db.init_database)
+
+    async def close(self):
+        # Отложенные приёмы пищи (write-behind) дописываются до выхода
+        await self._call(self.db.close)
+
+    async def run_maintenance(self):
+        await self.archive.run()
+
+    async def save_user_profile(self, profile: UserProfile) -> bool:
+        return await self._call(self.db.save_user_profile, profile)
+
+    async def get_user_profile(self, user_id: int) -> Optional[UserProfile]:
+        return await self._call(self.db.get_user_profile, user_id)
+
+    async def user_profile_exists(self, user_id: int) -> bool:
+        return await self._call(self.db.user_profile_exists, user_id)
+
+    async def save_meal(self, user_id: int, description: str, kbju: Kbju) -> Optional[int]:
+        # В режиме write-behind ждём коммита пачки, не занимая поток пула
+        future = self.db.submit_meal(user_id, description, kbju)
+        if future is not None:
+            return await asyncio.wrap_future(future)
+        return await self._call(self.db.save_meal, user_id, description, kbju)
+
+    async def update_meal(self, user_id: int, meal_id: int, description: str, kbju: Kbju) -> bool:
+        return await self._call(self.db.update_meal, user_id, meal_id, description, kbju)
+
+    async def delete_meal(self, user_id: int, meal_id: int) -> Optional[Meal]:
+        return await self._call(self.db.delete_meal, user_id, meal_id)
+
+    async def get_daily_summary(self, user_id: int, date_str: str = None) -> DailySummary:
+        return await self._call(self.db.get_daily_summary, user_id, date_str)
+
+    async def get_meals_for_day(self, user_id: int, date_str: str = None) -> List[Meal]:
+        return await self._call(self.db.get_meals_for_day, user_id, date_str)
+
+    async def get_meals_between(self, user_id: int, date_from: str, date_to: str) -> List[Meal]:
+        # Старые дни лежат в архиве (archive.MealArchive)
+        return await self._call(self.archive.get_meals_between, user_id, date_from, date_to)
+
+    async def get_frequent_meals(self, user_id: int, limit: int) -> List[FrequentMeal]:
+        return await self._call(self.db.get_frequent_meals, user_id, limit)
+
+    async def get_frequent_meal(self, user_id: int, frequent_id: int) -> Optional[FrequentMeal]:
+        return await self._call(self.db.get_frequent_meal, user_id, frequent_id)
+
+    async def get_subscription(self, user_id: int) -> Optional[Dict]:
+        return await self._call(self.db.get_subscription, user_id)
+
+    async def save_subscription(self, user_id: int, **fields) -> Optional[Dict]:
+        return await self._call(self.db.save_subscription, user_id, **fields)
+
+    async def get_subscriptions(self) -> List[Dict]:
+        return await self._call(lambda: list(self.db.iter_subscriptions()))
+
+    async def get_daily_summaries_bulk(self, user_ids: List[int], date_str: str) -> Dict[int, DailySummary]:
+        return await self._call(self.db.get_daily_summaries_bulk, user_ids, date_str)
+
+    async def get_user_profiles_bulk(self, user_ids: List[int]) -> Dict[int, UserProfile]:
+        return await self._call(self.db.get_user_profiles_bulk, user_ids)
+
+    async def get_user_ids_after(self, after_user_id: int, limit: int) -> List[int]:
+        return await self._call(self.db.get_user_ids_after, after_user_id, limit)
+
+    async def create_broadcast(self, text: str, created_by: int) -> Optional[int]:
+        return await self._call(self.db.create_broadcast, text, created_by)
+
+    async def get_broadcast(self, broadcast_id: Optional[int] = None) -> Optional[Dict]:
+        return await self._call(self.db.get_broadcast, broadcast_id)
+
+    async def get_running_broadcasts(self) -> List[Dict]:
+        return await self._call(self.db.get_running_broadcasts)
+
+    async def save_broadcast_progress(self, broadcast_id: int, last_user_id: int, delivered: int,
+                                      blocked: int, failed: int, status: str = 'running'):
+        await self._call(self.db.save_broadcast_progress, broadcast_id, last_user_id,
+                         delivered, blocked, failed, status)
+
+    async def save_health_days(self, user_id: int, days: List[HealthDay], active_energy: Optional[int],
+                               weight: Optional[int]) -> bool:
+        return await self._call(self.db.save_health_days, user_id, days, active_energy, weight)
+
+    async def save_gpt_usage(self, rows: List[tuple]) -> bool:
+        return await self._call(self.db.save_gpt_usage, rows)
+
+    async def get_gpt_spent(self, user_id: int, date_str: str) -> float:
+        return await self._call(self.db.get_gpt_spent, user_id, date_str)
+
+    async def get_gpt_usage_report(self, date_from: str, date_to: str) -> List[Dict]:
+        return await self._call(self.db.get_gpt_usage_report, date_from, date_to)
+
+    async def find_meal_kbju(self, user_id: int, description: str) -> Optional[Kbju]:
+        return await self._call(self.db.find_meal_kbju, user_id, description)
+
+    async def calculate_targets_bulk(self, user_ids: Optional[List[int]] = None) -> TargetTable:
+        return await self._call(self.db.calculate_targets_bulk, user_ids)
+
+    async def size_report(self) -> str:
+        return render_size_report(await self._call(self.archive.size_report))
+
+def create_storage() -> Storage:
+    """Хранилище по окружению: DATABASE_URL — PostgreSQL, иначе SQLite в DB_PATH"""
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        # asyncpg нужен только этой реализации
+        from pg_storage import PostgresStorage
+        logger.info("Хранилище: PostgreSQL")
+        return PostgresStorage(database_url)
+
+    db_path = os.getenv('DB_PATH', 'nutrition_bot.db')
+    logger.info("Хранилище: SQLite %s", db_path, extra={'write_behind_ms': DB_WRITE_BEHIND_MS})
+    return SQLiteStorage(Database(db_path, write_behind_ms=DB_WRITE_BEHIND_MS, init=False))
@@ -0,0 +1,222 @@
+# targets.py
+# Пакетный расчёт BMR, TDEE и таргетов КБЖУ для многих пользователей сразу на NumPy
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from goals import (
+    ACTIVITY_MULTIPLIERS, DEFAULT_ACTIVITY_MULTIPLIER, GOAL_PARAMS, GoalCategory, activity_multiplier, classify_goal,
+    explicit_macros
+)
+from models import UserProfile
+
+# Колонки users для target_table, общие для всех хранилищ
+TARGET_COLUMNS = (
+    'user_id, gender, COALESCE(age, 0), COALESCE(height, 0), COALESCE(weight, 0), '
+    'activity, goal_category, COALESCE(target_calories, 0), COALESCE(health_active_energy, 0), goal'
+)
+
+# Коэффициенты целей столбцами, индекс — значение GoalCategory
+_CALORIE_FACTORS = np.array([GOAL_PARAMS[category][0] for category in GoalCategory])
+_PROTEIN_PER_KG = np.array([GOAL_PARAMS[category][1] for category in GoalCategory])
+_FAT_PER_KG = np.array([GOAL_PARAMS[category][2] for category in GoalCategory])
+_EXPLICIT_PROTEIN_PER_KG = np.array([explicit_macros(category)[0] for category in GoalCategory])
+_EXPLICIT_FAT_PER_KG = np.array([explicit_macros(category)[1] for category in GoalCategory])
+
+def _lookup(values: Sequence[Optional[str]], mapping: Dict[str, float], default: float,
+            fallback: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Строковая колонка -> (числа, нормализованные строки); словарь применяется к уникальным значениям"""
+    labels = np.array([(value or fallback).lower() for value in values], dtype=object)
+    if not len(labels):
+        return np.zeros(0), labels
+    unique, inverse = np.unique(labels, return_inverse=True)
+    return np.array([mapping.get(label, default) for label in unique])[inverse], labels
+
+def profile_bmr(profile: Optional[UserProfile]) -> int:
+    """Базовый обмен веществ (BMR) по формуле Миффлина-Сан Жеора"""
+    if not profile:
+        return 0
+    
+    gender = (profile.gender or '').lower()
+    age = profile.age or 0
+    height = profile.height or 0
+    weight = profile.weight or 0
+    
+    if gender == 'мужской':
+        bmr = 10 * weight + 6.25 * height - 5 * age + 5
+    else:
+        bmr = 10 * weight + 6.25 * height - 5 * age - 161
+    
+    return int(bmr)
+
+def profile_target(profile: Optional[UserProfile]) -> Dict:
+    """Целевые калории и макросы по профилю с учётом цели пользователя и пояснением"""
+    bmr = profile_bmr(profile)
+    if bmr == 0:
+        return {'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0, 'explanation': 'Нет профиля'}
+    
+    activity = (profile.activity or 'Средний').lower()
+    weight = profile.weight or 0
+    
+    multiplier = activity_multiplier(profile.activity)
+    if profile.active_energy:
+        # Есть данные Apple Health: вместо коэффициента — реально сожжённая активная энергия
+        tdee = bmr + profile.active_energy
+        tdee_explanation = f"TDEE по данным Apple Health: BMR {bmr} + активная энергия {profile.active_energy} ккал/день"
+    else:
+        tdee = bmr * multiplier
+        tdee_explanation = f"TDEE рассчитан с коэффициентом активности '{activity}': {multiplier}"
+    category = profile.goal_category
+    if category is None:
+        # Профиль ещё не сохранён — категорию считаем на лету
+        category = classify_goal(profile.goal)
+    calorie_factor, protein_per_kg, fat_per_kg, goal_explanation = GOAL_PARAMS[category]
+    if profile.target_calories:
+        protein_per_kg, fat_per_kg = explicit_macros(category)
+    
+    target_proteins = int(weight * protein_per_kg)
+    target_fats = int(weight * fat_per_kg)
+    
+    if profile.target_calories:
+        # Калории задал пользователь; белок и жиры по его цели, углеводы — остаток
+        target_calories = profile.target_calories
+        target_carbs = max(0, int((target_calories - target_proteins * 4 - target_fats * 9) / 4))
+        explanation = [f"Целевые калории установлены пользователем: {target_calories} ккал"]
+    else:
+        target_calories = int(tdee * calorie_factor)
+        target_carbs = int((target_calories - target_proteins * 4 - target_fats * 9) / 4)
+        explanation = [tdee_explanation, goal_explanation]
+    
+    return {
+        'calories': target_calories,
+        'proteins': target_proteins,
+        'fats': target_fats,
+        'carbs': target_carbs,
+        'bmr': bmr,
+        'tdee': int(tdee),
+        'explanation': '; '.join(explanation)
+    }
+
+def target_table(rows: Sequence[Sequence]) -> 'TargetTable':
+    """TargetTable из строк SELECT {TARGET_COLUMNS}; категорию без goal_category считаем по тексту цели"""
+    if not rows:
+        return TargetTable([], [], [], [], [], [], [], [], [])
+    
+    user_ids, genders, ages, heights, weights, activities, categories, explicit, active, goals = zip(*rows)
+    categories = [
+        category if category is not None else int(classify_goal(goal))
+        for category, goal in zip(categories, goals)
+    ]
+    return TargetTable(user_ids, genders, ages, heights, weights, activities, categories, explicit, active)
+
+class TargetTable:
+    """Таргеты КБЖУ для набора пользователей; все поля — массивы одинаковой длины"""
+
+    __slots__ = ('user_ids', 'goal_categories', 'explicit', 'activities', 'activity_multipliers',
+                 'active_energy', 'bmr', 'tdee', 'calories', 'proteins', 'fats', 'carbs', '_index')
+
+    def __init__(self, user_ids: Sequence[int], genders: Sequence[Optional[str]], ages: Sequence[int],
+                 heights: Sequence[int], weights: Sequence[int], activities: Sequence[Optional[str]],
+                 goal_categories: Sequence[int], target_calories: Optional[Sequence[int]] = None,
+                 active_energy: Optional[Sequence[int]] = None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.goal_categories = np.asarray(goal_categories, dtype=np.int8)
+        self.activity_multipliers, self.activities = _lookup(
+            activities, ACTIVITY_MULTIPLIERS, DEFAULT_ACTIVITY_MULTIPLIER, 'Средний'
+        )
+
+        is_male = np.array([(gender or '').lower() == 'мужской' for gender in genders], dtype=bool)
+        weight = np.asarray(weights, dtype=np.float64)
+        height = np.asarray(heights, dtype=np.float64)
+        age = np.asarray(ages, dtype=np.float64)
+
+        # Миффлин-Сан Жеор; те же операции в том же порядке, что и в profile_bmr
+        base = 10 * weight + 6.25 * height - 5 * age
+        self.bmr = np.trunc(np.where(is_male, base + 5, base - 161)).astype(np.int64)
+        # Активная энергия из Apple Health (0 — нет данных) заменяет коэффициент активности
+        self.active_energy = np.zeros(len(self.user_ids), dtype=np.int64) if active_energy is None \
+            else np.asarray(active_energy, dtype=np.int64)
+        tdee = np.where(
+            self.active_energy > 0, self.bmr + self.active_energy, self.bmr * self.activity_multipliers
+        )
+        self.tdee = np.trunc(tdee).astype(np.int64)
+
+        # Калории, заданные пользователем (0 — не заданы), заменяют расчёт по TDEE
+        explicit = np.zeros(len(self.user_ids), dtype=np.int64) if target_calories is None \
+            else np.asarray(target_calories, dtype=np.int64)
+        self.explicit = explicit > 0
+
+        self.calories = np.where(
+            self.explicit, explicit, np.trunc(tdee * _CALORIE_FACTORS[self.goal_categories])
+        ).astype(np.int64)
+        protein_per_kg = np.where(
+            self.explicit, _EXPLICIT_PROTEIN_PER_KG[self.goal_categories], _PROTEIN_PER_KG[self.goal_categories]
+        )
+        fat_per_kg = np.where(self.explicit, _EXPLICIT_FAT_PER_KG[self.goal_categories], _FAT_PER_KG[self.goal_categories])
+        self.proteins = np.trunc(weight * protein_per_kg).astype(np.int64)
+        self.fats = np.trunc(weight * fat_per_kg).astype(np.int64)
+        self.carbs = np.trunc((self.calories - self.proteins * 4 - self.fats * 9) / 4).astype(np.int64)
+        self.carbs[self.explicit & (self.carbs < 0)] = 0
+
+        # Как и в расчёте по одному пользователю: без осмысленного BMR таргета нет
+        missing = self.bmr == 0
+        for column in (self.calories, self.proteins, self.fats, self.carbs):
+            column[missing] = 0
+        self._index: Optional[Dict[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def target(self, user_id: int) -> Optional[Dict]:
+        """Таргет одного пользователя в том же виде, что и profile_target"""
+        if self._index is None:
+            self._index = {user_id: position for position, user_id in enumerate(self.user_ids.tolist())}
+        position = self._index.get(user_id)
+        if position is None:
+            return None
+        if self.bmr[position] == 0:
+            return {'calories': 0, 'proteins': 0, 'fats': 0, 'carbs': 0, 'explanation': 'Нет профиля'}
+
+        if self.explicit[position]:
+            explanation = [f"Целевые калории установлены пользователем: {int(self.calories[position])} ккал"]
+        else:
+            category = GoalCategory(int(self.goal_categories[position]))
+            active = int(self.active_energy[position])
+            if active:
+                tdee_explanation = (
+                    f"TDEE по данным Apple Health: BMR {int(self.bmr[position])} + активная энергия {active} ккал/день"
+                )
+            else:
+                tdee_explanation = (
+                    f"TDEE рассчитан с коэффициентом активности '{self.activities[position]}': "
+                    f"{float(self.activity_multipliers[position])}"
+                )
+            explanation = [tdee_explanation, GOAL_PARAMS[category][3]]
+        return {
+            'calories': int(self.calories[position]),
+            'proteins': int(self.proteins[position]),
+            'fats': int(self.fats[position]),
+            'carbs': int(self.carbs[position]),
+            'bmr': int(self.bmr[position]),
+            'tdee': int(self.tdee[position]),
+            'explanation': '; '.join(explanation)
+        }
+
+    def by_goal(self) -> List[Dict]:
+        """Сводка по категориям целей: число пользователей и средние таргеты"""
+        counts = np.bincount(self.goal_categories, minlength=len(GoalCategory))
+        report = []
+        for category in GoalCategory:
+            count = int(counts[category])
+            if not count:
+                continue
+            mask = self.goal_categories == category
+            report.append({
+                'goal': category.name.lower(),
+                'users': count,
+                'calories': round(float(self.calories[mask].mean())),
+                'proteins': round(float(self.proteins[mask].mean())),
+                'fats': round(float(self.fats[mask].mean())),
+                'carbs': round(float(self.carbs[mask].mean())),
+            })
+        return report
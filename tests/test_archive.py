@@ -0,0 +1,98 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from archive import MealArchive
+from database import Database
+from models import Kbju
+
+TODAY = date(2024, 6, 15)
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'bot.db'))
+
+def add_meals(db: Database, meals):
+    """Приёмы пищи за прошлые даты: (user_id, описание, КБЖУ, дата)"""
+    conn = db._connect()
+    try:
+        return db._write_meals(conn, meals)
+    finally:
+        conn.close()
+
+def days_ago(days: int) -> str:
+    return (TODAY - timedelta(days=days)).isoformat()
+
+def test_meals_have_user_date_index(db):
+    with sqlite3.connect(db.db_path) as conn:
+        plan = ' '.join(row[3] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM meals WHERE user_id = 1 AND date = '2024-06-15'"
+        ))
+    assert 'meals_user_date' in plan
+
+def test_archive_moves_old_meals_and_keeps_summaries(db):
+    archive = MealArchive(db, retention_days=30)
+    add_meals(db, [
+        (1, "Март", Kbju(100, 1, 1, 1), '2024-03-05'),
+        (1, "Апрель", Kbju(200, 2, 2, 2), '2024-04-20'),
+        (1, "Май, старый", Kbju(300, 3, 3, 3), days_ago(40)),
+        (1, "Май, свежий", Kbju(400, 4, 4, 4), days_ago(10)),
+        (2, "Апрель, другой", Kbju(500, 5, 5, 5), '2024-04-20'),
+    ])
+    with sqlite3.connect(db.db_path) as conn:
+        summaries_before = conn.execute('SELECT * FROM daily_summaries ORDER BY user_id, date').fetchall()
+
+    assert archive.archive(TODAY) == {'2024-03': 1, '2024-04': 2, '2024-05': 1}
+    # Повторный проход ничего не переносит и не дублирует
+    assert archive.archive(TODAY) == {}
+
+    with sqlite3.connect(db.db_path) as conn:
+        assert [row[0] for row in conn.execute('SELECT description FROM meals')] == ["Май, свежий"]
+        assert conn.execute('SELECT * FROM daily_summaries ORDER BY user_id, date').fetchall() == summaries_before
+    with sqlite3.connect(archive.archive_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM meals_2024_04').fetchone()[0] == 2
+
+    report = archive.size_report()
+    assert report['main']['rows'] == {'meals': 1, 'daily_summaries': 5}
+    assert report['archive']['rows'] == {'2024-03': 1, '2024-04': 2, '2024-05': 1}
+
+def test_history_spans_live_and_archived_months(db, monkeypatch):
+    archive = MealArchive(db, retention_days=30)
+    monkeypatch.setattr(archive, 'cutoff', lambda today=None: MealArchive.cutoff(archive, today or TODAY))
+    dates = [days_ago(days) for days in range(100, -1, -3)]
+    ids = add_meals(db, [(1, f"еда {day}", Kbju(100), day) for day in dates])
+    add_meals(db, [(2, "чужая", Kbju(100), day) for day in dates])
+    archive.archive(TODAY)
+
+    meals = archive.get_meals_between(1, days_ago(80), days_ago(5))
+    expected = [meal_id for meal_id, day in zip(ids, dates) if days_ago(80) <= day <= days_ago(5)]
+    assert [meal.id for meal in meals] == expected
+    assert all(meal.description.startswith("еда") for meal in meals)
+
+    # Период целиком в рабочей таблице и целиком в одном архивном месяце
+    assert len(archive.get_meals_between(1, days_ago(20), TODAY.isoformat())) == \
+        len([day for day in dates if day >= days_ago(20)])
+    assert [meal.description for meal in archive.get_meals_between(1, '2024-04-01', '2024-04-30')] == \
+        [f"еда {day}" for day in dates if day.startswith('2024-04')]
+
+def test_incremental_vacuum_frees_pages(db):
+    archive = MealArchive(db, retention_days=30)
+    add_meals(db, [(1, "x" * 500, Kbju(100), days_ago(60)) for _ in range(2000)])
+    archive.archive(TODAY)
+
+    with sqlite3.connect(db.db_path) as conn:
+        pages_before = conn.execute('PRAGMA page_count').fetchone()[0]
+    archive.incremental_vacuum()
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+        pages_after = conn.execute('PRAGMA page_count').fetchone()[0]
+    assert pages_after < pages_before
+
+    # Дальше — порциями: новые свободные страницы возвращаются без полного VACUUM
+    add_meals(db, [(1, "y" * 500, Kbju(100), days_ago(60)) for _ in range(1000)])
+    archive.archive(TODAY)
+    freed = archive.incremental_vacuum(pages=10)
+    assert freed == 10
+    assert archive.incremental_vacuum() > 0
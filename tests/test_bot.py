@@ -0,0 +1,30 @@
+# Точка входа: настройки из .env должны дойти до модулей, которые читают их при импорте
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = '''
+import bot
+# Без токенов create_app падает с ConfigError, и main выходит до запуска бота
+try:
+    bot.main()
+except SystemExit:
+    pass
+import broadcast, log_config, usage
+# Логи пишет фоновый поток в тот же stdout: дописываем их до своей строки
+log_config.shutdown_logging()
+print('RESULT', sorted(broadcast.ADMIN_IDS), usage.GPT_DAILY_BUDGET_USD)
+'''
+
+def test_dotenv_is_loaded_before_settings_are_read(tmp_path):
+    (tmp_path / '.env').write_text('ADMIN_IDS=5,7\nGPT_DAILY_BUDGET_USD=0.2\n')
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('ADMIN_IDS', 'GPT_DAILY_BUDGET_USD', 'TELEGRAM_BOT_TOKEN', 'OPENAI_API_KEY')}
+    env['PYTHONPATH'] = ROOT
+    result = subprocess.run(
+        [sys.executable, '-c', CHECK], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert 'RESULT [5, 7] 0.2' in result.stdout.splitlines()
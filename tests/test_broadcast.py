@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import CommandObject
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message, User
+
+import broadcast
+import handlers
+from benchmarks.fakes import FakeBotSession
+from broadcast import Broadcaster
+from database import Database
+from models import UserProfile
+from storage import SQLiteStorage
+
+ADMIN_ID = 42
+
+class HtmlCheckingSession(FakeBotSession):
+    """Фейковый Bot API, который, как Telegram, отвергает HTML с неэкранированным «<»"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, SendMessage):
+            # parse_mode=None — явный отказ от разметки, иначе действует HTML по умолчанию у бота
+            if method.parse_mode is not None and '< ' in method.text:
+                raise TelegramBadRequest(method, "Bad Request: can't parse entities")
+            self.sent.append(method)
+        return await super().make_request(bot, method, timeout)
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(Database(str(tmp_path / 'bot.db')))
+
+def make_bot(session) -> Bot:
+    return Bot(token='123456:broadcast-test', session=session,
+               default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+def test_broadcast_delivers_and_reports(storage):
+    async def scenario():
+        for user_id in range(1, 6):
+            await storage.save_user_profile(UserProfile(user_id))
+        session = HtmlCheckingSession()
+        broadcast_id = await storage.create_broadcast("Привет", ADMIN_ID)
+        await Broadcaster(storage, page_size=2).start(make_bot(session), await storage.get_broadcast(broadcast_id))
+        return session, await storage.get_broadcast(broadcast_id)
+
+    session, result = asyncio.run(scenario())
+    assert (result['status'], result['delivered'], result['last_user_id']) == ('done', 5, 5)
+    assert session.sent[-1].chat_id == ADMIN_ID
+
+def test_failed_broadcast_is_not_left_running(storage, monkeypatch):
+    async def broken_page(after_user_id, limit):
+        if after_user_id:
+            raise RuntimeError("база недоступна")
+        return [1, 2]
+
+    async def scenario():
+        for user_id in range(1, 6):
+            await storage.save_user_profile(UserProfile(user_id))
+        broadcaster = Broadcaster(storage, page_size=2)
+        broadcast_id = await storage.create_broadcast("Привет", ADMIN_ID)
+        monkeypatch.setattr(storage, 'get_user_ids_after', broken_page)
+        await broadcaster.start(make_bot(HtmlCheckingSession()), await storage.get_broadcast(broadcast_id))
+        return broadcaster, await storage.get_broadcast(broadcast_id), await storage.get_running_broadcasts()
+
+    broadcaster, result, running = asyncio.run(scenario())
+    assert (result['status'], result['delivered'], result['last_user_id']) == ('failed', 2, 2)
+    assert running == []
+    assert not broadcaster.is_running()
+    assert 'прервана' in broadcast.render_report(result)
+
+@pytest.mark.parametrize('text, started', [("Скидка <b>50%</b>", True), ("если a < b", False)])
+def test_broadcast_text_is_checked_before_start(storage, monkeypatch, text, started):
+    monkeypatch.setattr(broadcast, 'ADMIN_IDS', {ADMIN_ID})
+
+    async def scenario():
+        session = HtmlCheckingSession()
+        bot = make_bot(session)
+        message = Message(
+            message_id=1, date=datetime.now(), text=f"/broadcast {text}",
+            chat=Chat(id=ADMIN_ID, type='private'), from_user=User(id=ADMIN_ID, is_bot=False, first_name='admin'),
+        ).as_(bot)
+        broadcaster = Broadcaster(storage)
+        await handlers.start_broadcast(message, CommandObject(command='broadcast', args=text), storage, broadcaster)
+        await asyncio.gather(*broadcaster._tasks.values())
+        return session, await storage.get_broadcast()
+
+    session, created = asyncio.run(scenario())
+    assert (created is not None) == started
+    if started:
+        assert session.sent[0].text == text
+    else:
+        assert [method.text for method in session.sent] == \
+            ["Telegram не принял текст рассылки, она не запущена: Bad Request: can't parse entities"]
@@ -0,0 +1,69 @@
+import pytest
+
+import formatting
+from formatting import Template
+from models import DailySummary, Kbju, Meal, UserProfile
+
+PROFILE = UserProfile(1, 'женщина', 30, 165, 60, 'Умеренная', 'Сбросить 5 кг <к лету> & держать')
+TARGET = {'bmr': 1350, 'tdee': 2090, 'calories': 1670, 'proteins': 120, 'fats': 55, 'carbs': 173,
+          'explanation': 'Дефицит 20%'}
+SUMMARY = DailySummary(1250, 80, 40, 140, meals=3)
+
+RENDERED = {
+    'render_target': lambda: formatting.render_target(TARGET),
+    'render_profile_confirmation': lambda: formatting.render_profile_confirmation(PROFILE, TARGET),
+    'render_goal_updated': lambda: formatting.render_goal_updated(PROFILE.goal, TARGET),
+    'render_meal': lambda: formatting.render_meal('Паста <b>карбонара</b> & салат', Kbju(650, 25, 30, 70)),
+    'render_meal_result': lambda: formatting.render_meal_result(
+        formatting.ANALYZING, 'Гречка', Kbju(300, 10, 5, 55), SUMMARY, 1670
+    ),
+    'render_day_summary': lambda: formatting.render_day_summary(SUMMARY, TARGET),
+    'render_evening_summary': lambda: formatting.render_evening_summary(DailySummary(), TARGET),
+    'render_utc_offset': lambda: formatting.render_utc_offset(-570),
+    'render_target_details': lambda: formatting.render_target_details(PROFILE, TARGET),
+    'render_meals': lambda: formatting.render_meals(
+        [Meal(7, 'Омлет', 250, 18, 19, 2), Meal(8, 'Чай <с сахаром>', 40, 0, 0, 10)]
+    ),
+    'render_frequent_button': lambda: formatting.render_frequent_button(
+        'Очень длинное название блюда из столовой <№1>', 420
+    ),
+}
+
+# Тексты, которые собирал bot.py до переноса шаблонов в profile_copy.txt
+BASELINE = {
+    'render_target': '🎯 Рассчитанные целевые показатели:\n\n📊 Базовый обмен веществ (BMR): 1350 ккал\n🔥 Общий расход энергии (TDEE): 2090 ккал\n🎯 Целевые калории: 1670 ккал\n\n💪 Белки: 120 г\n🥑 Жиры: 55 г\n🍞 Углеводы: 173 г\n\nℹ️ Дефицит 20%',
+    'render_profile_confirmation': '📋 Твой профиль:\n\n👤 Пол: женщина\n📅 Возраст: 30 лет\n📏 Рост: 165 см\n⚖️ Вес: 60 кг\n🏃\u200d♀️ Активность: Умеренная\n🎯 Цель: Сбросить 5 кг &lt;к лету&gt; &amp; держать\n\n🎯 Рассчитанные целевые показатели:\n\n📊 Базовый обмен веществ (BMR): 1350 ккал\n🔥 Общий расход энергии (TDEE): 2090 ккал\n🎯 Целевые калории: 1670 ккал\n\n💪 Белки: 120 г\n🥑 Жиры: 55 г\n🍞 Углеводы: 173 г\n\nℹ️ Дефицит 20%\n\nВсё верно? Можно подтвердить или изменить.',
+    'render_goal_updated': 'Цель обновлена: Сбросить 5 кг &lt;к лету&gt; &amp; держать\n🎯 Рассчитанные целевые показатели:\n\n📊 Базовый обмен веществ (BMR): 1350 ккал\n🔥 Общий расход энергии (TDEE): 2090 ккал\n🎯 Целевые калории: 1670 ккал\n\n💪 Белки: 120 г\n🥑 Жиры: 55 г\n🍞 Углеводы: 173 г\n\nℹ️ Дефицит 20%\n\nВсё ок? Можешь подтвердить или подправить.',
+    'render_meal': 'Для Паста &lt;b&gt;карбонара&lt;/b&gt; &amp; салат:\n🔥 Калории: 650 ккал\n🥩 Белки: 25 г\n🥑 Жиры: 30 г\n🍞 Углеводы: 70 г',
+    'render_meal_result': '🍽 Анализирую твою еду... ⏳\n\nДля Гречка:\n🔥 Калории: 300 ккал\n🥩 Белки: 10 г\n🥑 Жиры: 5 г\n🍞 Углеводы: 55 г\n\n📊 Итого за день (3 приёмов пищи):\n🔥 Калории: 1250 ккал\n🥩 Белки: 80 г\n🥑 Жиры: 40 г\n🍞 Углеводы: 140 г\n\n🎯 Прогресс к цели: 74.9%',
+    'render_day_summary': '📊 Дневная сводка (3 приёмов пищи):\n\n🔥 Калории: 1250 / 1670 ккал (74.9%)\n🥩 Белки: 80 / 120 г (66.7%)\n🥑 Жиры: 40 / 55 г (72.7%)\n🍞 Углеводы: 140 / 173 г (80.9%)\n\n💡 Отличная работа! Ты на правильном пути к своей цели.',
+    'render_evening_summary': '🌙 Итоги дня\n\n📊 Дневная сводка (0 приёмов пищи):\n\n🔥 Калории: 0 / 1670 ккал (0.0%)\n🥩 Белки: 0 / 120 г (0.0%)\n🥑 Жиры: 0 / 55 г (0.0%)\n🍞 Углеводы: 0 / 173 г (0.0%)\n\nСегодня ты ещё ничего не ел(а). Добавь еду!',
+    'render_utc_offset': '🕒 Часовой пояс: UTC-9:30',
+    'render_target_details': '🎯 Целевые калории для женщина:\n\n📊 Базовый обмен веществ (BMR): 1350 ккал\n🔥 Общий расход энергии (TDEE): 2090 ккал\n🎯 Целевые калории: 1670 ккал\n\n🥩 Белки: 120 г\n🥑 Жиры: 55 г\n🍞 Углеводы: 173 г\n\n💡 Цель: Сбросить 5 кг &lt;к лету&gt; &amp; держать\n🏃 Активность: Умеренная\n\nℹ️ Дефицит 20%',
+    'render_meals': '🍽 Приёмы пищи за сегодня (2):\n\n1. Омлет\n   🔥 250 ккал | 🥩 18г | 🥑 19г | 🍞 2г\n\n2. Чай &lt;с сахаром&gt;\n   🔥 40 ккал | 🥩 0г | 🥑 0г | 🍞 10г',
+    'render_frequent_button': 'Очень длинное название блюда из… · 420 ккал',
+}
+
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_render_matches_baseline(name):
+    assert RENDERED[name]() == BASELINE[name]
+
+def test_every_render_function_is_covered():
+    assert {name for name in dir(formatting) if name.startswith('render_')} == set(BASELINE)
+
+@pytest.mark.parametrize('text', ['<b>жир</b>', 'A & B', '<script>', 'a < b > c'])
+def test_user_fields_are_escaped(text):
+    escaped = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    assert f"Для {escaped}:" in formatting.render_meal(text, Kbju())
+    assert f"Цель: {escaped}" in formatting.render_target_details(UserProfile(1, goal=text), TARGET)
+    assert f"1. {escaped}\n" in formatting.render_meals([Meal(1, text)])
+    assert formatting.VOICE_RECOGNIZED.render(text).count(escaped) == 1
+
+def test_template_text_is_not_code():
+    template = Template("{x} 100% '[a]' \"\"\" {{[b]}} %s \\n", ('a', 'b'), escaped=('b',))
+    assert template.render('%d', '<i>') == "{x} 100% '%d' \"\"\" {{&lt;i&gt;}} %s \\n"
+    assert template.render((1, 2), None) == "{x} 100% '(1, 2)' \"\"\" {{None}} %s \\n"
+
+def test_template_checks_field_count():
+    with pytest.raises(ValueError):
+        Template("[a] и [b]", ('a',))
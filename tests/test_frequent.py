@@ -0,0 +1,34 @@
+import math
+from datetime import datetime
+
+import pytest
+
+from frequent import index_rows, logaddexp, logsubexp, meal_key, use_score
+
+def test_meal_key_ignores_case_and_spaces():
+    assert meal_key('  Гречка \n с  КУРИЦЕЙ ') == 'гречка с курицей'
+
+@pytest.mark.parametrize('a, b', [(0.0, 0.0), (50.0, 49.5), (50.0, 10.0), (49.5, 50.0), (1e3, 1e3 - 1e-3)])
+def test_logsubexp_undoes_logaddexp(a, b):
+    assert logaddexp(a, b) == pytest.approx(max(a, b) + math.log1p(math.exp(-abs(a - b))))
+    assert logsubexp(logaddexp(a, b), b) == pytest.approx(a, abs=1e-9)
+
+def test_logsubexp_keeps_score_when_nothing_to_subtract():
+    assert logsubexp(5.0, 5.0) == 5.0
+    assert logsubexp(5.0, 6.0) == 5.0
+
+def test_index_rows_sums_uses_per_user_and_key():
+    rows = index_rows([
+        (1, 'Борщ', 300, 10, 15, 30, '2024-03-01'),
+        (1, 'борщ ', 320, 11, 16, 31, '2024-03-05'),
+        (1, 'Чай', 0, 0, 0, 0, '2024-03-05'),
+        (2, 'Борщ', 300, 10, 15, 30, '2024-03-05'),
+    ])
+    assert [row[:8] for row in rows] == [
+        (1, 'борщ', 'борщ ', 320, 11, 16, 31, 2),
+        (2, 'борщ', 'Борщ', 300, 10, 15, 30, 1),
+    ]
+    day = use_score(datetime(2024, 3, 5).timestamp())
+    assert rows[1][8] == pytest.approx(day)
+    # Использование четыре дня назад при периоде полураспада 14 дней
+    assert rows[0][8] - day == pytest.approx(math.log1p(2 ** (-4 / 14)))
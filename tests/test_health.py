@@ -0,0 +1,45 @@
+import asyncio
+import zipfile
+
+import health
+from models import HealthDay
+
+EXPORT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="ru_RU">
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" value="4000" startDate="2024-01-15 08:00:00 +0300"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" value="2500" startDate="2024-01-15 09:00:00 +0300"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" value="2500" startDate="2024-01-15 18:00:00 +0300"/>
+ <Record type="HKQuantityTypeIdentifierActiveEnergyBurned" sourceName="Watch" unit="kJ" value="1255.2" startDate="2024-01-15 10:00:00 +0300"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" value="70.4" startDate="2024-01-15 07:00:00 +0300"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" value="70.1" startDate="2024-01-15 21:00:00 +0300"/>
+ <Correlation type="HKCorrelationTypeIdentifierFood" startDate="2024-01-16 12:00:00 +0300">
+  <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" value="999" startDate="2024-01-16 12:00:00 +0300"/>
+ </Correlation>
+ <Record type="HKQuantityTypeIdentifierBasalEnergyBurned" sourceName="Watch" unit="kcal" value="1600" startDate="2024-01-16 00:00:00 +0300"/>
+</HealthData>
+"""
+
+EXPECTED = [
+    HealthDay('2024-01-15', active_energy=300, steps=5000, body_mass=70.1),
+    HealthDay('2024-01-16', basal_energy=1600),
+]
+
+def write_export(tmp_path) -> str:
+    path = tmp_path / 'export.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('apple_health_export/export.xml', EXPORT_XML)
+    return str(path)
+
+def test_parse_export_takes_max_source_and_last_weight(tmp_path):
+    days, records = health.parse_export(write_export(tmp_path))
+    assert records == 7
+    assert days == EXPECTED
+
+def test_import_runs_in_spawned_pool_and_shuts_down(tmp_path):
+    try:
+        days, _ = asyncio.run(health.import_export(write_export(tmp_path)))
+        assert days == EXPECTED
+        assert health._pool._mp_context.get_start_method() == 'spawn'
+    finally:
+        health.shutdown()
+    assert health._pool is None
@@ -0,0 +1,66 @@
+import json
+import logging
+import queue
+import sys
+
+from log_config import ContextFilter, JsonFormatter, _ContextQueueHandler, correlation_id_var, user_id_var
+
+def make_record(msg='Сохранено %s приёмов', args=(3,), exc_info=None, **extra) -> logging.LogRecord:
+    return logging.getLogger('bot.test').makeRecord(
+        'bot.test', logging.INFO, __file__, 10, msg, args, exc_info, extra=extra
+    )
+
+def test_json_formatter_keeps_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record(meals=3, stats={'depth': 1}, skipped=None)))
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'bot.test'
+    assert entry['msg'] == 'Сохранено 3 приёмов'
+    assert entry['meals'] == 3
+    assert entry['stats'] == {'depth': 1}
+    # Пустые поля и стандартные атрибуты LogRecord в запись не попадают
+    assert 'skipped' not in entry
+    assert not {'args', 'levelno', 'pathname', 'thread'} & set(entry)
+
+def test_json_formatter_writes_exception_and_unserializable_values():
+    try:
+        raise ValueError('плохой ответ GPT')
+    except ValueError:
+        record = make_record(exc_info=sys.exc_info(), value=object())
+    line = JsonFormatter().format(record)
+    assert '\n' not in line
+    entry = json.loads(line)
+    assert 'ValueError: плохой ответ GPT' in entry['exc']
+    assert entry['value'].startswith('<object object')
+
+def test_context_filter_takes_update_context():
+    record = make_record()
+    ContextFilter().filter(record)
+    assert (record.correlation_id, record.user_id) == (None, None)
+
+    tokens = correlation_id_var.set('upd-42'), user_id_var.set(7)
+    try:
+        ContextFilter().filter(record)
+    finally:
+        correlation_id_var.reset(tokens[0])
+        user_id_var.reset(tokens[1])
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry['correlation_id'], entry['user_id']) == ('upd-42', 7)
+
+def test_queue_handler_freezes_message_before_listener():
+    log_queue = queue.SimpleQueue()
+    handler = _ContextQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    items = ['гречка']
+    try:
+        raise RuntimeError('сбой')
+    except RuntimeError:
+        record = make_record('Блюда: %s', (items,), exc_info=sys.exc_info())
+    handler.handle(record)
+    items.append('котлета')
+
+    queued = log_queue.get_nowait()
+    assert queued.args is None
+    assert queued.exc_info is None
+    entry = json.loads(JsonFormatter().format(queued))
+    assert entry['msg'] == "Блюда: ['гречка']"
+    assert 'RuntimeError: сбой' in entry['exc']
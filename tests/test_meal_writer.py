@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from database import Database
+from models import Kbju
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'bot.db'), write_behind_ms=1)
+    yield db
+    db.close()
+
+def meals_count(db: Database) -> int:
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM meals').fetchone()[0]
+
+def test_batch_is_written(db):
+    futures = [db.submit_meal(1, f"блюдо {number}", Kbju(100, 1, 2, 3)) for number in range(20)]
+    meal_ids = [future.result(timeout=5) for future in futures]
+    assert None not in meal_ids
+    assert len(set(meal_ids)) == 20
+    assert db.get_daily_summary(1).meals == 20
+
+def test_connect_failure_resolves_futures_and_reconnects(db, monkeypatch):
+    connect = db._connect
+
+    def broken():
+        raise sqlite3.OperationalError('unable to open database file')
+
+    monkeypatch.setattr(db, '_connect', broken)
+    future = db.submit_meal(1, "каша", Kbju(200, 5, 5, 30))
+    assert future.result(timeout=2) is None
+
+    monkeypatch.setattr(db, '_connect', connect)
+    meal_id = db.submit_meal(1, "каша", Kbju(200, 5, 5, 30)).result(timeout=2)
+    assert meal_id is not None
+    assert meals_count(db) == 1
+
+def test_broken_rollback_resolves_futures(db, monkeypatch):
+    def failing_write(conn, writes):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    class BrokenConnection:
+        def rollback(self):
+            raise sqlite3.OperationalError('disk I/O error')
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(db, '_write_meals', failing_write)
+    monkeypatch.setattr(db, '_connect', BrokenConnection)
+    futures = [db.submit_meal(1, "суп", Kbju(150, 5, 5, 10)) for _ in range(3)]
+    assert [future.result(timeout=2) for future in futures] == [None, None, None]
+
+def test_dead_thread_is_restarted(db):
+    db.submit_meal(1, "яблоко", Kbju(50, 0, 0, 12)).result(timeout=2)
+    # Поток, умерший вне _flush, не должен подвешивать следующие записи
+    db.writer._queue.put(None)
+    db.writer._thread.join(timeout=2)
+    assert not db.writer._thread.is_alive()
+    assert db.submit_meal(1, "груша", Kbju(60, 0, 0, 14)).result(timeout=2) is not None
+
+def test_close_flushes_queue_and_falls_back_to_direct_write(db):
+    futures = [db.submit_meal(2, "чай", Kbju(30, 0, 0, 7)) for _ in range(50)]
+    db.close()
+    assert all(future.done() and future.result() is not None for future in futures)
+    assert db.submit_meal(2, "чай", Kbju(30, 0, 0, 7)) is None
+    assert db.save_meal(2, "чай", Kbju(30, 0, 0, 7)) is not None
+    assert meals_count(db) == 51
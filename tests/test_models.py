@@ -0,0 +1,29 @@
+import pytest
+
+from models import DailySummary, FrequentMeal, HealthDay, Kbju, Meal, UserProfile
+
+def test_equal_models_of_same_type():
+    assert Kbju(100, 1, 2, 3) == Kbju(100, 1, 2, 3)
+    assert Kbju(100, 1, 2, 3) != Kbju(100, 1, 2, 4)
+    assert Meal(1, "суп", 100) == Meal(1, "суп", 100)
+    assert Meal(1, "суп", 100) != Meal(2, "суп", 100)
+    assert DailySummary(100, meals=1) != DailySummary(100, meals=2)
+
+def test_models_of_different_types_are_not_equal():
+    kbju, meal = Kbju(100, 1, 2, 3), Meal(1, "суп", 100, 1, 2, 3)
+    assert kbju != meal
+    assert meal != kbju
+    assert not kbju == meal
+    assert Meal(1, "суп") != FrequentMeal(1, "суп")
+    assert DailySummary() != Kbju()
+    assert Kbju() != (0, 0, 0, 0)
+
+def test_models_are_unhashable():
+    for model in (Kbju(), Meal(1, "суп"), DailySummary(), UserProfile(1), HealthDay('2024-01-15')):
+        with pytest.raises(TypeError):
+            hash(model)
+
+def test_health_day_equality():
+    assert HealthDay('2024-01-15', steps=5000) == HealthDay('2024-01-15', steps=5000)
+    assert HealthDay('2024-01-15', steps=5000) != HealthDay('2024-01-15', steps=5001)
+    assert HealthDay('2024-01-15') != ('2024-01-15', None, None, None, None)
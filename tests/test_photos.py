@@ -0,0 +1,65 @@
+import random
+
+from models import Kbju
+from photos import PhotoCache, hamming_distance
+
+ESTIMATE = ("Паста карбонара", Kbju(650, 25, 30, 70))
+
+def flip(phash: int, bits) -> int:
+    for bit in bits:
+        phash ^= 1 << bit
+    return phash
+
+def test_near_duplicate_hits_for_same_user_and_caption():
+    cache = PhotoCache(max_distance=6)
+    phash = 0x0F0F_3C3C_A5A5_FF00
+    cache.put(1, '', phash, *ESTIMATE)
+    assert cache.get(1, '', phash) == ESTIMATE
+    assert cache.get(1, '', flip(phash, (0, 9, 18, 27, 36, 45))) == ESTIMATE
+    assert cache.get(1, '', flip(phash, range(0, 70, 10))) is None
+
+def test_other_users_do_not_share_estimates():
+    cache = PhotoCache()
+    cache.put(1, '', 12345, *ESTIMATE)
+    assert cache.get(2, '', 12345) is None
+
+def test_caption_is_part_of_key():
+    cache = PhotoCache()
+    cache.put(1, '', 12345, *ESTIMATE)
+    assert cache.get(1, 'без соуса', 12345) is None
+    cache.put(1, '300 г', 12345, "Паста, 300 г", Kbju(480, 18, 22, 52))
+    assert cache.get(1, ' 300  Г', 12345)[0] == "Паста, 300 г"
+    assert cache.get(1, '', 12345) == ESTIMATE
+
+def test_eviction_keeps_index_in_sync():
+    cache = PhotoCache(size=2)
+    first, second, third = 0x0123_4567_89AB_CDEF, 0xFEDC_BA98_7654_3210, 0x0F0F_0F0F_F0F0_F0F0
+    for phash in (first, second, third):
+        cache.put(1, '', phash, *ESTIMATE)
+    assert cache.get(1, '', first) is None
+    assert cache.get(1, '', second) == ESTIMATE
+    assert set().union(*cache._index.values()) == {second, third}
+
+def test_band_index_finds_what_linear_scan_finds():
+    rng = random.Random(7)
+    cache = PhotoCache(size=500, max_distance=6)
+    stored = [rng.getrandbits(64) for _ in range(500)]
+    for number, phash in enumerate(stored):
+        cache.put(1, '', phash, str(number), Kbju(100))
+    for _ in range(2000):
+        base = rng.choice(stored)
+        probe = flip(base, rng.sample(range(64), rng.randint(0, 10)))
+        expected = {str(number) for number, phash in enumerate(stored)
+                    if hamming_distance(phash, probe) <= 6}
+        found = cache.get(1, '', probe)
+        assert (found[0] in expected) if expected else found is None
+
+def test_pool_is_spawned_and_shut_down():
+    import photos
+
+    pool = photos._get_pool()
+    assert pool._mp_context.get_start_method() == 'spawn'
+    assert pool.submit(hamming_distance, 0b1011, 0b0001).result(timeout=60) == 2
+    photos.shutdown()
+    assert photos._pool is None
+    photos.shutdown()
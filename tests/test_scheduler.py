@@ -0,0 +1,106 @@
+import asyncio
+import time
+from datetime import date, datetime, timezone
+
+import pytest
+from aiogram import Bot
+
+import formatting
+
+from benchmarks.fakes import RateLimitedBotSession
+from database import Database
+from middlewares import OutboundRequestMiddleware
+from models import Kbju, UserProfile
+from scheduler import REMINDER, SUMMARY, ReminderScheduler, next_due, parse_utc_offset
+from sender import OutboundDispatcher
+from storage import SQLiteStorage
+
+@pytest.mark.parametrize('text, offset', [
+    ('+3', 180), ('3', 180), ('UTC+5:30', 330), ('utc -3:30', -210), ('+5:45', 345),
+    ('-0', 0), ('+14', 840), ('-12:00', -720), ('+14:00', 840),
+])
+def test_parse_utc_offset(text, offset):
+    assert parse_utc_offset(text) == offset
+
+@pytest.mark.parametrize('text', ['+3:75', '-14:99', '+3:15', '+15', '+14:30', '-14:45', '3:5', 'Москва', ''])
+def test_parse_utc_offset_rejects(text):
+    assert parse_utc_offset(text) is None
+
+def test_reminders_are_retried_after_retry_after(tmp_path):
+    session = RateLimitedBotSession(global_limit=1)
+
+    async def scenario():
+        dispatcher = OutboundDispatcher(global_rate=100)
+        session.middleware(OutboundRequestMiddleware(dispatcher))
+        scheduler = ReminderScheduler(SQLiteStorage(Database(str(tmp_path / 'bot.db'))))
+        try:
+            await scheduler._send_batched(Bot(token='123456:scheduler', session=session), [(1, "a"), (2, "b")])
+        finally:
+            await dispatcher.close()
+
+    asyncio.run(scenario())
+    assert session.rejected['global'] == 1
+    assert sorted(method.chat_id for method in session.sent) == [1, 2]
+
+# 2024-03-10 12:00 UTC
+NOON_UTC = 1710072000.0
+
+@pytest.mark.parametrize('hhmm, offset, expected', [
+    ('13:00', 0, NOON_UTC + 3600),
+    ('11:00', 0, NOON_UTC + 23 * 3600),
+    ('15:00', 180, NOON_UTC),
+    ('09:00', 600, NOON_UTC + 11 * 3600),
+    ('07:30', -330, NOON_UTC + 1 * 3600),
+])
+def test_next_due(hhmm, offset, expected):
+    due = next_due(NOON_UTC - 1, hhmm, offset)
+    assert due == expected
+    # Ровно в срок отправка уже прошла — следующая через сутки
+    assert next_due(due, hhmm, offset) == due + 86400
+
+def test_changed_subscription_replaces_heap_entries(storage):
+    scheduler = ReminderScheduler(storage)
+    scheduler.update_user({'user_id': 1, 'utc_offset_minutes': 0, 'reminder_time': '09:00', 'summary_time': None})
+    scheduler.update_user({'user_id': 1, 'utc_offset_minutes': 0, 'reminder_time': '10:00', 'summary_time': '21:00'})
+    scheduler.update_user({'user_id': 2, 'utc_offset_minutes': 0, 'reminder_time': None, 'summary_time': '21:00'})
+
+    due = scheduler._pop_due(time.time() + 2 * 86400)
+    assert sorted((user_id, kind) for _, user_id, kind in due) == [(1, REMINDER), (1, SUMMARY), (2, SUMMARY)]
+    assert [at for at, _, _ in due] == sorted(at for at, _, _ in due)
+    assert scheduler._heap == []
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(Database(str(tmp_path / 'bot.db')))
+
+def test_far_offset_reads_the_day_meals_are_stored_under(storage, monkeypatch):
+    now = time.time()
+    server_today = date.today().strftime('%Y-%m-%d')
+    # Смещение, при котором у пользователя уже другая дата, чем на сервере
+    offset = next(offset for offset in (840, -720, 600, -600) if local_date(now, offset) != server_today)
+
+    async def scenario():
+        scheduler = ReminderScheduler(storage)
+        await storage.save_user_profile(UserProfile(1, 'Женский', 30, 165, 60, 'Средний', 'Поддержание'))
+        await storage.save_meal(1, "Омлет", Kbju(350, 20, 25, 5))
+        for user_id in (1, 2):
+            scheduler.update_user(await storage.save_subscription(
+                user_id, utc_offset_minutes=offset, reminder_time='09:00', summary_time='21:00'
+            ))
+        sent = []
+
+        async def capture(bot, outgoing):
+            sent.extend(outgoing)
+
+        monkeypatch.setattr(scheduler, '_send_batched', capture)
+        await scheduler._process(None, [(now, 1, REMINDER), (now, 2, REMINDER), (now, 1, SUMMARY)])
+        return sent
+
+    sent = asyncio.run(scenario())
+    # Первый уже записал завтрак — напоминание только второму; в сводке первого есть его омлет
+    assert [user_id for user_id, text in sent if text == formatting.REMINDER] == [2]
+    summary, = [text for user_id, text in sent if user_id == 1]
+    assert '350' in summary
+
+def local_date(timestamp: float, utc_offset_minutes: int) -> str:
+    return datetime.fromtimestamp(timestamp + utc_offset_minutes * 60, tz=timezone.utc).strftime('%Y-%m-%d')
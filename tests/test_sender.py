@@ -0,0 +1,152 @@
+# Очередь исходящих против фейкового Bot API, который, как Telegram, отвечает 429 сверх лимитов
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from benchmarks.fakes import RateLimitedBotSession
+from middlewares import OutboundRequestMiddleware
+from sender import BULK, OutboundDispatcher, send_coalesce_var, send_priority_var
+
+TOKEN = '123456:sender-test'
+
+# Кнопка не даёт склеивать сообщения: так каждое уходит отдельным вызовом API
+KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='ok', callback_data='ok')]])
+
+@pytest.fixture
+def bot_api():
+    """Фейковый Bot API с лимитами Telegram; окно чата ужато вчетверо, чтобы тесты шли быстро"""
+    return RateLimitedBotSession(chat_limit=5, chat_window=0.75)
+
+def run(bot_api: RateLimitedBotSession, scenario, **dispatcher_kwargs):
+    async def main():
+        dispatcher = OutboundDispatcher(**dispatcher_kwargs)
+        bot_api.middleware(OutboundRequestMiddleware(dispatcher))
+        try:
+            return await scenario(Bot(token=TOKEN, session=bot_api), dispatcher)
+        finally:
+            await dispatcher.close()
+    return asyncio.run(main())
+
+def test_burst_stays_within_limits(bot_api):
+    async def scenario(bot, dispatcher):
+        singles = [bot.send_message(1000 + number, "Итоги дня") for number in range(40)]
+        chatty = [bot.send_message(chat_id, f"Ответ {number}", reply_markup=KEYBOARD)
+                  for chat_id in (1, 2, 3) for number in range(6)]
+        return await asyncio.gather(*singles, *chatty)
+
+    messages = run(bot_api, scenario, chat_rate=4)
+    assert len(messages) == 58
+    assert not bot_api.rejected
+    assert len(bot_api.sent) == 58
+    # В один чат сообщения уходят в том порядке, в каком их отправил хендлер
+    for chat_id in (1, 2, 3):
+        assert [method.text for method in bot_api.sent if method.chat_id == chat_id] == \
+            [f"Ответ {number}" for number in range(6)]
+
+def test_retry_after_is_retried(bot_api):
+    bot_api.global_limit = 1
+
+    async def scenario(bot, dispatcher):
+        messages = await asyncio.gather(bot.send_message(1, "первое"), bot.send_message(2, "второе"))
+        return messages, dispatcher.stats()
+
+    # Очередь быстрее фейкового лимита: второе сообщение получит 429 и уйдёт после паузы
+    messages, stats = run(bot_api, scenario, global_rate=100)
+    assert [message.text for message in messages] == ["первое", "второе"]
+    assert bot_api.rejected['global'] == 1
+    assert stats['retry_after'] == 1
+    assert stats['sent'] == 2
+    assert stats['failed'] == 0
+
+def test_interactive_replies_overtake_bulk(bot_api):
+    async def bulk(bot):
+        send_priority_var.set(BULK)
+        await asyncio.gather(*(bot.send_message(2000 + number, "Рассылка") for number in range(10)))
+
+    async def scenario(bot, dispatcher):
+        broadcast = asyncio.create_task(bulk(bot))
+        # Рассылка уже в очереди и отправляется, когда приходят ответы пользователям
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*(bot.send_message(chat_id, "Ответ") for chat_id in (1, 2, 3)))
+        await broadcast
+
+    run(bot_api, scenario, global_rate=10)
+    order = [method.chat_id for method in bot_api.sent]
+    assert len(order) == 13
+    last_reply = max(order.index(chat_id) for chat_id in (1, 2, 3))
+    assert last_reply < 5
+    assert all(chat_id >= 2000 for chat_id in order[last_reply + 1:])
+
+def test_pending_replies_to_one_chat_are_coalesced(bot_api):
+    async def scenario(bot, dispatcher):
+        messages = await asyncio.gather(
+            bot.send_message(1, "Анализирую..."),
+            bot.send_message(1, "🍽 Обед"),
+            bot.send_message(1, "🔥 500 ккал"),
+            bot.send_message(1, "С кнопкой", reply_markup=KEYBOARD),
+        )
+        return messages, dispatcher.stats()
+
+    messages, stats = run(bot_api, scenario)
+    assert bot_api.calls['sendMessage'] == 2
+    assert stats['coalesced'] == 2
+    assert messages[0] is messages[1] is messages[2]
+    assert messages[0].text == "Анализирую...\n\n🍽 Обед\n\n🔥 500 ккал"
+    assert messages[3].text == "С кнопкой"
+
+def test_rejected_merge_is_resent_part_by_part(bot_api, monkeypatch):
+    check_limits = bot_api._check_limits
+
+    def reject_bad_html(method):
+        # Как Telegram: неэкранированный «<» в HTML — BadRequest для всего сообщения
+        if '< ' in method.text:
+            raise TelegramBadRequest(method, "Bad Request: can't parse entities")
+        check_limits(method)
+
+    monkeypatch.setattr(bot_api, '_check_limits', reject_bad_html)
+
+    async def scenario(bot, dispatcher):
+        return await asyncio.gather(
+            bot.send_message(1, "Анализирую..."),
+            bot.send_message(1, "если a < b"),
+            bot.send_message(1, "🔥 500 ккал"),
+            return_exceptions=True,
+        )
+
+    first, broken, last = run(bot_api, scenario)
+    assert first.text == "Анализирую..."
+    assert isinstance(broken, TelegramBadRequest)
+    assert last.text == "🔥 500 ккал"
+    assert [method.text for method in bot_api.sent] == ["Анализирую...", "🔥 500 ккал"]
+
+def test_opted_out_message_is_not_merged(bot_api):
+    async def scenario(bot, dispatcher):
+        first = asyncio.create_task(bot.send_message(1, "Ответ"))
+        await asyncio.sleep(0)
+        token = send_coalesce_var.set(False)
+        try:
+            preview = asyncio.create_task(bot.send_message(1, "Превью рассылки"))
+        finally:
+            send_coalesce_var.reset(token)
+        last = asyncio.create_task(bot.send_message(1, "Ещё ответ"))
+        return await asyncio.gather(first, preview, last)
+
+    run(bot_api, scenario)
+    assert [method.text for method in bot_api.sent] == ["Ответ", "Превью рассылки", "Ещё ответ"]
+
+def test_close_cancels_waiting_senders(bot_api):
+    async def scenario(bot, dispatcher):
+        sends = [asyncio.create_task(bot.send_message(1, f"Ответ {number}", reply_markup=KEYBOARD))
+                 for number in range(5)]
+        await asyncio.sleep(0.05)
+        await dispatcher.close()
+        results = await asyncio.wait_for(asyncio.gather(*sends, return_exceptions=True), timeout=2)
+        return results, dispatcher.depth
+
+    results, depth = run(bot_api, scenario, chat_rate=1)
+    assert depth == 0
+    assert sum(isinstance(result, asyncio.CancelledError) for result in results) >= 3
+    assert all(isinstance(result, (asyncio.CancelledError, Message)) for result in results)
@@ -0,0 +1,256 @@
+# Один набор проверок для SQLiteStorage и PostgresStorage
+#
+# PostgreSQL берётся из TEST_DATABASE_URL (все таблицы в ней очищаются перед
+# каждым тестом — не указывайте рабочую базу) или из фикстуры postgresql
+# плагина pytest-postgresql; если нет ни того, ни другого, PG-варианты
+# пропускаются.
+import asyncio
+import importlib.util
+import os
+from datetime import date
+
+import pytest
+
+from database import Database
+from goals import GoalCategory
+from models import DailySummary, Kbju, UserProfile
+from storage import SQLiteStorage
+
+TODAY = date.today().strftime('%Y-%m-%d')
+
+def _postgres_dsn(request) -> str:
+    dsn = os.getenv('TEST_DATABASE_URL')
+    if dsn:
+        return dsn
+    if importlib.util.find_spec('pytest_postgresql') is not None:
+        info = request.getfixturevalue('postgresql').info
+        return f"postgresql://{info.user}:{info.password or ''}@{info.host}:{info.port}/{info.dbname}"
+    pytest.skip("нет TEST_DATABASE_URL и pytest-postgresql")
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def make_storage(request, tmp_path):
+    if request.param == 'sqlite':
+        return lambda: SQLiteStorage(Database(str(tmp_path / 'bot.db')))
+    pytest.importorskip('asyncpg')
+    dsn = _postgres_dsn(request)
+    from pg_storage import PostgresStorage
+    return lambda: PostgresStorage(dsn)
+
+def run(make_storage, scenario):
+    """Сценарий на свежем хранилище в отдельном цикле событий: пул asyncpg к циклу привязан"""
+    async def main():
+        storage = make_storage()
+        await storage.connect()
+        try:
+            pool = getattr(storage, '_pool', None)
+            if pool is not None:
+                tables = [row[0] for row in await pool.fetch(
+                    'SELECT tablename FROM pg_tables WHERE schemaname = current_schema()'
+                )]
+                await pool.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY")
+            await scenario(storage)
+        finally:
+            await storage.close()
+    asyncio.run(main())
+
+def kbju_of(item) -> tuple:
+    return item.calories, item.proteins, item.fats, item.carbs
+
+def test_profile_save_and_load(make_storage):
+    async def scenario(storage):
+        profile = UserProfile(1, 'Мужской', 30, 180, 80, 'Средний', 'Хочу похудеть', target_calories=2000)
+        assert await storage.save_user_profile(profile)
+        assert await storage.user_profile_exists(1)
+        assert not await storage.user_profile_exists(2)
+
+        loaded = await storage.get_user_profile(1)
+        assert (loaded.gender, loaded.age, loaded.height, loaded.weight, loaded.activity, loaded.goal) == \
+            ('Мужской', 30, 180, 80, 'Средний', 'Хочу похудеть')
+        assert loaded.goal_category == GoalCategory.LOSE_WEIGHT
+        assert loaded.target_calories == 2000
+
+        profile.weight = 78
+        profile.target_calories = None
+        assert await storage.save_user_profile(profile)
+        loaded = await storage.get_user_profile(1)
+        assert loaded.weight == 78
+        assert not loaded.target_calories
+        assert await storage.get_user_profile(2) is None
+    run(make_storage, scenario)
+
+def test_meal_save_update_delete_keeps_summary(make_storage):
+    async def scenario(storage):
+        first = await storage.save_meal(1, "Овсянка", Kbju(300, 10, 5, 50))
+        second = await storage.save_meal(1, "Яблоко", Kbju(80, 0, 0, 20))
+        await storage.save_meal(2, "Чужой обед", Kbju(700, 30, 30, 70))
+        assert first is not None and second is not None and first != second
+
+        summary = await storage.get_daily_summary(1)
+        assert kbju_of(summary) == (380, 10, 5, 70)
+        assert summary.meals == 2
+        assert [meal.description for meal in await storage.get_meals_for_day(1)] == ["Овсянка", "Яблоко"]
+
+        assert await storage.update_meal(1, first, "Овсянка на молоке", Kbju(400, 15, 10, 55))
+        summary = await storage.get_daily_summary(1)
+        assert kbju_of(summary) == (480, 15, 10, 75)
+        assert summary.meals == 2
+        # Чужой приём пищи не меняется
+        assert not await storage.update_meal(2, first, "Взлом", Kbju(1, 1, 1, 1))
+        assert await storage.delete_meal(2, second) is None
+
+        deleted = await storage.delete_meal(1, second)
+        assert deleted.description == "Яблоко"
+        assert kbju_of(deleted) == (80, 0, 0, 20)
+        summary = await storage.get_daily_summary(1)
+        assert kbju_of(summary) == (400, 15, 10, 55)
+        assert summary.meals == 1
+        assert summary.meals == len(await storage.get_meals_for_day(1))
+        assert (await storage.get_daily_summary(2)).meals == 1
+    run(make_storage, scenario)
+
+def test_frequent_meals_follow_saves_and_deletes(make_storage):
+    async def scenario(storage):
+        for _ in range(3):
+            await storage.save_meal(1, "Гречка с курицей", Kbju(450, 35, 10, 50))
+        typo = await storage.save_meal(1, "Грчека", Kbju(450, 35, 10, 50))
+
+        frequent = await storage.get_frequent_meals(1, 5)
+        assert [(meal.description, meal.uses) for meal in frequent] == [("Гречка с курицей", 3), ("Грчека", 1)]
+        assert await storage.get_frequent_meal(2, frequent[0].id) is None
+        assert kbju_of(await storage.find_meal_kbju(1, "гречка  с курицей")) == (450, 35, 10, 50)
+
+        await storage.delete_meal(1, typo)
+        assert [meal.description for meal in await storage.get_frequent_meals(1, 5)] == ["Гречка с курицей"]
+    run(make_storage, scenario)
+
+def test_bulk_lookups(make_storage):
+    async def scenario(storage):
+        for user_id in (3, 1, 2):
+            await storage.save_user_profile(UserProfile(user_id, 'Женский', 25, 165, 60, 'Низкий', 'Поддержание'))
+        await storage.save_meal(1, "Суп", Kbju(200, 10, 5, 20))
+        await storage.save_meal(3, "Салат", Kbju(100, 2, 5, 10))
+        await storage.save_meal(3, "Торт", Kbju(400, 5, 20, 50))
+
+        summaries = await storage.get_daily_summaries_bulk([1, 2, 3, 99], TODAY)
+        assert set(summaries) == {1, 2, 3, 99}
+        assert kbju_of(summaries[1]) == (200, 10, 5, 20)
+        assert (summaries[3].calories, summaries[3].meals) == (500, 2)
+        assert summaries[2] == DailySummary()
+        assert summaries[99] == DailySummary()
+
+        profiles = await storage.get_user_profiles_bulk([1, 2, 3, 99])
+        assert sorted(profiles) == [1, 2, 3]
+        assert profiles[2].goal_category == GoalCategory.MAINTAIN
+
+        assert await storage.get_user_ids_after(0, 2) == [1, 2]
+        assert await storage.get_user_ids_after(2, 2) == [3]
+        assert await storage.get_user_ids_after(3, 2) == []
+
+        targets = await storage.calculate_targets_bulk([1, 2, 3])
+        assert len(targets.user_ids) == 3
+    run(make_storage, scenario)
+
+def test_subscriptions(make_storage):
+    async def scenario(storage):
+        assert await storage.get_subscription(1) is None
+        subscription = await storage.save_subscription(1, reminder_time='09:00', ignored='x')
+        assert subscription['user_id'] == 1
+        assert subscription['reminder_time'] == '09:00'
+        assert subscription['summary_time'] is None
+        assert subscription['utc_offset_minutes'] == 180
+
+        subscription = await storage.save_subscription(1, utc_offset_minutes=-330, summary_time='21:30')
+        assert (subscription['utc_offset_minutes'], subscription['reminder_time'], subscription['summary_time']) == \
+            (-330, '09:00', '21:30')
+
+        # Подписка без времени не попадает в расписание
+        await storage.save_subscription(2)
+        assert [row['user_id'] for row in await storage.get_subscriptions()] == [1]
+        await storage.save_subscription(1, reminder_time=None, summary_time=None)
+        assert await storage.get_subscriptions() == []
+    run(make_storage, scenario)
+
+def test_broadcast_checkpoints(make_storage):
+    async def scenario(storage):
+        assert await storage.get_broadcast() is None
+        first = await storage.create_broadcast("Первая", 10)
+        second = await storage.create_broadcast("Вторая", 10)
+
+        broadcast = await storage.get_broadcast()
+        assert broadcast['id'] == second
+        assert (broadcast['status'], broadcast['last_user_id'], broadcast['delivered']) == ('running', 0, 0)
+
+        await storage.save_broadcast_progress(first, 500, 480, 15, 5)
+        await storage.save_broadcast_progress(second, 100, 100, 0, 0, status='done')
+        broadcast = await storage.get_broadcast(first)
+        assert (broadcast['text'], broadcast['created_by']) == ("Первая", 10)
+        assert (broadcast['last_user_id'], broadcast['delivered'], broadcast['blocked'], broadcast['failed']) == \
+            (500, 480, 15, 5)
+        assert [row['id'] for row in await storage.get_running_broadcasts()] == [first]
+    run(make_storage, scenario)
+
+def test_frequent_meals_follow_edits(make_storage):
+    async def scenario(storage):
+        await storage.save_meal(1, "Плов", Kbju(600, 20, 25, 70))
+        mistaken = await storage.save_meal(1, "Плов", Kbju(6000, 200, 250, 700))
+
+        assert await storage.update_meal(1, mistaken, "Плов", Kbju(600, 20, 25, 70))
+        frequent = await storage.get_frequent_meals(1, 5)
+        assert [(meal.description, meal.uses) for meal in frequent] == [("Плов", 2)]
+        assert kbju_of(frequent[0]) == (600, 20, 25, 70)
+
+        assert await storage.update_meal(1, mistaken, "Лагман", Kbju(500, 20, 15, 60))
+        frequent = await storage.get_frequent_meals(1, 5)
+        assert sorted((meal.description, meal.uses) for meal in frequent) == [("Лагман", 1), ("Плов", 1)]
+        assert kbju_of(await storage.find_meal_kbju(1, "лагман")) == (500, 20, 15, 60)
+
+        only = await storage.save_meal(2, "Чизкейк", Kbju(450, 8, 30, 35))
+        assert await storage.update_meal(2, only, "Сырники", Kbju(350, 18, 15, 30))
+        assert [meal.description for meal in await storage.get_frequent_meals(2, 5)] == ["Сырники"]
+        assert await storage.find_meal_kbju(2, "чизкейк") is None
+    run(make_storage, scenario)
+
+def test_removed_uses_lower_the_rank(make_storage):
+    async def scenario(storage):
+        soups = [await storage.save_meal(1, "Борщ", Kbju(300, 10, 15, 30)) for _ in range(3)]
+        for _ in range(2):
+            await storage.save_meal(1, "Сырники", Kbju(350, 18, 15, 30))
+        await storage.save_meal(1, "Чай без сахара", Kbju(0, 0, 0, 0))
+        assert [meal.description for meal in await storage.get_frequent_meals(1, 5)] == ["Борщ", "Сырники"]
+
+        # Из рейтинга уходит вес удалённых использований, а не только счётчик
+        for meal_id in soups[:2]:
+            await storage.delete_meal(1, meal_id)
+        frequent = await storage.get_frequent_meals(1, 5)
+        assert [(meal.description, meal.uses) for meal in frequent] == [("Сырники", 2), ("Борщ", 1)]
+
+        # Исправленный приём переезжает в другое блюдо вместе с весом
+        assert await storage.update_meal(1, soups[2], "Сырники", Kbju(350, 18, 15, 30))
+        assert [(meal.description, meal.uses) for meal in await storage.get_frequent_meals(1, 5)] == [("Сырники", 3)]
+
+        # Приём без калорий в частые блюда не попадал, и его удаление их не трогает
+        tea = (await storage.get_meals_for_day(1))[-1]
+        await storage.delete_meal(1, tea.id)
+        assert [meal.uses for meal in await storage.get_frequent_meals(1, 5)] == [3]
+    run(make_storage, scenario)
+
+def test_sqlite_schema_is_created_on_connect(tmp_path, monkeypatch):
+    from storage import create_storage
+
+    path = tmp_path / 'bot.db'
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    monkeypatch.setenv('DB_PATH', str(path))
+    storage = create_storage()
+    assert not path.exists()
+
+    async def scenario():
+        await storage.connect()
+        try:
+            await storage.save_user_profile(UserProfile(1, 'Женский', 30, 165, 60, 'Средний', 'похудеть'))
+            assert (await storage.get_user_profile(1)).goal_category == GoalCategory.LOSE_WEIGHT
+            # Повторный connect (рестарт на той же базе) данные не трогает
+            await storage.connect()
+            assert await storage.user_profile_exists(1)
+        finally:
+            await storage.close()
+    asyncio.run(scenario())
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from database import Database
+from goals import GoalCategory
+from models import UserProfile
+from targets import TargetTable, profile_target
+
+GENDERS = ['Мужской', 'Женский', 'мужской', None, '']
+ACTIVITIES = ['Низкий', 'Средний', 'Высокий', 'высокий', 'Спортсмен', None]
+GOALS = ['похудеть', 'набрать вес', 'больше протеина', 'снизить холестерин', 'поддерживать вес', 'быть бодрым', None]
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'bot.db'))
+
+def random_user(user_id: int) -> tuple:
+    return (
+        user_id, random.choice(GENDERS), random.randint(0, 90), random.randint(0, 210), random.randint(0, 160),
+        random.choice(ACTIVITIES), random.choice(GOALS),
+        # Без категории — профиль из базы до миграции: категорию считают по тексту цели
+        random.choice([None, *map(int, GoalCategory)]),
+        random.randint(800, 4000) if random.random() < 0.15 else None,
+        random.randint(100, 1200) if random.random() < 0.2 else None,
+    )
+
+def test_bulk_targets_match_per_user(db):
+    random.seed(7)
+    users = [random_user(user_id) for user_id in range(1, 5001)]
+    with db._connect() as conn:
+        conn.executemany(
+            'INSERT INTO users (user_id, gender, age, height, weight, activity, goal, goal_category, '
+            'target_calories, health_active_energy) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            users
+        )
+        conn.commit()
+
+    user_ids = [user[0] for user in users]
+    table = db.calculate_targets_bulk(user_ids)
+    profiles = db.get_user_profiles_bulk(user_ids)
+    assert len(table) == len(users)
+    mismatches = [
+        user_id for user_id in user_ids
+        if table.target(user_id) != db.calculate_target_calories(user_id, profiles[user_id])
+    ]
+    assert mismatches == []
+
+# Вес 80 кг; (белок, жиры) по TDEE и при калориях, заданных пользователем
+MACROS = {
+    GoalCategory.DEFAULT: ((96, 80), (96, 80)),
+    GoalCategory.LOSE_WEIGHT: ((128, 64), (128, 64)),
+    GoalCategory.GAIN_MASS: ((128, 80), (96, 80)),
+    GoalCategory.MORE_PROTEIN: ((160, 80), (160, 64)),
+    GoalCategory.LESS_FAT: ((96, 56), (96, 80)),
+    GoalCategory.MAINTAIN: ((96, 80), (96, 80)),
+}
+CALORIE_FACTORS = {GoalCategory.LOSE_WEIGHT: 0.85, GoalCategory.GAIN_MASS: 1.15}
+
+@pytest.mark.parametrize('category', list(GoalCategory))
+def test_macro_split_per_goal(category):
+    # BMR 10*80 + 6.25*180 - 5*30 + 5 = 1780, TDEE 1780 * 1.55 = 2759
+    profile = UserProfile(1, 'Мужской', 30, 180, 80, 'Средний', goal_category=int(category))
+    explicit = UserProfile(2, 'Мужской', 30, 180, 80, 'Средний', goal_category=int(category), target_calories=2000)
+    table = TargetTable([1, 2], ['Мужской'] * 2, [30] * 2, [180] * 2, [80] * 2, ['Средний'] * 2,
+                        [int(category)] * 2, [0, 2000])
+
+    (proteins, fats), (explicit_proteins, explicit_fats) = MACROS[category]
+    target = profile_target(profile)
+    assert (target['bmr'], target['tdee']) == (1780, 2759)
+    assert target['calories'] == int(2759.0 * CALORIE_FACTORS.get(category, 1.0))
+    assert (target['proteins'], target['fats']) == (proteins, fats)
+    assert target['carbs'] == int((target['calories'] - proteins * 4 - fats * 9) / 4)
+
+    target = profile_target(explicit)
+    assert target['calories'] == 2000
+    assert (target['proteins'], target['fats']) == (explicit_proteins, explicit_fats)
+    assert target['carbs'] == int((2000 - explicit_proteins * 4 - explicit_fats * 9) / 4)
+
+    assert table.target(1) == profile_target(profile)
+    assert table.target(2) == profile_target(explicit)
+
+def test_explicit_calories_below_macros_give_zero_carbs():
+    profile = UserProfile(1, 'Женский', 30, 160, 120, 'Низкий', goal_category=int(GoalCategory.MORE_PROTEIN),
+                          target_calories=900)
+    assert profile_target(profile)['carbs'] == 0
+    table = TargetTable([1], ['Женский'], [30], [160], [120], ['Низкий'], [int(GoalCategory.MORE_PROTEIN)], [900])
+    assert table.target(1)['carbs'] == 0
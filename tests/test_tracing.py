@@ -0,0 +1,135 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+import tracing
+from tracing import SpanExporter, span, start_trace, trace_methods, traced
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Завершённые спаны вместо файла экспортёра"""
+    spans = []
+    monkeypatch.setattr(tracing.exporter, 'export', spans.append)
+    return spans
+
+@trace_methods('repo')
+class Repo:
+    def get(self, key):
+        with span('inner'):
+            return key * 2
+
+    async def fetch(self, key):
+        await asyncio.sleep(0)
+        return key
+
+    def iter_rows(self, count):
+        for row in range(count):
+            with span('row'):
+                value = row
+            yield value
+
+    def broken_rows(self):
+        yield 1
+        raise ValueError('сломанная строка')
+
+    def _private(self):
+        return 'без спана'
+
+def test_sampling():
+    assert start_trace('update', sample_rate=0) is tracing._NOOP
+    assert isinstance(start_trace('update', sample_rate=1), tracing.Span)
+    random.seed(3)
+    sampled = sum(start_trace('update', sample_rate=0.25) is not tracing._NOOP for _ in range(4000))
+    assert 850 < sampled < 1150
+
+def test_without_trace_nothing_is_recorded(exported):
+    repo = Repo()
+    assert repo.get(2) == 4
+    assert list(repo.iter_rows(2)) == [0, 1]
+    with span('orphan') as current:
+        assert current is None
+    assert exported == []
+
+def test_child_spans_share_trace(exported):
+    repo = Repo()
+    with start_trace('update', sample_rate=1, update_type='message') as root:
+        assert repo.get(2) == 4
+        assert asyncio.run(repo.fetch(5)) == 5
+        assert repo._private() == 'без спана'
+
+    inner, get, fetch, update = exported
+    assert [s.name for s in exported] == ['inner', 'repo.get', 'repo.fetch', 'update']
+    assert {s.trace_id for s in exported} == {root.trace_id}
+    assert inner.parent_id == get.span_id
+    assert get.parent_id == fetch.parent_id == root.span_id
+    assert update.parent_id is None and update.attributes == {'update_type': 'message'}
+
+def test_generator_span_covers_iteration(exported):
+    repo = Repo()
+    with start_trace('update', sample_rate=1) as root:
+        rows = repo.iter_rows(3)
+        assert exported == []
+        assert next(rows) == 0
+        # Между next() текущим остаётся спан вызывающего
+        assert tracing._current_span.get() is root
+        assert list(rows) == [1, 2]
+
+    names = [s.name for s in exported]
+    assert names == ['row', 'row', 'row', 'repo.iter_rows', 'update']
+    generator_span = exported[3]
+    assert generator_span.status == 'OK'
+    assert generator_span.parent_id == root.span_id
+    assert all(row.parent_id == root.span_id for row in exported[:3])
+    assert all(generator_span.start_ns <= row.start_ns <= row.end_ns <= generator_span.end_ns
+               for row in exported[:3])
+
+def test_generator_span_on_error_and_early_close(exported):
+    repo = Repo()
+    with start_trace('update', sample_rate=1):
+        with pytest.raises(ValueError):
+            list(repo.broken_rows())
+        rows = repo.iter_rows(10)
+        next(rows)
+        rows.close()
+
+    broken, _, closed, _ = exported
+    assert broken.status == 'ERROR'
+    assert broken.attributes['error'] == 'ValueError: сломанная строка'
+    assert closed.name == 'repo.iter_rows' and closed.status == 'OK'
+
+def test_span_records_error():
+    @traced('gpt.estimate')
+    def estimate():
+        raise TimeoutError('нет ответа')
+
+    spans = []
+    original = tracing.exporter.export
+    tracing.exporter.export = spans.append
+    try:
+        with pytest.raises(TimeoutError):
+            with start_trace('update', sample_rate=1):
+                estimate()
+    finally:
+        tracing.exporter.export = original
+    assert [(s.name, s.status) for s in spans] == [('gpt.estimate', 'ERROR'), ('update', 'ERROR')]
+
+def test_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    exporter = SpanExporter(str(path))
+    root = tracing.Span('update', 'a' * 32, None, {'user_id': 1, 'raw': object()})
+    root.start_ns, root.end_ns = 1_000_000, 3_500_000
+    child = tracing.Span('db.save_meal', root.trace_id, root.span_id, {})
+    for finished in (child, root):
+        exporter.export(finished)
+    exporter.shutdown()
+    exporter.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [line['name'] for line in lines] == ['db.save_meal', 'update']
+    assert lines[0]['parentSpanId'] == lines[1]['spanId']
+    assert lines[1]['traceId'] == 'a' * 32
+    assert lines[1]['durationMs'] == 2.5
+    assert lines[1]['attributes']['user_id'] == 1
+    assert lines[1]['attributes']['raw'].startswith('<object object')
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+import services
+from benchmarks.fakes import FakeOpenAI
+from database import Database
+from models import Kbju
+from storage import SQLiteStorage
+from usage import BudgetExceeded, UsageLedger, completion_cost
+
+USER = 1
+TODAY = date.today().isoformat()
+
+@pytest.fixture
+def gpt(monkeypatch):
+    fake = FakeOpenAI()
+    monkeypatch.setattr(services, '_client', fake)
+    return fake
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(Database(str(tmp_path / 'bot.db')))
+
+def test_over_budget_uses_cache_then_history(gpt, storage):
+    async def scenario():
+        # Бюджет кончается на первом же запросе
+        ledger = UsageLedger(storage, daily_budget=1e-9)
+        await storage.save_meal(USER, 'Борщ со сметаной', Kbju(320, 12, 18, 25))
+
+        kbju, offline = await ledger.estimate_kbju(USER, 'гречка')
+        assert not offline and kbju.calories > 0
+        assert await ledger.over_budget(USER)
+
+        assert await ledger.estimate_kbju(USER, '  Гречка ') == (kbju, True)
+        assert await ledger.estimate_kbju(USER, 'борщ  со сметаной') == (Kbju(320, 12, 18, 25), True)
+        with pytest.raises(BudgetExceeded):
+            await ledger.estimate_kbju(USER, 'плов')
+        with pytest.raises(BudgetExceeded):
+            await ledger.estimate_kbju_from_photo(USER, b'jpeg')
+        assert gpt.calls == 1
+
+        # Бюджет у каждого свой, а кэш оценок общий
+        assert (await ledger.estimate_kbju(USER + 1, 'плов'))[1] is False
+        assert gpt.calls == 2
+
+    asyncio.run(scenario())
+
+def test_zero_budget_is_unlimited(gpt, storage):
+    async def scenario():
+        ledger = UsageLedger(storage, daily_budget=0)
+        for _ in range(3):
+            assert (await ledger.estimate_kbju(USER, 'гречка'))[1] is False
+        description, _ = await ledger.estimate_kbju_from_photo(USER, b'jpeg', caption='овсянка')
+        assert description == 'овсянка'
+        assert gpt.calls == 4
+        assert await ledger.spent_today(USER) > 0
+
+    asyncio.run(scenario())
+
+def test_failed_flush_keeps_rows(gpt, storage, monkeypatch):
+    async def scenario():
+        ledger = UsageLedger(storage, daily_budget=0)
+        await ledger.estimate_kbju(USER, 'гречка')
+
+        async def refuse(rows):
+            return False
+
+        with monkeypatch.context() as patch:
+            patch.setattr(storage, 'save_gpt_usage', refuse)
+            await ledger.flush()
+        assert await storage.get_gpt_spent(USER, TODAY) == 0
+
+        # Строки вернулись и складываются с новыми по (пользователь, день, модель)
+        await ledger.estimate_kbju(USER, 'гречка')
+        requests, prompt_tokens, completion_tokens, cost, _, _ = ledger._pending[(USER, TODAY, 'gpt-4o-mini')]
+        assert requests == 2
+        await ledger.flush()
+        assert not ledger._pending
+
+        spent = await storage.get_gpt_spent(USER, TODAY)
+        assert spent == pytest.approx(cost)
+        assert cost == pytest.approx(completion_cost('gpt-4o-mini', prompt_tokens, completion_tokens))
+        # Новый процесс берёт потраченное из базы
+        assert await UsageLedger(storage).spent_today(USER) == pytest.approx(spent)
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize('description, model', [
+    ('гречка', services.GPT_CHEAP_MODEL),
+    ('овсянка на молоке с бананом', services.GPT_CHEAP_MODEL),
+    ('гречка, котлета', services.GPT_STRONG_MODEL),
+    ('курица и рис', services.GPT_STRONG_MODEL),
+    ('суп плюс хлеб', services.GPT_STRONG_MODEL),
+    ('что-то сладкое', services.GPT_STRONG_MODEL),
+    ('паста или рис', services.GPT_STRONG_MODEL),
+    ('примерно тарелка супа', services.GPT_STRONG_MODEL),
+    ('это бургер?', services.GPT_STRONG_MODEL),
+    ('большая тарелка домашнего борща со сметаной и хлебом', services.GPT_STRONG_MODEL),
+    ('салат\nкомпот', services.GPT_STRONG_MODEL),
+])
+def test_route_model(description, model, gpt, storage):
+    expected_tokens = services.GPT_CHEAP_MAX_TOKENS if model == services.GPT_CHEAP_MODEL \
+        else services.GPT_STRONG_MAX_TOKENS
+    assert services.route_model(description) == (model, expected_tokens)
+
+    asyncio.run(UsageLedger(storage, daily_budget=0).estimate_kbju(USER, description))
+    assert gpt.models == {model: 1}
+
+def test_unknown_model_costs_nothing():
+    assert completion_cost('no-such-model', 1000, 1000) == 0.0
+    assert completion_cost('gpt-4o', 1_000_000, 0) == pytest.approx(2.5)
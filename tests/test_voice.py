@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from voice import FakeTranscriber, QueueFull, Transcriber, TranscriptionQueue, render_queue_stats
+
+def test_transcriber_is_abstract():
+    with pytest.raises(TypeError):
+        Transcriber()
+
+def test_queue_stats_and_rejection():
+    async def scenario():
+        queue = TranscriptionQueue(FakeTranscriber('гречка', delay=0.05), workers=1, max_size=2, batch_size=1)
+        try:
+            jobs = [asyncio.create_task(queue.transcribe(b'', 'voice.ogg')) for _ in range(4)]
+            results = await asyncio.gather(*jobs, return_exceptions=True)
+            return results, queue.stats()
+        finally:
+            await queue.close()
+
+    results, stats = asyncio.run(scenario())
+    assert [isinstance(result, QueueFull) for result in results].count(True) == stats['rejected'] > 0
+    assert results.count('гречка') == stats['completed'] == stats['submitted']
+    assert stats['depth'] == 0
+    assert stats['max_depth'] == 2
+
+    text = render_queue_stats(stats)
+    assert f"распознано: {stats['completed']}" in text
+    assert f"отклонено: {stats['rejected']}" in text
+
+def test_app_shutdown_cancels_waiting_voices(monkeypatch):
+    import voice
+    from app import App
+
+    queue = TranscriptionQueue(FakeTranscriber('гречка', delay=10), workers=1, batch_size=1)
+    monkeypatch.setattr(voice, 'transcription_queue', queue)
+
+    async def scenario():
+        jobs = [asyncio.create_task(queue.transcribe(b'', 'voice.ogg')) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(App('token').shutdown(), timeout=5)
+        return await asyncio.gather(*jobs, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert queue.depth == 0
@@ -0,0 +1,206 @@
+import atexit
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Доля апдейтов, для которых пишется трейс (0 — трейсинг выключен)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+# Файл JSON-строк в духе OTLP/JSON; подменяет коллектор при локальной отладке
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', 'traces.jsonl')
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+class Span:
+    """Отрезок работы внутри трейса апдейта"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'status',
+                 'start_ns', 'end_ns', '_token')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.status = 'OK'
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self) -> 'Span':
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.finish(exc)
+        return False
+
+    def finish(self, exc: Optional[BaseException] = None):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.status = 'ERROR'
+            self.attributes['error'] = f"{type(exc).__name__}: {exc}"
+        exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'name': self.name,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'durationMs': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+class _NoopSpan:
+    """Заглушка для несэмплированных апдейтов: `with` ничего не делает и отдаёт None"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def start_trace(name: str, sample_rate: Optional[float] = None, **attributes):
+    """Корневой спан апдейта; решение о сэмплировании принимается здесь один раз"""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return _NOOP
+    return Span(name, f"{random.getrandbits(128):032x}", None, attributes)
+
+def span(name: str, **attributes):
+    """Дочерний спан; вне сэмплированного трейса стоит одну проверку ContextVar"""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+def traced(name: str) -> Callable:
+    """Декоратор: оборачивает вызов функции (синхронной, async или генератора) в дочерний спан"""
+    def decorator(func: Callable) -> Callable:
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                current = span(name)
+                if current is _NOOP:
+                    return (yield from func(*args, **kwargs))
+                # Спан длится, пока генератор итерируют, но текущим не становится:
+                # между next() управление у вызывающего, и его спаны не должны сюда вкладываться
+                current.start_ns = time.time_ns()
+                try:
+                    result = yield from func(*args, **kwargs)
+                except GeneratorExit:
+                    current.finish()
+                    raise
+                except BaseException as e:
+                    current.finish(e)
+                    raise
+                current.finish()
+                return result
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_methods(prefix: str) -> Callable[[type], type]:
+    """Декоратор класса: спан `<prefix>.<метод>` на каждый публичный метод"""
+    def decorator(cls: type) -> type:
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith('_') and inspect.isfunction(value):
+                setattr(cls, attr, traced(f"{prefix}.{attr}")(value))
+        return cls
+    return decorator
+
+class SpanExporter:
+    """Пишет завершённые спаны JSON-строками из фонового потока"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, finished: Span):
+        if self._thread is None:
+            self._start()
+        self._queue.put(finished)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                # Забираем всё, что накопилось, и пишем одним flush
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._write(f, batch)
+                        return
+                    batch.append(item)
+                self._write(f, batch)
+
+    @staticmethod
+    def _write(f, batch):
+        try:
+            f.writelines(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + '\n' for s in batch)
+            f.flush()
+        except Exception as e:
+            logger.error("Ошибка записи спанов: %s", e)
+
+    def shutdown(self):
+        """Дописывает оставшиеся спаны и останавливает поток"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+exporter = SpanExporter(TRACE_EXPORT_PATH)
@@ -0,0 +1,201 @@
+# usage.py
+# Учёт токенов GPT по пользователям, дневной бюджет и отчёт о стоимости моделей
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import services
+from frequent import meal_key
+from models import Kbju
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Дневной бюджет на пользователя в долларах; 0 — без ограничений
+GPT_DAILY_BUDGET_USD = float(os.getenv('GPT_DAILY_BUDGET_USD', '0.05'))
+# Как часто накопленный расход пишется в базу
+USAGE_FLUSH_SECONDS = float(os.getenv('USAGE_FLUSH_SECONDS', '5'))
+# Сколько последних оценок текста помнить для работы сверх бюджета
+ESTIMATE_CACHE_SIZE = int(os.getenv('ESTIMATE_CACHE_SIZE', '2000'))
+
+# Цены в долларах за миллион токенов: (запрос, ответ)
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+
+def _load_prices(spec: str):
+    """Переопределение цен из GPT_PRICES вида «модель:запрос:ответ,модель:запрос:ответ»"""
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            model, prompt_price, completion_price = item.rsplit(':', 2)
+            MODEL_PRICES[model] = (float(prompt_price), float(completion_price))
+        except ValueError:
+            logger.warning("Не разобрана цена модели в GPT_PRICES: %r", item)
+
+_load_prices(os.getenv('GPT_PRICES', ''))
+
+class BudgetExceeded(Exception):
+    """Дневной бюджет пользователя исчерпан, а локальной оценки нет"""
+
+def completion_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        logger.warning("Нет цены для модели %s, расход считаем нулевым", model)
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+class UsageLedger:
+    """Расход GPT по пользователям и оценки КБЖУ с учётом дневного бюджета
+
+    Расход копится в памяти по (пользователь, день, модель) и пишется в
+    хранилище одной пачкой раз в USAGE_FLUSH_SECONDS (run) и при остановке
+    (flush), так что ответ пользователю не ждёт лишней записи в базу.
+    Потраченное за сегодня тоже держится в памяти процесса и читается из
+    базы один раз на пользователя в день. Несколько инстансов с общей базой
+    видят траты друг друга только после рестарта, поэтому бюджет мягкий.
+
+    Сверх бюджета бот не ходит в GPT: описание ищется в LRU последних
+    оценок всех пользователей, затем в прошлых приёмах пищи пользователя.
+    """
+
+    def __init__(self, db: Storage, daily_budget: float = GPT_DAILY_BUDGET_USD,
+                 cache_size: int = ESTIMATE_CACHE_SIZE):
+        self.db = db
+        self.daily_budget = daily_budget
+        self.cache_size = cache_size
+        self._day = ''
+        self._spent: Dict[int, float] = {}
+        # (user_id, date, model) -> [requests, prompt, completion, cost, latency_ms, max_latency_ms]
+        self._pending: Dict[Tuple[int, str, str], List] = {}
+        self._cache: 'OrderedDict[str, Kbju]' = OrderedDict()
+
+    def _today(self) -> str:
+        today = date.today().strftime('%Y-%m-%d')
+        if today != self._day:
+            self._day = today
+            self._spent.clear()
+        return today
+
+    async def spent_today(self, user_id: int) -> float:
+        today = self._today()
+        if user_id not in self._spent:
+            self._spent[user_id] = await self.db.get_gpt_spent(user_id, today)
+        return self._spent[user_id]
+
+    async def over_budget(self, user_id: int) -> bool:
+        if self.daily_budget <= 0:
+            return False
+        return await self.spent_today(user_id) >= self.daily_budget
+
+    async def record(self, user_id: int, completion: 'services.Completion'):
+        """Учёт расхода одного ответа модели; в базу он попадёт при ближайшем flush"""
+        cost = completion_cost(completion.model, completion.prompt_tokens, completion.completion_tokens)
+        today = self._today()
+        self._spent[user_id] = await self.spent_today(user_id) + cost
+        self._add((user_id, today, completion.model), [
+            1, completion.prompt_tokens, completion.completion_tokens, cost,
+            completion.latency_ms, completion.latency_ms
+        ])
+        logger.debug("Расход GPT учтён", extra={
+            'model': completion.model, 'cost_usd': cost, 'latency_ms': completion.latency_ms
+        })
+
+    def _add(self, key: Tuple[int, str, str], values: List):
+        totals = self._pending.get(key)
+        if totals is None:
+            self._pending[key] = values
+            return
+        for index in range(5):
+            totals[index] += values[index]
+        totals[5] = max(totals[5], values[5])
+
+    async def flush(self):
+        """Пишет накопленный расход; при ошибке строки вернутся в очередь до следующего раза"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [key + tuple(values) for key, values in pending.items()]
+        if not await self.db.save_gpt_usage(rows):
+            for key, values in pending.items():
+                self._add(key, values)
+
+    async def run(self):
+        """Периодическая запись расхода; запускается из App.run()"""
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Ошибка записи расхода GPT: %s", e)
+
+    def _cached(self, key: str) -> Optional[Kbju]:
+        kbju = self._cache.get(key)
+        if kbju is not None:
+            self._cache.move_to_end(key)
+        return kbju
+
+    def _remember(self, key: str, kbju: Kbju):
+        self._cache[key] = kbju
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def estimate_kbju(self, user_id: int, food_description: str,
+                            with_summary_hint: bool = True) -> Tuple[Kbju, bool]:
+        """Оценка КБЖУ текста; возвращает (КБЖУ, взята ли без GPT)
+
+        BudgetExceeded, если бюджет исчерпан и ни в кэше, ни в истории
+        пользователя такого описания нет.
+        """
+        key = meal_key(food_description)
+        if await self.over_budget(user_id):
+            kbju = self._cached(key) or await self.db.find_meal_kbju(user_id, food_description)
+            if kbju is None:
+                raise BudgetExceeded(user_id)
+            return kbju, True
+
+        kbju, completion = await services.estimate_kbju(food_description, with_summary_hint)
+        await self.record(user_id, completion)
+        if kbju.calories > 0:
+            self._remember(key, kbju)
+        return kbju, False
+
+    async def estimate_kbju_from_photo(self, user_id: int, jpeg_bytes: bytes,
+                                       caption: str = '') -> Tuple[str, Kbju]:
+        """Оценка фото через vision-модель; фото без GPT оценить нечем, поэтому сверх бюджета — BudgetExceeded"""
+        if await self.over_budget(user_id):
+            raise BudgetExceeded(user_id)
+        description, kbju, completion = await services.estimate_kbju_from_photo(jpeg_bytes, caption)
+        await self.record(user_id, completion)
+        return description, kbju
+
+async def usage_report(db: Storage, days: int = 1) -> str:
+    """Текст для /usage: запросы, токены, стоимость и задержка по моделям за последние days дней"""
+    date_to = date.today()
+    date_from = date_to - timedelta(days=days - 1)
+    rows = await db.get_gpt_usage_report(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
+    return render_usage_report(rows, date_from, date_to)
+
+def render_usage_report(rows: List[Dict], date_from: date, date_to: date) -> str:
+    period = date_to.isoformat() if date_from == date_to else f"{date_from.isoformat()} — {date_to.isoformat()}"
+    if not rows:
+        return f"🤖 GPT за {period}: запросов не было"
+
+    lines = [f"🤖 GPT за {period}"]
+    for row in rows:
+        average_ms = row['latency_ms'] / row['requests'] if row['requests'] else 0
+        lines.append(
+            f"\n{row['model']}: {row['requests']} запросов, {row['users']} польз.\n"
+            f"  токены: {row['prompt_tokens']} + {row['completion_tokens']}\n"
+            f"  стоимость: ${row['cost']:.4f} (${row['cost'] / row['requests'] * 1000:.3f} за 1000 запросов)\n"
+            f"  задержка: в среднем {average_ms:.0f} мс, максимум {row['max_latency_ms']} мс"
+        )
+    lines.append(f"\nИтого: ${sum(row['cost'] for row in rows):.4f}")
+    return '\n'.join(lines)
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import services
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Какой распознаватель использовать: whisper (API OpenAI) или fake (локальная заглушка)
+TRANSCRIBER = os.getenv('TRANSCRIBER', 'whisper')
+TRANSCRIBE_MODEL = os.getenv('TRANSCRIBE_MODEL', 'whisper-1')
+# Воркеры распознавания, длина очереди и размер пачки для одного вызова распознавателя
+VOICE_WORKERS = int(os.getenv('VOICE_WORKERS', '2'))
+VOICE_QUEUE_SIZE = int(os.getenv('VOICE_QUEUE_SIZE', '50'))
+VOICE_BATCH_SIZE = int(os.getenv('VOICE_BATCH_SIZE', '4'))
+# Не больше стольких распознаваний в минуту на весь бот
+VOICE_MAX_PER_MINUTE = int(os.getenv('VOICE_MAX_PER_MINUTE', '120'))
+VOICE_MAX_DURATION = int(os.getenv('VOICE_MAX_DURATION', '60'))
+
+class QueueFull(Exception):
+    """Очередь распознавания переполнена, голосовое не принято"""
+
+class Transcriber(ABC):
+    """Интерфейс распознавания речи"""
+
+    @abstractmethod
+    async def transcribe(self, audio: bytes, filename: str) -> str: ...
+
+    async def transcribe_batch(self, items: List[Tuple[bytes, str]]) -> List[str]:
+        """Пачка записей; локальная модель может переопределить и считать её за один проход"""
+        return list(await asyncio.gather(*(self.transcribe(audio, name) for audio, name in items)))
+
+class WhisperTranscriber(Transcriber):
+    """Whisper-совместимый API через клиент OpenAI"""
+
+    def __init__(self, model: str = TRANSCRIBE_MODEL):
+        self.model = model
+
+    async def transcribe(self, audio: bytes, filename: str) -> str:
+        result = await services.get_client().audio.transcriptions.create(
+            model=self.model,
+            file=(filename, audio),
+            language='ru'
+        )
+        return result.text
+
+class FakeTranscriber(Transcriber):
+    """Локальная заглушка для разработки и нагрузочных прогонов"""
+
+    def __init__(self, text: str = 'овсянка на молоке 250 г и банан', delay: float = 0.5):
+        self.text = text
+        self.delay = delay
+
+    async def transcribe(self, audio: bytes, filename: str) -> str:
+        await asyncio.sleep(self.delay)
+        return self.text
+
+class _RateLimiter:
+    """Скользящее окно: не больше limit событий за period секунд"""
+
+    def __init__(self, limit: int, period: float = 60.0):
+        self.limit = limit
+        self.period = period
+        self._events: List[float] = []
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._events = [t for t in self._events if now - t < self.period]
+            if len(self._events) < self.limit:
+                self._events.append(now)
+                return
+            await asyncio.sleep(self.period - (now - self._events[0]))
+
+class TranscriptionQueue:
+    """Ограниченная очередь распознавания с пулом воркеров
+
+    Голосовые не распознаются в хендлере: хендлер ставит запись в очередь и
+    ждёт результат. Если очередь полна, запись сразу отклоняется, чтобы всплеск
+    голосовых не занял все ресурсы и не задержал текстовые сообщения.
+    """
+
+    def __init__(self, transcriber: Transcriber, workers: int = VOICE_WORKERS,
+                 max_size: int = VOICE_QUEUE_SIZE, batch_size: int = VOICE_BATCH_SIZE,
+                 max_per_minute: int = VOICE_MAX_PER_MINUTE):
+        self.transcriber = transcriber
+        self.workers = workers
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_size = max_size
+        self._limiter = _RateLimiter(max_per_minute)
+        self._tasks: List[asyncio.Task] = []
+        self.metrics = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+            'max_depth': 0,
+            'wait_ms_total': 0.0,
+            'transcribe_ms_total': 0.0,
+        }
+
+    def _ensure_started(self):
+        # Очередь и воркеры создаются внутри работающего event loop при первом голосовом
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._max_size)
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def stats(self) -> dict:
+        completed = self.metrics['completed'] or 1
+        return {
+            'depth': self.depth,
+            **self.metrics,
+            'avg_wait_ms': round(self.metrics['wait_ms_total'] / completed, 1),
+            'avg_transcribe_ms': round(self.metrics['transcribe_ms_total'] / completed, 1),
+        }
+
+    async def transcribe(self, audio: bytes, filename: str) -> str:
+        """Ставит запись в очередь и ждёт текст; QueueFull, если места нет"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((audio, filename, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.metrics['rejected'] += 1
+            logger.warning("Очередь распознавания полна", extra={'voice_queue': self.stats()})
+            raise QueueFull()
+
+        self.metrics['submitted'] += 1
+        self.metrics['max_depth'] = max(self.metrics['max_depth'], self.depth)
+        with span('voice.transcribe', queue_depth=self.depth):
+            return await future
+
+    async def _worker(self, number: int):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                for _ in batch:
+                    await self._limiter.acquire()
+                started = time.perf_counter()
+                for _, _, _, enqueued in batch:
+                    self.metrics['wait_ms_total'] += (started - enqueued) * 1000
+
+                texts = await self.transcriber.transcribe_batch([(audio, name) for audio, name, _, _ in batch])
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                for (_, _, future, _), text in zip(batch, texts):
+                    self.metrics['completed'] += 1
+                    self.metrics['transcribe_ms_total'] += elapsed_ms
+                    if not future.done():
+                        future.set_result(text)
+            except asyncio.CancelledError:
+                # close(): взятые воркером записи не должны ждать ответа вечно
+                for _, _, future, _ in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                logger.exception("Ошибка распознавания в воркере %s: %s", number, e)
+                for _, _, future, _ in batch:
+                    self.metrics['failed'] += 1
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            logger.debug("Пачка голосовых распознана", extra={'batch': len(batch), 'voice_queue': self.stats()})
+
+    async def close(self):
+        """Останавливает воркеры; ждущие в transcribe получают CancelledError"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, _, future, _ = self._queue.get_nowait()
+                future.cancel()
+        self._queue = None
+
+def render_queue_stats(stats: dict) -> str:
+    """Метрики очереди распознавания для админской /usage"""
+    return (
+        f"🎙 Распознавание голосовых\n"
+        f"  в очереди: {stats['depth']} (максимум {stats['max_depth']})\n"
+        f"  принято: {stats['submitted']}, распознано: {stats['completed']}, "
+        f"ошибок: {stats['failed']}, отклонено: {stats['rejected']}\n"
+        f"  ожидание в очереди: в среднем {stats['avg_wait_ms']:.0f} мс, "
+        f"распознавание: {stats['avg_transcribe_ms']:.0f} мс"
+    )
+
+def create_transcriber(kind: str = TRANSCRIBER) -> Transcriber:
+    if kind == 'fake':
+        return FakeTranscriber()
+    return WhisperTranscriber()
+
+transcription_queue = TranscriptionQueue(create_transcriber())